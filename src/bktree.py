@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-12-06
+#
+
+"""BK-tree for finding words within a given edit distance of a query."""
+
+from __future__ import print_function, unicode_literals
+
+
+def levenshtein(a, b):
+    """Return Levenshtein (edit) distance between `a` and `b`.
+
+    Args:
+        a (unicode): First string.
+        b (unicode): Second string.
+
+    Returns:
+        int: Number of insertions, deletions and substitutions
+            required to turn `a` into `b`.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+
+    previous = range(len(b) + 1)
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (ca != cb)))
+        previous = current
+
+    return previous[-1]
+
+
+class BKTree(object):
+    """Burkhard-Keller tree of words.
+
+    Finds all words within `n` edits of a query without comparing the
+    query to every word: the triangle inequality rules out whole
+    subtrees.
+
+    Nodes are `[word, {distance: child node}]` lists, so trees can be
+    pickled.
+
+    Args:
+        words (iterable, optional): Words to add to the tree.
+    """
+
+    def __init__(self, words=()):
+        self.root = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, word):
+        """Add `word` to tree.
+
+        Args:
+            word (unicode): Word to add.
+        """
+        if self.root is None:
+            self.root = [word, {}]
+            self.size = 1
+            return
+
+        node = self.root
+        while True:
+            d = levenshtein(word, node[0])
+            if not d:  # Already in tree
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [word, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """Return words within `max_distance` edits of `word`.
+
+        Args:
+            word (unicode): Word to search for.
+            max_distance (int): Maximum edit distance.
+
+        Returns:
+            list: `(distance, word)` tuples, closest first.
+        """
+        if self.root is None:
+            return []
+
+        results = []
+        stack = [self.root]
+        while stack:
+            candidate, children = stack.pop()
+            d = levenshtein(word, candidate)
+            if d <= max_distance:
+                results.append((d, candidate))
+            for dist, child in children.items():
+                if d - max_distance <= dist <= d + max_distance:
+                    stack.append(child)
+
+        results.sort()
+        return results
@@ -25,6 +25,72 @@ KEYWORD_SETTINGS = 'convinfo'
 # Result display
 # ----------------------------------------------------------------------
 DECIMAL_PLACES_DEFAULT = 2
+# Number of conversions to show if destination unit is missing/incomplete
+SUGGESTIONS_MAX = 15
+# Units to suggest in addition to the ones pint knows the dimensions
+# of. pint leaves out units whose names start with a prefix symbol,
+# so common units like `meter` (`m`) and `hour` (`h`) are missing
+SUGGESTED_UNITS = (
+    'calorie',
+    'centimeter',
+    'day',
+    'degC',
+    'degF',
+    'electron_volt',
+    'hectare',
+    'hour',
+    'kilocalorie',
+    'kilogram',
+    'kilometer',
+    'kilometer / hour',
+    'kilopascal',
+    'kilowatt',
+    'kilowatt_hour',
+    'meter',
+    'meter / second',
+    'metric_ton',
+    'mile / hour',
+    'milligram',
+    'milliliter',
+    'millimeter',
+    'millisecond',
+    'minute',
+    'pascal',
+    'psi',
+    'year',
+)
+UNIT_TABLE_NAME = 'unit_table'
+# Show results in these units with the best SI prefix, e.g.
+# `1.5 kilometer` instead of `1500 meter`, if `auto_prefix` is set
+AUTO_PREFIX_DEFAULT = False
+PREFIX_UNITS = (
+    'ampere',
+    'bit',
+    'byte',
+    'gram',
+    'hertz',
+    'joule',
+    'liter',
+    'meter',
+    'newton',
+    'pascal',
+    'volt',
+    'watt',
+)
+# Units that get binary prefixes (kibi-, mebi-), unless the destination
+# unit has an SI prefix
+BINARY_PREFIX_UNITS = ('byte',)
+# Number of "Did you mean ...?" suggestions for unknown units
+DID_YOU_MEAN_MAX = 5
+# Prefixed names of these units are also suggested for unknown units,
+# so misspellings like `mililiter` are recognised
+DID_YOU_MEAN_PREFIX_UNITS = PREFIX_UNITS + ('second',)
+UNIT_NAMES_TREE_NAME = 'unit_names_tree'
+# Number of queries whose results are cached
+QUERY_CACHE_SIZE = 50
+QUERY_CACHE_NAME = 'query_results'
+# Source units of the previous query
+PARSE_STATE_NAME = 'parse_state'
 
 # ----------------------------------------------------------------------
 # Currency settings
@@ -34,6 +100,8 @@ CURRENCY_CACHE_NAME = 'exchange_rates'
 REFERENCE_CURRENCY = 'EUR'
 YAHOO_BASE_URL = 'https://download.finance.yahoo.com/d/quotes.csv?f=sl1&s={0}'
 SYMBOLS_PER_REQUEST = 50
+# Currencies to convert to if no destination unit is given
+FAVOURITE_CURRENCIES_DEFAULT = ['EUR', 'GBP', 'JPY', 'USD']
 
 # ----------------------------------------------------------------------
 # Unit definition files
@@ -42,6 +110,8 @@ CURRENCIES = {}
 CUSTOM_DEFINITIONS_FILENAME = 'unit_definitions.txt'
 BUILTIN_UNIT_DEFINITIONS = os.path.join(os.path.dirname(__file__),
                                         CUSTOM_DEFINITIONS_FILENAME)
+# Index of pint's, the workflow's and the user's unit definitions
+DEFINITION_INDEX_NAME = 'definition_index'
 
 with open(os.path.join(os.path.dirname(__file__),
                        'currencies.tsv'), 'rb') as fp:
@@ -69,4 +139,6 @@ ICON_CURRENCY = 'icons/money.png'
 UPDATE_SETTINGS = {'github_slug': 'deanishe/alfred-convert'}
 DEFAULT_SETTINGS = {
     'decimal_places': DECIMAL_PLACES_DEFAULT,
+    'auto_prefix': AUTO_PREFIX_DEFAULT,
+    'favourite_currencies': FAVOURITE_CURRENCIES_DEFAULT,
 }
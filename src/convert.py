@@ -12,46 +12,155 @@
 
 from __future__ import print_function, unicode_literals
 
+import hashlib
 import json
 import os
+import re
 import shutil
 import sys
+from tokenize import TokenError
 
 from vendor.pint import UnitRegistry, UndefinedUnitError, DimensionalityError
+from vendor.pint.unit import UnitsContainer
 
 from workflow import Workflow, ICON_WARNING, ICON_INFO
 from workflow.background import run_in_background, is_running
+from bktree import BKTree
+from querycache import QueryCache, file_fingerprint
+from resultformat import PrefixTable, ResultFormatter
+from unittable import UnitTable, is_multiplicative
 from config import (CURRENCY_CACHE_AGE, CURRENCY_CACHE_NAME,
+                    FAVOURITE_CURRENCIES_DEFAULT, REFERENCE_CURRENCY,
                     ICON_UPDATE,
                     UPDATE_SETTINGS, DEFAULT_SETTINGS,
                     BUILTIN_UNIT_DEFINITIONS,
-                    CUSTOM_DEFINITIONS_FILENAME,
-                    HELP_URL)
+                    CUSTOM_DEFINITIONS_FILENAME, DEFINITION_INDEX_NAME,
+                    SUGGESTIONS_MAX, SUGGESTED_UNITS, UNIT_TABLE_NAME,
+                    DID_YOU_MEAN_MAX, DID_YOU_MEAN_PREFIX_UNITS,
+                    UNIT_NAMES_TREE_NAME, CURRENCIES,
+                    QUERY_CACHE_NAME, QUERY_CACHE_SIZE, PARSE_STATE_NAME,
+                    AUTO_PREFIX_DEFAULT, PREFIX_UNITS, BINARY_PREFIX_UNITS,
+                    DECIMAL_PLACES_DEFAULT, HELP_URL)
 
 # Register currencies under their full names
 USE_CURRENCY_NAMES = False
 
 log = None
 
-# Pint objects
-ureg = UnitRegistry()
-ureg.default_format = 'P'
+# Units in query contain arithmetic, e.g. `2 ft + 3 in cm`
+EXPRESSION_RE = re.compile(r'[-+()\d]')
+# A number followed by a unit, e.g. `1.5 hr` or `3in`, not followed by
+# an exponent. Parenthesised, so `60 mi / 1.5 hr` is 40 mi/hr
+QUANTITY = (r'(?<![\w.])(\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*'
+            r'([a-zA-Z_]\w*)(?!\w|\s*(?:\*\*|\^|[²³⁻]))')
+QUANTITY_RE = re.compile(QUANTITY, re.UNICODE)
+# Quantities side by side, e.g. `3 ft 2 in`, which are summed
+QUANTITIES_RE = re.compile(r'{0}(?:\s+{0})*'.format(QUANTITY), re.UNICODE)
+# Parenthesised number followed by a unit, e.g. `(2 + 3) ft`. Not a
+# parenthesised quantity, as `(3 ft) in` is ft·in
+IMPLICIT_PRODUCT_RE = re.compile(r'(?<=[\d.)]\))\s*(?=[a-zA-Z_])')
+# Errors raised by parsing invalid or incomplete expressions
+EXPRESSION_ERRORS = (SyntaxError, TokenError, TypeError, ValueError,
+                     ZeroDivisionError)
+
+# Pint objects. The registry is created by `load_registry()`, as
+# it isn't needed to answer queries from the query cache
+ureg = None
 # Q = ureg.Quantity
+# `(fingerprint, index)` of the unit definitions `ureg` was loaded from
+definitions = None
+
+
+def load_registry(exchange_rates):
+    """Create unit registry with workflow, user and currency units.
+
+    Args:
+        exchange_rates (dict): `{symbol: rate}` mapping of currencies
+            or `None`.
+    """
+    global ureg
+    # Units are added from the definition index by `register_units()`
+    ureg = UnitRegistry(None)
+    ureg.default_format = 'P'
+
+    # Add pint, workflow and user units to unit registry
+    register_units()
+
+    if exchange_rates:  # Add exchange rates to conversion database
+        register_exchange_rates(exchange_rates)
+
+
+def data_fingerprint():
+    """Return fingerprint of the data conversion results depend on.
+
+    That is the workflow version, the unit definition files and the
+    cached exchange rates.
+
+    Returns:
+        tuple: Versions/`(mtime, size)` tuples of data.
+    """
+    return ('{0}'.format(wf.version),
+            file_fingerprint(BUILTIN_UNIT_DEFINITIONS),
+            file_fingerprint(wf.datafile(CUSTOM_DEFINITIONS_FILENAME)),
+            wf.cache_metadata(CURRENCY_CACHE_NAME))
 
 
 def register_units():
-    """Add built-in and user units to unit registry."""
-    # Add custom units from workflow and user data
-    ureg.load_definitions(BUILTIN_UNIT_DEFINITIONS)
+    """Add pint's, built-in and user units to unit registry.
+
+    Units are added from the definition index, so only the ones a
+    query uses (and the units they are defined in terms of) are
+    actually defined.
+    """
+    global definitions
     user_definitions = wf.datafile(CUSTOM_DEFINITIONS_FILENAME)
 
-    # User's custom units
-    if os.path.exists(user_definitions):
-        ureg.load_definitions(user_definitions)
-    else:  # Copy template to data dir
+    if not os.path.exists(user_definitions):  # Copy template to data dir
         shutil.copy(
             wf.workflowfile('{0}.sample'.format(CUSTOM_DEFINITIONS_FILENAME)),
-            wf.datafile(CUSTOM_DEFINITIONS_FILENAME))
+            user_definitions)
+
+    definitions = definition_index(user_definitions)
+    ureg.load_index(definitions[1])
+
+
+def definitions_fingerprint(paths):
+    """Return fingerprint of unit definition files.
+
+    Args:
+        paths (list): Paths to definition files.
+
+    Returns:
+        list: Workflow version and `(path, (mtime, size))` tuples.
+    """
+    return [wf.version] + [(path, file_fingerprint(path)) for path in paths]
+
+
+def definition_index(user_definitions):
+    """Return index of pint's, built-in and user unit definitions.
+
+    The index maps unit names to the position of their definitions in
+    the definition files. It's cached along with fingerprints of the
+    files, so it's only rebuilt when one of them changes.
+
+    Args:
+        user_definitions (unicode): Path to user's definition file.
+
+    Returns:
+        tuple: `(fingerprint, index)`. `index` is for
+            `UnitRegistry.load_index()`.
+    """
+    data = wf.cached_data(DEFINITION_INDEX_NAME, max_age=0)
+    if data and data[0] == definitions_fingerprint(data[1]['files']):
+        return data
+
+    log.debug('Indexing unit definitions ...')
+    index = ureg.index_definitions('default_en.txt', True)
+    ureg.index_definitions(BUILTIN_UNIT_DEFINITIONS, index=index)
+    ureg.index_definitions(user_definitions, index=index)
+    data = (definitions_fingerprint(index['files']), index)
+    wf.cache_data(DEFINITION_INDEX_NAME, data)
+    return data
 
 
 def register_exchange_rates(exchange_rates):
@@ -97,43 +206,608 @@ def register_exchange_rates(exchange_rates):
         ureg.define(definition)
 
 
-def convert(query, decimal_places=2):
-    """Parse query, calculate and return conversion result.
+def unit_table():
+    """Return cached `UnitTable` for pint's, built-in and user units.
+
+    The table is cached along with the fingerprint of the definition
+    files, so it's rebuilt when e.g. the user's custom units change.
+    It's built from a registry with all units in the definition
+    index, as `ureg` only defines units as they are used. Currencies
+    are left out, as their exchange rates change.
+
+    Returns:
+        unittable.UnitTable: Compatible units and conversion factors.
+    """
+    fingerprint, index = definitions
+
+    data = wf.cached_data(UNIT_TABLE_NAME, max_age=0)
+    if data and data[0] == fingerprint:
+        return data[1]
+
+    log.debug('Building unit table ...')
+    registry = UnitRegistry(None)
+    registry.default_format = ureg.default_format
+    registry.load_index(index)
+    registry._define_all_pending()
+    table = UnitTable(registry, SUGGESTED_UNITS)
+    wf.cache_data(UNIT_TABLE_NAME, (fingerprint, table))
+    return table
+
+
+def result_formatter(decimal_places, auto_prefix):
+    """Return formatter for conversion results.
+
+    Args:
+        decimal_places (int): Number of decimal places in results.
+        auto_prefix (bool): Show results in `PREFIX_UNITS` with the
+            best prefix.
+
+    Returns:
+        resultformat.ResultFormatter: Formatter for results.
+    """
+    tables = {}
+    if auto_prefix:
+        si = PrefixTable(ureg, 1000)
+        binary = PrefixTable(ureg, 1024)
+        for unit in PREFIX_UNITS:
+            if unit in BINARY_PREFIX_UNITS:
+                tables[unit] = (binary, si)
+            else:
+                tables[unit] = (si,)
+    return ResultFormatter(decimal_places, tables)
+
+
+def noise_reference(qty, units):
+    """Return magnitude rounding errors of converting `qty` are relative to.
+
+    Converting to or from offset units (temperatures) adds offsets,
+    which leaves rounding errors, e.g. `-0.00000022 degC` for
+    `32 degF degC`. Other conversions are multiplications, which
+    don't, so tiny results of those are real, e.g. `1 mm km`.
+
+    Args:
+        qty (pint.Quantity): Quantity being converted.
+        units (pint.unit.UnitsContainer): Units `qty` is converted to.
+
+    Returns:
+        float: Largest magnitude of `qty` in its own and base units,
+            or 0 if the conversion has no offsets.
+    """
+    if is_multiplicative(ureg, qty.units) and is_multiplicative(ureg, units):
+        return 0
+    return max(abs(qty.magnitude), abs(qty.to_base_units().magnitude))
+
+
+def format_conversion(conv, formatter, from_unit):
+    """Return the result of a conversion formatted for display.
+
+    The result is shown in the units the user asked for, so it isn't
+    rescaled with a prefix.
+
+    Args:
+        conv (pint.Quantity): Result of conversion.
+        formatter (resultformat.ResultFormatter): Formats results.
+        from_unit (pint.Quantity): Quantity that was converted.
+
+    Returns:
+        unicode: Formatted result.
+    """
+    return formatter.format(conv.magnitude, conv.units,
+                            noise_reference(from_unit, conv.units))
+
+
+def rescale_suggestion(conversion, formatter):
+    """Return suggested conversion with the best prefix for its size.
+
+    Args:
+        conversion (tuple): `(value, units, display name)` tuple as
+            returned by `UnitTable.conversions()`.
+        formatter (resultformat.ResultFormatter): Formats results.
+
+    Returns:
+        tuple: `(value, units, display name)`. Rescaled if `units` is
+            a single unit that `formatter` has a prefix table for.
+    """
+    value, expr, name = conversion
+    if formatter.prefix_tables and ' ' not in expr:
+        for prefix, unit, suffix in ureg.parse_unit_name(expr):
+            if not suffix and unit in formatter.prefix_tables:
+                value, prefix = formatter.rescale(value, prefix, unit)
+                return value, prefix + unit, prefix + unit
+    return conversion
+
+
+def suggest(from_unit, prefix, formatter, partial=''):
+    """Return conversions of `from_unit` to compatible units.
+
+    If no destination unit has been started, results in units that
+    `formatter` has prefix tables for are shown with the best prefix.
+
+    Args:
+        from_unit (pint.Quantity): Quantity to convert.
+        prefix (unicode): Query up to and including the source unit.
+            Used to build autocomplete values.
+        formatter (resultformat.ResultFormatter): Formats results.
+        partial (unicode, optional): Incomplete destination unit.
+
+    Returns:
+        list: `(result, autocomplete)` tuples.
+    """
+    conversions = unit_table().conversions(ureg, from_unit, partial,
+                                           SUGGESTIONS_MAX)
+    if formatter.prefix_tables and not partial:
+        rescaled, seen = [], set([from_unit.units.freeze()])
+        for conversion in conversions:
+            conversion = rescale_suggestion(conversion, formatter)
+            units = ureg.parse_units(conversion[1]).freeze()
+            if units not in seen:  # e.g. both meter and kilometer
+                seen.add(units)
+                rescaled.append(conversion)
+        conversions = rescaled
+    references = [noise_reference(from_unit, ureg.parse_units(c[1]))
+                  for c in conversions]
+    titles = formatter.format_many([c[0] for c in conversions],
+                                   [c[2] for c in conversions], references)
+    results = [(title, '{0} {1}'.format(prefix, expr))
+               for title, (_, expr, _) in zip(titles, conversions)]
+
+    log.debug('%d suggestions for %s (%r)', len(results), from_unit.units,
+              partial)
+    return results
+
+
+def unit_names_tree():
+    """Return `BKTree` of lowercase names, symbols and aliases of units.
+
+    The tree is cached along with a fingerprint of the names, so it's
+    only rebuilt when units are added (e.g. custom units or currencies).
+
+    Returns:
+        bktree.BKTree: Tree of lowercase unit names.
+    """
+    # `_units_casei` doesn't contain prefixed units, which pint adds to
+    # the registry as they are used
+    names = sorted(set(ureg._units_casei) | set(prefixed_unit_names()))
+    fingerprint = hashlib.md5('\n'.join(names).encode('utf-8')).hexdigest()
+
+    data = wf.cached_data(UNIT_NAMES_TREE_NAME, max_age=0)
+    if data and data[0] == fingerprint:
+        return data[1]
+
+    log.debug('Building tree of %d unit names ...', len(names))
+    tree = BKTree(names)
+    wf.cache_data(UNIT_NAMES_TREE_NAME, (fingerprint, tree))
+    return tree
+
+
+def prefixed_unit_names():
+    """Return names of `DID_YOU_MEAN_PREFIX_UNITS` with prefixes.
+
+    Units get the SI prefixes, and those in `BINARY_PREFIX_UNITS` the
+    binary prefixes as well, e.g. `milliliter` or `mebibyte`.
+
+    Returns:
+        list: Lowercase names of prefixed units.
+    """
+    si, binary = set(), set()
+    for definition in ureg._prefixes.values():
+        if not definition.name:
+            continue
+        # Binary prefixes are powers of 2 (of 1024)
+        scale = definition.converter.scale
+        if scale > 1 and scale == int(scale) and not (
+                int(scale) & (int(scale) - 1)):
+            binary.add(definition.name)
+        else:
+            si.add(definition.name)
+
+    names = []
+    for unit in DID_YOU_MEAN_PREFIX_UNITS:
+        prefixes = si | binary if unit in BINARY_PREFIX_UNITS else si
+        names.extend((prefix + unit).lower() for prefix in prefixes)
+    return names
+
+
+def did_you_mean(name):
+    """Return known units whose names are similar to `name`.
+
+    Most prefixed units aren't in the tree, so if `name` starts with a
+    prefix, the rest of `name` is also looked up, e.g. `kilometr`
+    is split into `kilo` and `metr`. Misspelt prefixes are found via
+    the prefixed names of common units, which are in the tree.
+
+    Currency codes get no suggestions, as they're unknown only when
+    exchange rates haven't been loaded yet. Currencies aren't suggested
+    with prefixes.
+
+    Args:
+        name (unicode): Unknown unit name.
+
+    Returns:
+        list: Names of units, closest matches first.
+    """
+    if name.upper() in CURRENCIES:
+        return []
+
+    tree = unit_names_tree()
+    # (distance, is prefixed, unit name)
+    candidates = set()
+
+    def search(word, prefix=''):
+        max_distance = 1 if len(word) <= 4 else 2
+        for distance, lower in tree.search(word.lower(), max_distance):
+            reals = ureg._units_casei.get(lower)
+            if not reals:  # Prefixed unit, e.g. `milliliter`
+                if not prefix and lower != name:
+                    candidates.add((distance, True, lower))
+                continue
+            for real in reals:
+                if len(real) == 1 and len(word) > 2:
+                    continue  # Single-letter symbols of other units
+                if prefix and '[currency]' in ureg.get_dimensionality(real):
+                    continue  # Currencies don't have prefixes, e.g. `meur`
+                definition = ureg._units[real]
+                if not prefix:
+                    unit = real
+                # Combine prefix symbols with unit symbols, names with names
+                elif prefix == ureg._prefixes[prefix].symbol:
+                    unit = prefix + definition.symbol
+                else:
+                    unit = prefix + definition.name
+                if unit != name:
+                    candidates.add((distance, bool(prefix), unit))
+
+    search(name)
+    for prefix in ureg._prefixes:
+        # Short remainders only match unrelated symbols, e.g. `usd`
+        # isn't micro-`sd`
+        if prefix and len(name) - len(prefix) > 2 and name.startswith(prefix):
+            search(name[len(prefix):], prefix)
+
+    log.debug('%d suggestions for unknown unit %r', len(candidates), name)
+    names = []
+    for _, _, unit in sorted(candidates):
+        if unit not in names:
+            names.append(unit)
+    return names[:DID_YOU_MEAN_MAX]
+
+
+def favourite_rates(exchange_rates, favourites):
+    """Return exchange rates of user's favourite currencies.
+
+    Args:
+        exchange_rates (dict): `{symbol: rate}` mapping of currencies.
+        favourites (list): Symbols of user's favourite currencies.
+
+    Returns:
+        list: `(symbol, rate)` tuples of favourite currencies that
+            have an exchange rate. Rates are relative to the euro.
+    """
+    rates = []
+    for symbol in favourites:
+        if symbol == REFERENCE_CURRENCY:
+            rates.append((symbol, 1.0))
+        elif symbol in exchange_rates:
+            rates.append((symbol, exchange_rates[symbol]))
+    return rates
+
+
+def convert_currency(from_unit, prefix, exchange_rates, favourites,
+                     formatter, partial=''):
+    """Return conversions of currency `from_unit` to favourite currencies.
+
+    All rates are relative to the euro, so each conversion is a single
+    multiplication of the amount in euros.
+
+    Args:
+        from_unit (pint.Quantity): Amount of money to convert.
+        prefix (unicode): Query up to and including the source unit.
+            Used to build autocomplete values.
+        exchange_rates (dict): `{symbol: rate}` mapping of currencies.
+        favourites (list): `(symbol, rate)` tuples as returned by
+            `favourite_rates()`.
+        formatter (resultformat.ResultFormatter): Formats results.
+        partial (unicode, optional): Incomplete destination currency.
+
+    Returns:
+        list: `(result, autocomplete)` tuples. Empty if `from_unit`
+            isn't an amount of a currency, e.g. `usd**2`, or `partial`
+            isn't the start of a currency symbol.
+    """
+    units = dict(from_unit.units)
+    if len(units) != 1 or list(units.values())[0] != 1:
+        return []
+    if partial and not partial.isalpha():
+        return []
+
+    src = list(units)[0]
+    if src == REFERENCE_CURRENCY:
+        src_rate = 1.0
+    elif src in exchange_rates:
+        src_rate = exchange_rates[src]
+    else:
+        return []
+
+    euros = from_unit.magnitude / src_rate
+    partial = partial.upper()
+    rates = [(symbol, rate) for symbol, rate in favourites
+             if symbol != src and symbol.startswith(partial)]
+    titles = formatter.format_many([euros * rate for _, rate in rates],
+                                   [symbol for symbol, _ in rates])
+    return [(title, '{0} {1}'.format(prefix, symbol))
+            for title, (symbol, _) in zip(titles, rates)]
+
+
+def source_quantity(qty, atoms, i, parse_state):
+    """Return `Quantity` of `qty` in the units of the first `i` atoms.
+
+    If the previous query started with the same `i` atoms, the units
+    parsed from them are reused from `parse_state`. Otherwise the atoms
+    are parsed and, if they are valid units, saved to `parse_state`.
+
+    Args:
+        qty (float): Magnitude of quantity.
+        atoms (list): Whitespace-separated words of query after `qty`.
+        i (int): Number of `atoms` that are the source units.
+        parse_state (dict): Source units of the previous query.
+
+    Returns:
+        pint.Quantity: Source quantity.
+
+    Raises:
+        UndefinedUnitError: Raised if atoms aren't valid units.
+    """
+    if parse_state.get('atoms') == atoms[:i]:
+        units = parse_state['units']
+        # Define prefixed units, which pint adds to the registry as
+        # they are parsed
+        for name in units:
+            ureg.get_name(name)
+        log.debug('Source units from previous query : %r', units)
+        return ureg.Quantity(qty, UnitsContainer(units))
+
+    from_unit = ureg.Quantity(qty, ' '.join(atoms[:i]))
+    parse_state['atoms'] = atoms[:i]
+    parse_state['units'] = dict(from_unit.units)
+    return from_unit
+
+
+def resume_split(atoms, parse_state):
+    """Return the first split point of `atoms` worth trying.
+
+    If the previous query had the same start, splits before the one
+    that gave its source units can't give valid source units now.
+
+    Args:
+        atoms (list): Whitespace-separated words of query after number.
+        parse_state (dict): Source units of the previous query.
+
+    Returns:
+        int: Index of `atoms` to start splitting at.
+    """
+    previous = parse_state.get('atoms')
+    if (previous and len(atoms) > len(previous) and
+            atoms[:len(previous)] == previous):
+        return len(previous)
+    return 0
+
+
+def sum_quantities(match):
+    """Return run of quantities matched by `QUANTITIES_RE` as a sum."""
+    return '({0})'.format(' + '.join(
+        '{0} {1}'.format(number, unit)
+        for number, unit in QUANTITY_RE.findall(match.group(0))))
+
+
+def source_expression(expression):
+    """Return source quantity `expression` in a form pint can evaluate.
+
+    Numbers followed by units are treated as single quantities,
+    so `60 mi / 1.5 hr` is 40 mi/hr, not 40 mi * hr. Quantities side
+    by side are added up, so `3 ft 2 in` is 38 in. The only implicit
+    product is a parenthesised number followed by a unit.
+
+    >>> print(source_expression('3 ft 2 in'))
+    (3 ft + 2 in)
+    >>> print(source_expression('60 mi / 1.5 hr'))
+    (60 mi) / (1.5 hr)
+    >>> print(source_expression('(2 + 3) ft'))
+    (2 + 3)*ft
+
+    Args:
+        expression (unicode): Arithmetic expression with units.
+
+    Returns:
+        unicode: Expression for `UnitRegistry.parse_expression()`.
+    """
+    expression = QUANTITIES_RE.sub(sum_quantities, expression)
+    return IMPLICIT_PRODUCT_RE.sub('*', expression)
+
+
+def parse_source(expression):
+    """Evaluate source quantity `expression`, e.g. `2 ft + 3 in`.
+
+    See `source_expression()` for how `expression` is read. Quantities
+    side by side with different dimensions, e.g. `3 ft 2 kg`, are
+    invalid.
+
+    Args:
+        expression (unicode): Arithmetic expression with units.
+
+    Returns:
+        pint.Quantity: Value of expression with a float magnitude.
+
+    Raises:
+        ValueError: Raised if `expression` has no units.
+        DimensionalityError: Raised if `expression` adds up
+            incompatible units.
+    """
+    qty = ureg.parse_expression(source_expression(expression))
+    if not isinstance(qty, ureg.Quantity) or qty.dimensionless:
+        raise ValueError('No units specified')
+    return ureg.Quantity(float(qty.magnitude), qty.units)
+
+
+def convert_expression(query, formatter, exchange_rates=None,
+                       favourites=()):
+    """Convert a query whose source quantity is an expression.
+
+    The query is split at the last space that gives a valid source
+    expression and a compatible destination unit, e.g.
+    `2 ft + 3 in cm`. If there is no such split, the whole query is
+    the source and conversions to compatible units are returned.
+
+    Args:
+        query (unicode): Alfred's query.
+        formatter (resultformat.ResultFormatter): Formats results.
+        exchange_rates (dict, optional): `{symbol: rate}` mapping of
+            currencies.
+        favourites (list, optional): `(symbol, rate)` tuples of currencies
+            to convert to if the query is a currency without a destination.
+
+    Returns:
+        list: `(result, autocomplete)` tuples. `autocomplete` is `None`
+            for the result of a complete query.
+
+    Raises:
+        ValueError: Raised if the query is incomplete or invalid.
+    """
+    atoms = query.split()
+    # Error of the longest valid source expression
+    error = None
+    for i in range(len(atoms) - 1, 0, -1):
+        q1 = ' '.join(atoms[:i])
+        q2 = ' '.join(atoms[i:])
+        try:
+            from_unit = parse_source(q1)
+        except EXPRESSION_ERRORS:
+            continue
+
+        log.debug('from expression : %s  to : %s', q1, q2)
+        try:
+            to_unit = ureg.Quantity(1, q2)
+        except UndefinedUnitError as err:  # Incomplete destination unit?
+            results = (convert_currency(from_unit, q1, exchange_rates or {},
+                                        favourites, formatter, q2) or
+                       suggest(from_unit, q1, formatter, q2))
+            if results:
+                return results
+            error = error or err
+            continue
+        except EXPRESSION_ERRORS:
+            continue
+
+        try:
+            conv = from_unit.to(to_unit)
+        except DimensionalityError as err:
+            # Incomplete destination unit that's also another unit,
+            # e.g. `c` for `cm`?
+            results = (convert_currency(from_unit, q1, exchange_rates or {},
+                                        favourites, formatter, q2) or
+                       suggest(from_unit, q1, formatter, q2))
+            if results:
+                return results
+            error = error or err
+            continue
+
+        return [(format_conversion(conv, formatter, from_unit), None)]
+
+    # No destination unit
+    try:
+        from_unit = parse_source(query)
+    except (UndefinedUnitError, DimensionalityError) as err:
+        raise error or err
+    except EXPRESSION_ERRORS:
+        if error:
+            raise error
+        raise ValueError('Invalid expression : {0}'.format(query))
+
+    results = (convert_currency(from_unit, query, exchange_rates or {},
+                                favourites, formatter) or
+               suggest(from_unit, query, formatter))
+    if not results:
+        raise error or ValueError('No destination unit specified')
+    return results
+
+
+def convert(query, decimal_places=2, exchange_rates=None, favourites=(),
+            parse_state=None, auto_prefix=False):
+    """Parse query, calculate and return conversion results.
+
+    If the destination unit is missing or incomplete, return
+    conversions to compatible units.
+
+    If the source quantity is an arithmetic expression, e.g.
+    `2 ft + 3 in cm`, the query is handled by `convert_expression()`.
+
+    While the user types, successive queries usually only differ in
+    the destination unit, so the source units are saved to
+    `parse_state` and reused by the next query if it starts with the
+    same source units. Only the destination is parsed again.
 
     Args:
         query (unicode): Alfred's query.
         decimal_places (int, optional): Number of decimal places in result.
+        exchange_rates (dict, optional): `{symbol: rate}` mapping of
+            currencies.
+        favourites (list, optional): `(symbol, rate)` tuples of currencies
+            to convert to if the query is a currency without a destination.
+        parse_state (dict, optional): Source units of the previous
+            query. Updated with those of this query.
+        auto_prefix (bool, optional): Show results in SI and binary
+            units with the best prefix, e.g. `1.5 kilometer` instead
+            of `1500 meter`.
+
+    Returns:
+        list: `(result, autocomplete)` tuples. `autocomplete` is `None`
+            for the result of a complete query.
 
     Raises:
         ValueError: Raised if the query is incomplete or invalid.
     """
+    formatter = result_formatter(decimal_places, auto_prefix)
 
     # Parse number from start of query
     qty = []
     for c in query:
-        if c in '1234567890.':
+        if c in '1234567890.' or (c == '-' and not qty):
             qty.append(c)
         else:
             break
-    if not len(qty):
+    if not len(qty) and not query.startswith('('):
         raise ValueError('Start your query with a number')
 
     tail = query[len(qty):]
-    qty = float(''.join(qty))
+    if not len(qty) or EXPRESSION_RE.search(tail):
+        return convert_expression(query, formatter, exchange_rates,
+                                  favourites)
+
+    number = ''.join(qty)
+    qty = float(number)
     if not len(tail):
         raise ValueError('No units specified')
 
     log.debug('quantity : %s tail : %s', qty, tail)
 
+    if parse_state is None:
+        parse_state = {}
+
     # Try to parse rest of query into a pair of units
     atoms = tail.split()
     from_unit = to_unit = None
     # Try splitting tail at every space until we arrive at a pair
     # of units that `pint` understands
     if len(atoms) == 1:
-        raise ValueError('No destination unit specified')
+        from_unit = source_quantity(qty, atoms, 1, parse_state)
+        prefix = '{0} {1}'.format(number, atoms[0])
+        results = (convert_currency(from_unit, prefix, exchange_rates or {},
+                                    favourites, formatter) or
+                   suggest(from_unit, prefix, formatter))
+        if not results:
+            raise ValueError('No destination unit specified')
+        return results
     q1 = q2 = ''
-    for i in range(len(atoms)):
+    for i in range(resume_split(atoms, parse_state), len(atoms)):
         from_unit = to_unit = None  # reset so no old values spill over
         q1 = ' '.join(atoms[:i]).strip()
         q2 = ' '.join(atoms[i:]).strip()
@@ -141,36 +815,138 @@ def convert(query, decimal_places=2):
         if not len(q1) or not len(q2):  # an empty unit
             continue
         try:
-            from_unit = ureg.Quantity(qty, q1)
+            from_unit = source_quantity(qty, atoms, i, parse_state)
         except UndefinedUnitError:
             continue
         else:
             log.debug('From unit : %s', q1)
             try:
                 to_unit = ureg.Quantity(1, q2)
-            except UndefinedUnitError:  # Didn't make sense; try again
-                raise ValueError('Unknown unit : %s' % q2)
+            except UndefinedUnitError:  # Incomplete destination unit?
+                prefix = '{0} {1}'.format(number, q1)
+                results = (convert_currency(from_unit, prefix,
+                                            exchange_rates or {},
+                                            favourites, formatter, q2) or
+                           suggest(from_unit, prefix, formatter, q2))
+                if not results:
+                    raise UndefinedUnitError(q2)
+                return results
 
         log.debug("from '%s' to '%s'", from_unit.units, to_unit.units)
         break  # Got something!
 
     # Throw error if we arrive here with no units
     if from_unit is None:
-        raise ValueError('Unknown unit : %s' % q1)
+        raise UndefinedUnitError(q1)
     if to_unit is None:
-        raise ValueError('Unknown unit : %s' % q2)
-    conv = from_unit.to(to_unit)
-    log.debug('%f %s' % (conv.magnitude, conv.units))
+        raise UndefinedUnitError(q2)
+    try:
+        conv = from_unit.to(to_unit)
+    except DimensionalityError as err:
+        # Incomplete destination unit that's also another unit, e.g.
+        # `c` (speed of light) for `cm`?
+        prefix = '{0} {1}'.format(number, q1)
+        results = (convert_currency(from_unit, prefix, exchange_rates or {},
+                                    favourites, formatter, q2) or
+                   suggest(from_unit, prefix, formatter, q2))
+        if not results:
+            raise err
+        return results
+    log.debug('%f %s', conv.magnitude, conv.units)
+
+    return [(format_conversion(conv, formatter, from_unit), None)]
+
+
+def conversion_items(query, decimal_places, exchange_rates, favourites,
+                     parse_state, auto_prefix=False):
+    """Convert query and return Script Filter items for the results.
+
+    Args:
+        query (unicode): Alfred's query.
+        decimal_places (int): Number of decimal places in result.
+        exchange_rates (dict): `{symbol: rate}` mapping of currencies
+            or `None`.
+        favourites (list): Symbols of currencies to convert to if the
+            query is a currency without a destination.
+        parse_state (dict): Source units of the previous query.
+        auto_prefix (bool, optional): Show results with the best prefix.
+
+    Returns:
+        list: `Workflow.add_item()` keyword arguments for each item.
+    """
+    items = []
+    error = None
+    conversions = None
+    unknown_units = ()
+
+    try:
+        conversions = convert(query,
+                              decimal_places=decimal_places,
+                              exchange_rates=exchange_rates,
+                              favourites=favourite_rates(exchange_rates or {},
+                                                         favourites),
+                              parse_state=parse_state,
+                              auto_prefix=auto_prefix)
+    except UndefinedUnitError as err:
+        log.critical('Unknown unit : %s', err.unit_names)
+        unknown_units = err.unit_names
+        if isinstance(unknown_units, basestring):
+            unknown_units = [unknown_units]
+        error = 'Unknown unit : {0}'.format(', '.join(sorted(unknown_units)))
+
+    except DimensionalityError as err:
+        log.critical('Invalid conversion : %s', err)
+        error = "Can't convert from {0} {1} to {2} {3}".format(
+            err.units1, err.dim1, err.units2, err.dim2)
+
+    except ValueError as err:
+        log.critical('Invalid query : %s', err)
+        error = err.message
+
+    except Exception as err:
+        log.exception('%s : %s', err.__class__, err)
+        error = err.message
 
-    fmt = '%%0.%df %%s' % decimal_places
-    result = fmt % (conv.magnitude, conv.units)
+    if not error and not conversions:
+        error = 'Conversion input not understood'
 
-    return result
+    if error:  # Show error
+        items.append(dict(
+            title=error,
+            subtitle='For example: 2.5cm in  |  178lb kg  |  200m/s mph',
+            valid=False, icon=ICON_WARNING))
+
+        for unknown in unknown_units:
+            head, sep, tail = query.rpartition(unknown)
+            if not sep:
+                continue
+            for name in did_you_mean(unknown):
+                items.append(dict(
+                    title='Did you mean {0}?'.format(name),
+                    subtitle='↹ to replace {0} with {1}'.format(unknown,
+                                                                name),
+                    autocomplete=head + name + tail,
+                    icon=ICON_INFO))
+    else:  # Show results
+        for conversion, autocomplete in conversions:
+            items.append(dict(
+                title=conversion,
+                valid=True,
+                arg=conversion,
+                autocomplete=autocomplete,
+                copytext=conversion,
+                largetext=conversion,
+                icon='icon.png'))
+
+    return items
 
 
 def main(wf):
     """Run workflow Script Filter.
 
+    Results are cached by query, settings and `data_fingerprint()`,
+    so a repeated query is answered without creating the unit registry.
+
     Args:
         wf (workflow.Workflow): Current Workflow object.
 
@@ -179,12 +955,10 @@ def main(wf):
     """
     if not len(wf.args):
         return 1
-    query = wf.args[0]  # .lower()
+    # Whitespace is insignificant to `convert()`
+    query = ' '.join(wf.args[0].split())  # .lower()
     log.debug('query : %s', query)
 
-    # Add workflow and user units to unit registry
-    register_units()
-
     # Notify of available update
     if wf.update_available:
         wf.add_item('A newer version is available',
@@ -192,19 +966,13 @@ def main(wf):
                     autocomplete='workflow:update',
                     icon=ICON_UPDATE)
 
-    # Load cached data
-    exchange_rates = wf.cached_data(CURRENCY_CACHE_NAME, max_age=0)
-
-    if exchange_rates:  # Add exchange rates to conversion database
-        register_exchange_rates(exchange_rates)
-
     if not wf.cached_data_fresh(CURRENCY_CACHE_NAME, CURRENCY_CACHE_AGE):
         # Update currency rates
         cmd = ['/usr/bin/python', wf.workflowfile('currency.py')]
         run_in_background('update', cmd)
 
     if is_running('update'):
-        if exchange_rates is None:  # No data cached yet
+        if wf.cache_metadata(CURRENCY_CACHE_NAME) is None:  # No data yet
             wf.add_item('Fetching exchange rates…',
                         'Currency conversions will be momentarily possible',
                         icon=ICON_INFO)
@@ -212,44 +980,36 @@ def main(wf):
             wf.add_item('Updating exchange rates…',
                         icon=ICON_INFO)
 
-    error = None
-    conversion = None
+    decimal_places = wf.settings.get('decimal_places', DECIMAL_PLACES_DEFAULT)
+    auto_prefix = wf.settings.get('auto_prefix', AUTO_PREFIX_DEFAULT)
+    favourites = tuple(wf.settings.get('favourite_currencies',
+                                       FAVOURITE_CURRENCIES_DEFAULT))
+    fingerprint = data_fingerprint()
+    key = (query, decimal_places, auto_prefix, favourites, fingerprint)
 
-    try:
-        conversion = convert(query,
-                             decimal_places=wf.settings.get('decimal_places',
-                                                            2))
-    except UndefinedUnitError as err:
-        log.critical('Unknown unit : %s', err.unit_names)
-        error = 'Unknown unit : {0}'.format(err.unit_names)
-
-    except DimensionalityError as err:
-        log.critical('Invalid conversion : %s', err)
-        error = "Can't convert from {0} {1} to {2} {3}".format(
-            err.units1, err.dim1, err.units2, err.dim2)
-
-    except ValueError as err:
-        log.critical('Invalid query : %s', err)
-        error = err.message
+    cache = QueryCache(wf, QUERY_CACHE_NAME, QUERY_CACHE_SIZE)
+    items = cache.get(key)
+    if items is None:
+        # Load cached data
+        exchange_rates = wf.cached_data(CURRENCY_CACHE_NAME, max_age=0)
+        load_registry(exchange_rates)
 
-    except Exception as err:
-        log.exception('%s : %s', err.__class__, err)
-        error = err.message
+        # Parsed source units are only valid for the same unit data
+        parse_state = wf.cached_data(PARSE_STATE_NAME, max_age=0)
+        if not parse_state or parse_state['fingerprint'] != fingerprint:
+            parse_state = {'fingerprint': fingerprint}
+        previous = dict(parse_state)
 
-    if not error and not conversion:
-        error = 'Conversion input not understood'
+        items = conversion_items(query, decimal_places, exchange_rates,
+                                 favourites, parse_state, auto_prefix)
+        cache.set(key, items)
+        if parse_state != previous:
+            wf.cache_data(PARSE_STATE_NAME, parse_state)
+    else:
+        log.debug('%d cached results', len(items))
 
-    if error:  # Show error
-        wf.add_item(error,
-                    'For example: 2.5cm in  |  178lb kg  |  200m/s mph',
-                    valid=False, icon=ICON_WARNING)
-    else:  # Show result
-        wf.add_item(conversion,
-                    valid=True,
-                    arg=conversion,
-                    copytext=conversion,
-                    largetext=conversion,
-                    icon='icon.png')
+    for item in items:
+        wf.add_item(**item)
 
     wf.send_feedback()
     log.debug('finished')
@@ -259,6 +1019,7 @@ def main(wf):
 if __name__ == '__main__':
     wf = Workflow(update_settings=UPDATE_SETTINGS,
                   default_settings=DEFAULT_SETTINGS,
-                  help_url=HELP_URL)
+                  help_url=HELP_URL,
+                  cache_manifest=True)
     log = wf.logger
     sys.exit(wf.run(main))
@@ -90,7 +90,7 @@ def load_yahoo_rates(symbols):
         m = parse_yahoo_response(name)
 
         if not m:  # Couldn't get symbol
-            log.error('Invalid currency : {0}'.format(name))
+            log.error('Invalid currency : %s', name)
             ycount += 1
             continue
         symbol = m.group(1)
@@ -104,11 +104,11 @@ def load_yahoo_rates(symbols):
         try:
             rate = float(rate)
         except ValueError:
-            log.error('No exchange rate for : {0}'.format(name))
+            log.error('No exchange rate for : %s', name)
             continue
 
         if rate == 0:
-            log.error('No exchange rate for : {0}'.format(name))
+            log.error('No exchange rate for : %s', name)
             ycount += 1
             continue
 
@@ -159,7 +159,7 @@ def main(wf):
              len(exchange_rates), elapsed)
 
     for currency, rate in exchange_rates.items():
-        wf.logger.debug('1 EUR = {0} {1}'.format(rate, currency))
+        wf.logger.debug('1 EUR = %s %s', rate, currency)
 
 
 if __name__ == '__main__':
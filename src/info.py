@@ -19,6 +19,9 @@ Usage:
     info.py --openunits
     info.py --currencies [<query>]
     info.py --places <query>
+    info.py --prefixes
+    info.py --addfav <query>
+    info.py --delfav <query>
 
 Options:
     -h, --help    Show this message
@@ -26,6 +29,9 @@ Options:
     --openunits   Open custom units file in default editor
     --currencies  View/search supported currencies
     --places      Set decimal places
+    --prefixes    Toggle showing results with the best SI prefix
+    --addfav      Add currency to favourites
+    --delfav      Remove currency from favourites
 
 """
 
@@ -40,9 +46,12 @@ import sys
 from vendor.docopt import docopt
 
 from workflow import (
+    FilterIndex,
     ICON_HELP,
     ICON_INFO,
     ICON_SETTINGS,
+    ICON_SYNC,
+    ICON_FAVOURITE,
     ICON_WARNING,
     MATCH_ALL,
     MATCH_ALLCHARS,
@@ -50,10 +59,12 @@ from workflow import (
 )
 
 from config import (
+    AUTO_PREFIX_DEFAULT,
     CURRENCIES,
     CURRENCY_CACHE_NAME,
     CUSTOM_DEFINITIONS_FILENAME,
     DECIMAL_PLACES_DEFAULT,
+    FAVOURITE_CURRENCIES_DEFAULT,
     ICON_CURRENCY,
     KEYWORD_SETTINGS,
     README_URL,
@@ -101,6 +112,40 @@ def human_timedelta(td):
     return ' '.join(output)
 
 
+def get_favourites(wf):
+    """Return list of user's favourite currencies.
+
+    Args:
+        wf (workflow.Workflow): Workflow object.
+
+    Returns:
+        list: Symbols of favourite currencies.
+    """
+    return list(wf.settings.get('favourite_currencies',
+                                FAVOURITE_CURRENCIES_DEFAULT))
+
+
+def currency_index(wf):
+    """Return :class:`~workflow.FilterIndex` of supported currencies.
+
+    The index is cached per workflow version, as the list of currencies
+    only changes when the workflow is updated.
+
+    Args:
+        wf (workflow.Workflow): Workflow object.
+
+    Returns:
+        workflow.FilterIndex: Index of `(name, symbol)` tuples.
+    """
+    def build():
+        currencies = sorted([(name, symbol) for (symbol, name)
+                            in CURRENCIES.items()])
+        return FilterIndex(currencies, key=lambda t: ' '.join(t))
+
+    return wf.cached_data('currency_index-{0}'.format(wf.version), build,
+                          max_age=0)
+
+
 def main(wf):
     """Run Script Filter.
 
@@ -112,7 +157,7 @@ def main(wf):
     """
     args = docopt(__doc__, wf.args)
 
-    log.debug('args : {!r}'.format(args))
+    log.debug('args : %r', args)
 
     query = args.get('<query>')
 
@@ -133,13 +178,48 @@ def main(wf):
 
     if args.get('--places'):
         value = int(query)
-        log.debug('Setting `decimal_places` to {!r}'.format(value))
+        log.debug('Setting `decimal_places` to %r', value)
         wf.settings['decimal_places'] = value
         print('Set decimal places to {}'.format(value))
         # subprocess.call(['osascript', '-e', ALFRED_AS])
         return 0
 
+    if args.get('--prefixes'):
+        value = not wf.settings.get('auto_prefix', AUTO_PREFIX_DEFAULT)
+        log.debug('Setting `auto_prefix` to %r', value)
+        wf.settings['auto_prefix'] = value
+        print('Prefixes {0}'.format('on' if value else 'off'))
+        return 0
+
+    if args.get('--addfav'):
+        favourites = get_favourites(wf)
+        if query not in favourites:
+            favourites.append(query)
+            wf.settings['favourite_currencies'] = sorted(favourites)
+        print('Added {0} to favourite currencies'.format(query))
+        return 0
+
+    if args.get('--delfav'):
+        favourites = get_favourites(wf)
+        if query in favourites:
+            favourites.remove(query)
+            wf.settings['favourite_currencies'] = favourites
+        print('Removed {0} from favourite currencies'.format(query))
+        return 0
+
     if not query or not query.strip():
+        download = wf.update_download
+        if download and download['state'] == 'downloading':
+            if download['size']:
+                progress = '{0:d}%'.format(
+                    100 * download['received'] // download['size'])
+            else:
+                progress = '{0:0.1f} MB'.format(
+                    download['received'] / 1024.0 / 1024.0)
+            wf.add_item('Downloading update… {0}'.format(progress),
+                        download['filename'],
+                        icon=ICON_SYNC)
+
         wf.add_item('View Help File',
                     'Open help file in your browser',
                     valid=True,
@@ -151,6 +231,11 @@ def main(wf):
                     autocomplete=' currencies {0} '.format(DELIMITER),
                     icon=ICON_CURRENCY)
 
+        wf.add_item('Favourite Currencies',
+                    'Currencies shown when no destination unit is given',
+                    autocomplete=' favourites {0} '.format(DELIMITER),
+                    icon=ICON_FAVOURITE)
+
         wf.add_item(('Decimal Places in Results '
                     '(current : {0})'.format(wf.settings.get(
                                             'decimal_places',
@@ -159,6 +244,16 @@ def main(wf):
                     autocomplete=' places {0} '.format(DELIMITER),
                     icon=ICON_SETTINGS)
 
+        wf.add_item(('Scale Results with Prefixes '
+                    '(current : {0})'.format(
+                        'on' if wf.settings.get('auto_prefix',
+                                                AUTO_PREFIX_DEFAULT)
+                        else 'off')),
+                    'Show e.g. 1.5 kilometer instead of 1500 meter',
+                    valid=True,
+                    arg='--prefixes',
+                    icon=ICON_SETTINGS)
+
         wf.add_item('Edit Custom Units',
                     'Add and edit your own custom units',
                     valid=True,
@@ -177,14 +272,13 @@ def main(wf):
 
         if mode == 'currencies':
 
-            currencies = sorted([(name, symbol) for (symbol, name)
-                                in CURRENCIES.items()])
+            currencies = currency_index(wf)
 
             if query:
                 currencies = wf.filter(query, currencies,
-                                       key=lambda t: ' '.join(t),
                                        match_on=MATCH_ALL ^ MATCH_ALLCHARS,
-                                       min_score=30)
+                                       min_score=30,
+                                       narrow_cache='currencies')
 
             else:  # Show last update time
                 age = wf.cached_data_age(CURRENCY_CACHE_NAME)
@@ -199,10 +293,48 @@ def main(wf):
                             'Try a different query',
                             icon=ICON_WARNING)
 
+            favourites = get_favourites(wf)
             for name, symbol in currencies:
+                if symbol in favourites:
+                    wf.add_item('{0} // {1}'.format(name, symbol),
+                                'Use `{0}` in conversions. '
+                                '↩ to remove from favourites'.format(symbol),
+                                valid=True,
+                                arg='--delfav {0}'.format(symbol),
+                                icon=ICON_FAVOURITE)
+                else:
+                    wf.add_item('{0} // {1}'.format(name, symbol),
+                                'Use `{0}` in conversions. '
+                                '↩ to add to favourites'.format(symbol),
+                                valid=True,
+                                arg='--addfav {0}'.format(symbol),
+                                icon=ICON_CURRENCY)
+
+            wf.send_feedback()
+
+        elif mode == 'favourites':
+
+            favourites = [(CURRENCIES.get(symbol, symbol), symbol)
+                          for symbol in get_favourites(wf)]
+
+            if query:
+                favourites = wf.filter(query, favourites,
+                                       key=lambda t: ' '.join(t),
+                                       match_on=MATCH_ALL ^ MATCH_ALLCHARS,
+                                       min_score=30)
+
+            if not favourites:
+                wf.add_item('No favourite currencies',
+                            'Add favourites from the list of currencies',
+                            autocomplete=' currencies {0} '.format(DELIMITER),
+                            icon=ICON_WARNING)
+
+            for name, symbol in favourites:
                 wf.add_item('{0} // {1}'.format(name, symbol),
-                            'Use `{0}` in conversions'.format(symbol),
-                            icon=ICON_CURRENCY)
+                            '↩ to remove from favourites',
+                            valid=True,
+                            arg='--delfav {0}'.format(symbol),
+                            icon=ICON_FAVOURITE)
 
             wf.send_feedback()
 
@@ -230,6 +362,6 @@ def main(wf):
 
 
 if __name__ == '__main__':
-    wf = Workflow()
+    wf = Workflow(cache_manifest=True)
     log = wf.logger
     sys.exit(wf.run(main))
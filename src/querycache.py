@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-12-06
+#
+
+"""Small persistent LRU cache of Script Filter results."""
+
+from __future__ import print_function, unicode_literals
+
+import cPickle
+import errno
+import hashlib
+import os
+
+from workflow.workflow import atomic_writer
+
+
+def file_fingerprint(path):
+    """Return `(mtime, size)` of file at `path` or `None`.
+
+    Args:
+        path (unicode): Path to file.
+
+    Returns:
+        tuple: `(mtime, size)` or `None` if file doesn't exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+class QueryCache(object):
+    """Least-recently-used mapping of keys to Script Filter items.
+
+    Each entry is a separate pickle in a directory in the workflow's
+    cache directory, so it persists between runs and a lookup only
+    reads the entry it needs. A hit doesn't rewrite anything: the
+    entry file's modification time is its access time, and it is
+    updated with `os.utime()`. Least recently used entries are evicted
+    when a new entry is stored.
+
+    Keys must be hashable, picklable and have a stable `repr()`, and
+    must contain everything the results depend on, e.g. the query and
+    fingerprints of the data used to answer it. Stale entries are never
+    matched and are evicted when the cache is full.
+
+    Args:
+        wf (workflow.Workflow): Workflow to store cache with.
+        name (unicode): Name of the cache directory.
+        size (int): Maximum number of cached queries.
+    """
+
+    def __init__(self, wf, name, size):
+        self.wf = wf
+        self.name = name
+        self.size = size
+        self.dirpath = wf.cachefile(name)
+
+    def _path(self, key):
+        """Return path of entry file for `key`."""
+        digest = hashlib.md5(repr(key)).hexdigest()
+        return os.path.join(self.dirpath, digest + '.cpickle')
+
+    def get(self, key):
+        """Return items cached for `key`.
+
+        Args:
+            key (tuple): Key to look up.
+
+        Returns:
+            list: Cached items or `None` if there are none.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file_obj:
+                cached_key, items = cPickle.load(file_obj)
+        except IOError as err:
+            if err.errno != errno.ENOENT:
+                raise
+            return None
+        except (EOFError, TypeError, ValueError, cPickle.UnpicklingError):
+            self.wf.logger.warning('Removing corrupt cache entry : %s', path)
+            self._remove(path)
+            return None
+
+        if cached_key != key:  # Hash collision
+            return None
+
+        try:  # Mark as most recently used
+            os.utime(path, None)
+        except OSError:  # Evicted by another process
+            pass
+        return items
+
+    def set(self, key, items):
+        """Cache `items` for `key`, evicting least recently used entries.
+
+        Args:
+            key (tuple): Key to store `items` under.
+            items (list): Items to cache.
+        """
+        if not os.path.isdir(self.dirpath):
+            os.makedirs(self.dirpath)
+
+        path = self._path(key)
+        with atomic_writer(path, 'wb') as file_obj:
+            cPickle.dump((key, items), file_obj, protocol=-1)
+
+        self._evict(path)
+
+    def _evict(self, keep):
+        """Delete least recently used entries if cache is full.
+
+        Args:
+            keep (unicode): Path of the new entry, which is never
+                evicted, even if the filesystem's timestamps are too
+                coarse to tell it from older entries.
+        """
+        names = [n for n in os.listdir(self.dirpath) if n.endswith('.cpickle')]
+        if len(names) <= self.size:
+            return
+
+        entries = []
+        for name in names:
+            path = os.path.join(self.dirpath, name)
+            if path == keep:
+                continue
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:  # Already evicted by another process
+                pass
+
+        entries.sort()
+        for _, path in entries[:len(entries) + 1 - self.size]:
+            self._remove(path)
+
+    def _remove(self, path):
+        """Delete entry file at `path` if it still exists."""
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
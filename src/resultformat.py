@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-12-07
+#
+
+"""Format conversion results with sensible precision and unit prefixes."""
+
+from __future__ import print_function, unicode_literals
+
+import math
+
+# Results at least this large are shown in scientific notation
+LARGE = 1e15
+# Non-zero results smaller than this are shown in scientific notation
+TINY = 1e-9
+# Allowance for rounding errors in logarithms, e.g. of 1024 ** 2
+EPSILON = 1e-9
+# Results smaller than this relative to their reference magnitude are
+# rounding errors, e.g. of pint's degF offset, which has 9 significant
+# figures
+NOISE = 1e-8
+
+
+class PrefixTable(object):
+    """Prefixes of a registry that are powers of `base`.
+
+    Finding the best prefix for a value is one logarithm and one
+    dictionary lookup: the prefixes are indexed by their power of
+    `base`, e.g. `kilo` is 1 and `milli` is -1 for base 1000.
+
+    Args:
+        ureg (pint.UnitRegistry): Registry to take prefixes from.
+        base (int, optional): 1000 for SI prefixes, 1024 for binary
+            prefixes.
+    """
+
+    def __init__(self, ureg, base=1000):
+        self.step = math.log10(base)
+        # {prefix name: scale}
+        self.scales = {}
+        # {power of base: (prefix name, scale)}
+        self.powers = {}
+
+        for definition in ureg._prefixes.values():
+            # The empty prefix's converter is a plain number
+            scale = getattr(definition.converter, 'scale',
+                            definition.converter)
+            power = math.log10(scale) / self.step
+            if abs(power - round(power)) < EPSILON:
+                self.scales[definition.name] = scale
+                self.powers[int(round(power))] = (definition.name, scale)
+
+        self.min_power = min(self.powers)
+        self.max_power = max(self.powers)
+
+    def best(self, value):
+        """Return prefix that gives `value` between 1 and `base`.
+
+        Args:
+            value (float): Value in unprefixed units.
+
+        Returns:
+            tuple: `(prefix name, scale)`. The name is empty if `value`
+                is best shown without a prefix.
+        """
+        if not value:
+            return self.powers[0]
+        power = int(math.floor(math.log10(abs(value)) / self.step + EPSILON))
+        power = max(self.min_power, min(self.max_power, power))
+        return self.powers[power]
+
+
+class ResultFormatter(object):
+    """Format numbers and units of conversion results.
+
+    Numbers are shown with `decimal_places` decimal places, except
+    where that would hide them: small numbers get `decimal_places`
+    significant figures instead of rounding to zero, and numbers that
+    are huge or tiny are shown in scientific notation.
+
+    Numbers can be given a reference magnitude, e.g. of the quantity
+    they were converted from. Numbers that are tiny compared to it are
+    rounding errors and shown as zero.
+
+    The thresholds and format strings are computed once, so
+    `format_many()` can format long lists of results quickly.
+
+    Args:
+        decimal_places (int, optional): Number of decimal places.
+        prefix_tables (dict, optional): `{unit name: [PrefixTable, ...]}`
+            mapping of units whose results are shown with the best
+            prefix, e.g. `1.5 kilometer` instead of `1500 meter`.
+            Values are rescaled with the first table that contains
+            their current prefix.
+    """
+
+    def __init__(self, decimal_places=2, prefix_tables=None):
+        self.decimal_places = decimal_places
+        self.prefix_tables = prefix_tables or {}
+        # Smallest number that doesn't round to zero
+        self._smallest = 10 ** -decimal_places
+        self._significant = max(decimal_places, 1)
+        self._fixed = '%%0.%df' % decimal_places
+        self._scientific = '%%0.%de' % decimal_places
+
+    def number(self, value, reference=0):
+        """Return `value` formatted for display.
+
+        Args:
+            value (float): Number to format.
+            reference (float, optional): Magnitude `value` was
+                calculated from. If `value` is smaller than `NOISE`
+                times it, it's shown as zero.
+
+        Returns:
+            unicode: Formatted number.
+        """
+        size = abs(value)
+        if size < abs(reference) * NOISE:
+            return self._fixed % 0.0
+        if size == 0 or self._smallest <= size < LARGE:
+            return self._fixed % value
+        if not TINY <= size < LARGE:  # Also NaN
+            return self._scientific % value
+        decimals = self._significant - 1 - int(math.floor(math.log10(size)))
+        return '%0.*f' % (decimals, value)
+
+    def format(self, value, name, reference=0):
+        """Return `value` and unit `name` formatted for display.
+
+        Args:
+            value (float): Number to format.
+            name (unicode): Display name of units.
+            reference (float, optional): See `number()`.
+
+        Returns:
+            unicode: Formatted result, e.g. `1.50 kilometer`.
+        """
+        return '%s %s' % (self.number(value, reference), name)
+
+    def format_many(self, values, names, references=None):
+        """Format many results at once.
+
+        Args:
+            values (iterable): Numbers to format.
+            names (iterable): Display names of the units of `values`.
+            references (iterable, optional): Reference magnitudes of
+                `values`. See `number()`.
+
+        Returns:
+            list: Formatted results.
+        """
+        number = self.number
+        if references is None:
+            return ['%s %s' % (number(value), name)
+                    for value, name in zip(values, names)]
+        return ['%s %s' % (number(value, reference), name)
+                for value, name, reference in zip(values, names, references)]
+
+    def rescale(self, value, prefix, unit):
+        """Return `value` in `prefix` + `unit` in the best prefix of `unit`.
+
+        Args:
+            value (float): Value to rescale.
+            prefix (unicode): Name of current prefix of `value`, e.g.
+                `kilo`, or an empty string.
+            unit (unicode): Name of unprefixed unit, e.g. `meter`.
+
+        Returns:
+            tuple: `(value, prefix)`. Unchanged if `unit` isn't in
+                `prefix_tables` or no table contains `prefix`, e.g.
+                `centi`.
+        """
+        for table in self.prefix_tables.get(unit, ()):
+            if prefix in table.scales:
+                value *= table.scales[prefix]
+                prefix, scale = table.best(value)
+                return value / scale, prefix
+        return value, prefix
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+# Created on 2015-12-05
+#
+
+"""Precomputed tables of compatible units and their conversion factors."""
+
+from __future__ import print_function, unicode_literals
+
+from bisect import bisect_left
+import math
+
+from vendor.pint.context import _freeze
+from vendor.pint.unit import UnitsContainer
+
+
+def readability(value):
+    """Return how far `value` is from a comfortably-sized number.
+
+    Used to rank suggested conversions. Lower is better: numbers
+    between 1 and 100 score best.
+
+    Args:
+        value (float): Number to rank.
+
+    Returns:
+        float: Distance of `value` from 10 in orders of magnitude.
+    """
+    if not value:
+        return 0.0
+    return abs(math.log10(abs(value)) - 1)
+
+
+def is_multiplicative(ureg, units):
+    """Return `True` if none of `units` has an offset.
+
+    Args:
+        ureg (pint.UnitRegistry): Registry `units` belong to.
+        units (pint.unit.UnitsContainer): Units to check.
+
+    Returns:
+        bool: `False` if `units` contains e.g. `degC`.
+    """
+    return all(ureg._units[name].is_multiplicative for name in units)
+
+
+def find_aliases(ureg, units):
+    """Return units in `units` that are defined as another unit in `units`.
+
+    Args:
+        ureg (pint.UnitRegistry): Registry `units` belong to.
+        units (list): Unit expressions, e.g. `kph` or `kilometer / hour`.
+
+    Returns:
+        dict: `{alias: unit}`. `unit` is the expression in `units` that
+            `alias` is (via other aliases) defined as, e.g.
+            `{'kph': 'kilometer / hour'}`.
+    """
+    exprs = dict((_freeze(ureg.parse_units(expr)), expr) for expr in units)
+
+    def defined_as(expr):
+        """Return the unit in `units` that `expr` is defined as or `None`."""
+        definition = ureg._units.get(expr)
+        if (definition is None or definition.is_base or
+                not definition.is_multiplicative or
+                definition.converter.scale != 1):
+            return None
+        reference = UnitsContainer(dict(
+            (ureg.get_name(name), exponent)
+            for name, exponent in definition.reference.items()))
+        return exprs.get(_freeze(reference))
+
+    aliases = {}
+    for expr in units:
+        unit, seen = expr, set([expr])
+        target = defined_as(unit)
+        while target is not None and target not in seen:
+            unit = target
+            seen.add(unit)
+            target = defined_as(unit)
+        if unit != expr:
+            aliases[expr] = unit
+    return aliases
+
+
+class UnitTable(object):
+    """Conversion factors of units to base units, grouped by dimensionality.
+
+    Built once from `UnitRegistry._dimensional_equivalents` (which
+    doesn't contain prefixed units, hence `extra_units`), so that
+    converting a quantity to all compatible units is one dimension
+    vector lookup and one multiplication per unit instead of a
+    `Quantity.to()` call per unit.
+
+    Units that are defined as exactly another unit in the table, e.g.
+    `kph` (`kilometer / hour`) or `Bq` (`Hz`), aren't added again.
+    Their names are indexed as names of the other unit instead. Units
+    that only happen to have the same factor, e.g. `hertz` and `baud`,
+    are different units and get their own entries.
+
+    `delta_*` units (temperature differences) are left out, as they
+    aren't what users want to see when converting temperatures. If the
+    quantity being converted is a temperature difference, its offset
+    units are converted to their `delta_*` counterparts instead.
+
+    The table contains only builtin types, so it can be pickled and
+    cached.
+
+    Args:
+        ureg (pint.UnitRegistry): Registry to build table from.
+        extra_units (iterable, optional): Unit expressions to add to
+            the table, e.g. `kilometer` or `kilometer / hour`.
+        exclude (iterable, optional): Unit names not to add to the table.
+    """
+
+    def __init__(self, ureg, extra_units=(), exclude=()):
+        # {dimension vector: (frozen base units, [entry, ...])}
+        # Entries are `(units, display name, factor)` tuples. `factor`
+        # is `None` for units with an offset (i.e. temperatures)
+        self.tables = {}
+        # {dimension vector: [(lowercase name, entry index), ...]}
+        # Sorted for prefix searches
+        self.names = {}
+
+        units = set()
+        for names in ureg._dimensional_equivalents.values():
+            units.update(names)
+        units.update(extra_units)
+        units.difference_update(exclude)
+        units = sorted(u for u in units if not u.startswith('delta_'))
+
+        aliases = find_aliases(ureg, units)
+        positions = {}
+        for expr in units:
+            if expr not in aliases:
+                positions[expr] = self._add(ureg, expr)
+
+        for alias, expr in aliases.items():
+            if positions[expr]:
+                self._index(ureg, alias, *positions[expr])
+
+        for names in self.names.values():
+            names.sort()
+
+    def _add(self, ureg, expr):
+        """Add unit expression `expr` to the table.
+
+        Returns:
+            tuple: `(dimension vector, entry index)` of the new entry
+                or `None` if `expr` is dimensionless.
+        """
+        parsed = ureg.parse_units(expr)
+        factor, base_units = ureg.get_base_units(parsed)
+        dim = ureg.get_dimension_vector(parsed)
+        if not dim:  # Dimensionless
+            return None
+
+        if not is_multiplicative(ureg, parsed):
+            factor = None
+
+        table = self.tables.setdefault(dim, (_freeze(base_units), []))
+        entries = table[1]
+        i = len(entries)
+        entries.append((expr, '{0}'.format(parsed), factor))
+        self._index(ureg, expr, dim, i)
+        return dim, i
+
+    def _index(self, ureg, expr, dim, i):
+        """Index names of unit expression `expr` as names of entry `i`."""
+        # Index name, symbol and aliases of single units
+        names = set([expr])
+        if expr in ureg._units:
+            definition = ureg._units[expr]
+            names.add(definition.symbol)
+            names.update(definition.aliases)
+
+        index = self.names.setdefault(dim, [])
+        for name in names:
+            index.append((name.lower(), i))
+
+    def matching(self, dim, partial):
+        """Return indices of entries whose names start with `partial`.
+
+        Args:
+            dim (tuple): Dimension vector to search.
+            partial (unicode): Start of a unit name, symbol or alias.
+
+        Returns:
+            set: Indices of matching entries in `self.tables[dim]`.
+        """
+        names = self.names.get(dim, [])
+        partial = partial.lower()
+        found = set()
+        for i in range(bisect_left(names, (partial,)), len(names)):
+            name, j = names[i]
+            if not name.startswith(partial):
+                break
+            found.add(j)
+        return found
+
+    def conversions(self, ureg, qty, partial='', limit=15):
+        """Convert `qty` to compatible units in the table.
+
+        Args:
+            ureg (pint.UnitRegistry): Registry `qty` belongs to.
+            qty (pint.Quantity): Quantity to convert.
+            partial (unicode, optional): Only convert to units whose
+                name, symbol or alias starts with this.
+            limit (int, optional): Maximum number of results.
+
+        Returns:
+            list: `(value, units, display name)` tuples, the most
+                readable values first. `units` is the unit expression
+                in the table.
+        """
+        src = qty.units
+        dim = ureg.get_dimension_vector(src)
+        if dim not in self.tables:
+            return []
+
+        base_units, entries = self.tables[dim]
+        src_factor, units = ureg.get_base_units(src)
+        if is_multiplicative(ureg, src) and _freeze(units) == base_units:
+            base = qty.magnitude * src_factor
+        else:  # Offset unit or unexpected base units
+            src_factor = None
+            base = ureg.convert(qty.magnitude, src,
+                                UnitsContainer(dict(base_units)))
+
+        if partial:
+            indices = self.matching(dim, partial)
+        else:
+            indices = range(len(entries))
+
+        src_name = '{0}'.format(src)
+        is_delta = any(unit.startswith('delta_') for unit in src)
+        results = []
+        for i in indices:
+            expr, name, factor = entries[i]
+            if factor is None and is_delta:
+                # Difference of offset units, e.g. degC -> delta_degC
+                expr = 'delta_' + expr
+                parsed = ureg.parse_units(expr)
+                name = '{0}'.format(parsed)
+                factor = ureg.get_base_units(parsed)[0]
+            if name == src_name or (factor and factor == src_factor):
+                continue  # Same unit as source
+            if factor is None:
+                value = ureg.convert(base, UnitsContainer(dict(base_units)),
+                                     ureg.parse_units(expr))
+            else:
+                value = base / factor
+            results.append((value, expr, name))
+
+        results.sort(key=lambda t: (readability(t[0]), t[2]))
+        return results[:limit]
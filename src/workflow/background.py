@@ -10,6 +10,15 @@
 
 """
 Run background tasks
+
+Tasks are added to a persistent queue in the workflow's cache directory
+and run one after the other by a single worker process, which exits when
+the queue is empty.
+
+The worker holds an exclusive :func:`fcntl.flock` lock for as long as it
+runs, so whether it's alive is known without PIDs, and the lock is
+released if it dies.
+
 """
 
 from __future__ import print_function, unicode_literals
@@ -17,11 +26,12 @@ from __future__ import print_function, unicode_literals
 import sys
 import os
 import subprocess
-import pickle
+import time
+import cPickle
 
-from workflow import Workflow
+from workflow import Workflow, LockFile, atomic_writer
 
-__all__ = ['is_running', 'run_in_background']
+__all__ = ['is_running', 'queue_in_background', 'run_in_background']
 
 _wf = None
 
@@ -33,219 +43,248 @@ def wf():
     return _wf
 
 
-def _arg_cache(name):
-    """Return path to pickle cache file for arguments
+def _queue_file():
+    """Return path to task queue file
 
-    :param name: name of task
-    :type name: ``unicode``
-    :returns: Path to cache file
+    :returns: Path to queue file
     :rtype: ``unicode`` filepath
 
     """
 
-    return wf().cachefile('{0}.argcache'.format(name))
+    return wf().cachefile('__workflow_task_queue.cpickle')
 
 
-def _pid_file(name):
-    """Return path to PID file for ``name``
+def _worker_lock():
+    """Return lock held by the worker process while it runs
 
-    :param name: name of task
-    :type name: ``unicode``
-    :returns: Path to PID file for task
-    :rtype: ``unicode`` filepath
+    :returns: Lock on worker lock file
+    :rtype: :class:`~workflow.workflow.LockFile`
 
     """
 
-    return wf().cachefile('{0}.pid'.format(name))
+    return LockFile(wf().cachefile('__workflow_task_worker'))
 
 
-def _process_exists(pid):
-    """Check if a process with PID ``pid`` exists
+def _worker_running():
+    """Check if a worker process holds the worker lock
 
-    :param pid: PID to check
-    :type pid: ``int``
-    :returns: ``True`` if process exists, else ``False``
+    :returns: ``True`` if a worker is running, else ``False``
     :rtype: ``Boolean``
+
     """
 
-    try:
-        os.kill(pid, 0)
-    except OSError:  # not running
+    lock = _worker_lock()
+    if lock.acquire(blocking=False):
+        lock.release()
         return False
     return True
 
 
+def _load_queue():
+    """Load task queue from cache directory
+
+    The queue is a dictionary with the keys ``running`` (name of the
+    running task or ``None``) and ``tasks`` (list of queued tasks, oldest
+    first). Each task is a dictionary with the keys ``name``, ``args``,
+    ``kwargs`` and ``queued`` (time the task was first queued).
+
+    :returns: Task queue
+    :rtype: ``dict``
+
+    """
+
+    try:
+        with open(_queue_file(), 'rb') as file_obj:
+            return cPickle.load(file_obj)
+    except (IOError, EOFError, cPickle.UnpicklingError):
+        return {'running': None, 'tasks': []}
+
+
+def _save_queue(queue):
+    """Save task queue to cache directory
+
+    :param queue: Task queue as returned by :func:`_load_queue`
+    :type queue: ``dict``
+
+    """
+
+    with atomic_writer(_queue_file(), 'wb') as file_obj:
+        cPickle.dump(queue, file_obj, protocol=-1)
+
+
 def is_running(name):
     """
-    Test whether task is running under ``name``
+    Test whether task is queued or running under ``name``
 
     :param name: name of task
     :type name: ``unicode``
-    :returns: ``True`` if task with name ``name`` is running, else ``False``
+    :returns: ``True`` if task with name ``name`` is queued or running,
+        else ``False``
     :rtype: ``Boolean``
 
     """
-    pidfile = _pid_file(name)
-    if not os.path.exists(pidfile):
-        return False
 
-    with open(pidfile, 'rb') as file_obj:
-        pid = int(file_obj.read().strip())
+    with LockFile(_queue_file(), shared=True):
+        queue = _load_queue()
 
-    if _process_exists(pid):
+    if not _worker_running():
+        return False
+
+    if queue['running'] == name:
         return True
 
-    elif os.path.exists(pidfile):
-        os.unlink(pidfile)
+    return any(task['name'] == name for task in queue['tasks'])
+
+
+def _start_worker():
+    """Start a worker process without waiting for it"""
+
+    cmd = ['/usr/bin/python', __file__]
+    wf().logger.debug('Starting worker %r ...', cmd)
 
-    return False
+    with open(os.devnull, 'r+b') as devnull:
+        subprocess.Popen(cmd, cwd=wf().workflowdir, stdin=devnull,
+                         stdout=devnull, stderr=devnull, close_fds=True,
+                         preexec_fn=os.setsid)
 
 
-def _background(stdin='/dev/null', stdout='/dev/null',
-                stderr='/dev/null'):  # pragma: no cover
-    """Fork the current process into a background daemon.
+def _queue(name, args, kwargs, start_worker, max_wait=None):
+    """Add task to queue and start a worker if required
 
-    :param stdin: where to read input
-    :type stdin: filepath
-    :param stdout: where to write stdout output
-    :type stdout: filepath
-    :param stderr: where to write stderr output
-    :type stderr: filepath
+    See :func:`run_in_background` and :func:`queue_in_background`.
 
     """
 
-    # Do first fork.
-    try:
-        pid = os.fork()
-        if pid > 0:
-            sys.exit(0)  # Exit first parent.
-    except OSError as e:
-        wf().logger.critical("fork #1 failed: ({0:d}) {1}".format(
-                             e.errno, e.strerror))
-        sys.exit(1)
-    # Decouple from parent environment.
-    os.chdir(wf().workflowdir)
-    os.umask(0)
-    os.setsid()
-    # Do second fork.
-    try:
-        pid = os.fork()
-        if pid > 0:
-            sys.exit(0)  # Exit second parent.
-    except OSError as e:
-        wf().logger.critical("fork #2 failed: ({0:d}) {1}".format(
-                             e.errno, e.strerror))
-        sys.exit(1)
-    # Now I am a daemon!
-    # Redirect standard file descriptors.
-    si = file(stdin, 'r', 0)
-    so = file(stdout, 'a+', 0)
-    se = file(stderr, 'a+', 0)
-    if hasattr(sys.stdin, 'fileno'):
-        os.dup2(si.fileno(), sys.stdin.fileno())
-    if hasattr(sys.stdout, 'fileno'):
-        os.dup2(so.fileno(), sys.stdout.fileno())
-    if hasattr(sys.stderr, 'fileno'):
-        os.dup2(se.fileno(), sys.stderr.fileno())
+    now = time.time()
+    task = {'name': name, 'args': args, 'kwargs': kwargs, 'queued': now}
+
+    with LockFile(_queue_file()):
+        queue = _load_queue()
+        worker_running = _worker_running()
+
+        if worker_running and queue['running'] == name:
+            wf().logger.debug('Task `%s` is already running', name)
+            return
+
+        for i, queued in enumerate(queue['tasks']):
+            if queued['name'] == name:
+                task['queued'] = queued.get('queued', now)
+                if max_wait is not None and now - task['queued'] >= max_wait:
+                    wf().logger.debug('Task `%s` waited %0.0fs for a worker',
+                                      name, now - task['queued'])
+                    start_worker = True
+                if queued == task and (worker_running or not start_worker):
+                    wf().logger.debug('Task `%s` is already queued', name)
+                    return
+                queue['tasks'][i] = task
+                break
+        else:
+            queue['tasks'].append(task)
+
+        if not worker_running:
+            if start_worker:
+                _start_worker()
+            queue['running'] = None
+
+        _save_queue(queue)
+
+    wf().logger.debug('Task `%s` queued', name)
 
 
 def run_in_background(name, args, **kwargs):
-    """Pickle arguments to cache file, then call this script again via
-    :func:`subprocess.call`.
+    """Add a command to the task queue and make sure a worker is running.
 
     :param name: name of task
     :type name: ``unicode``
     :param args: arguments passed as first argument to :func:`subprocess.call`
     :param \**kwargs: keyword arguments to :func:`subprocess.call`
-    :returns: exit code of sub-process
-    :rtype: ``int``
-
-    When you call this function, it caches its arguments and then calls
-    ``background.py`` in a subprocess. The Python subprocess will load the
-    cached arguments, fork into the background, and then run the command you
-    specified.
 
-    This function will return as soon as the ``background.py`` subprocess has
-    forked, returning the exit code of *that* process (i.e. not of the command
-    you're trying to run).
+    This function returns immediately. It doesn't wait for the worker
+    process to start, let alone for the command to run. If the command
+    fails, an error will be written to the log file.
 
-    If that process fails, an error will be written to the log file.
+    Tasks are identified by ``name``. If a task is already running under
+    the same name, this function does nothing. If one is queued, its
+    arguments are replaced with these, so it only runs once.
 
-    If a process is already running under the same name, this function will
-    return immediately and will not run the specified command.
+    A worker process is only started if none is running.
 
     """
 
-    if is_running(name):
-        wf().logger.info('Task `{0}` is already running'.format(name))
-        return
+    _queue(name, args, kwargs, True)
 
-    argcache = _arg_cache(name)
 
-    # Cache arguments
-    with open(argcache, 'wb') as file_obj:
-        pickle.dump({'args': args, 'kwargs': kwargs}, file_obj)
-        wf().logger.debug('Command arguments cached to `{0}`'.format(argcache))
+def queue_in_background(name, args, max_wait=None, **kwargs):
+    """Add a command to the task queue without starting a worker.
 
-    # Call this script
-    cmd = ['/usr/bin/python', __file__, name]
-    wf().logger.debug('Calling {0!r} ...'.format(cmd))
-    retcode = subprocess.call(cmd)
-    if retcode:  # pragma: no cover
-        wf().logger.error('Failed to call task in background')
-    else:
-        wf().logger.debug('Executing task `{0}` in background...'.format(name))
-    return retcode
+    .. versionadded:: 1.14
 
+    Arguments are the same as for :func:`run_in_background`.
 
-def main(wf):  # pragma: no cover
-    """
-    Load cached arguments, fork into background, then call
-    :meth:`subprocess.call` with cached arguments
-
-    """
-
-    name = wf.args[0]
-    argcache = _arg_cache(name)
-    if not os.path.exists(argcache):
-        wf.logger.critical('No arg cache found : {0!r}'.format(argcache))
-        return 1
-
-    # Load cached arguments
-    with open(argcache, 'rb') as file_obj:
-        data = pickle.load(file_obj)
+    :param max_wait: number of seconds after which a task that is
+        still queued starts a worker when it's queued again.
+        ``None`` (the default) means never.
+    :type max_wait: ``int``
 
-    # Cached arguments
-    args = data['args']
-    kwargs = data['kwargs']
+    The command runs when a worker is next started by
+    :func:`run_in_background`, or straight away if a worker is already
+    running. Use it for tasks that aren't urgent, so they don't cost
+    a new process. If nothing else starts a worker, set ``max_wait``
+    so the task runs eventually.
 
-    # Delete argument cache file
-    os.unlink(argcache)
-
-    pidfile = _pid_file(name)
+    """
 
-    # Fork to background
-    _background()
+    _queue(name, args, kwargs, False, max_wait)
 
-    # Write PID to file
-    with open(pidfile, 'wb') as file_obj:
-        file_obj.write('{0}'.format(os.getpid()))
 
-    # Run the command
-    try:
-        wf.logger.debug('Task `{0}` running'.format(name))
-        wf.logger.debug('cmd : {0!r}'.format(args))
+def main(wf):  # pragma: no cover
+    """
+    Run queued tasks until the queue is empty
 
-        retcode = subprocess.call(args, **kwargs)
+    Exits if another worker is running.
 
-        if retcode:
-            wf.logger.error('Command failed with [{0}] : {1!r}'.format(
-                            retcode, args))
+    """
 
-    finally:
-        if os.path.exists(pidfile):
-            os.unlink(pidfile)
-        wf.logger.debug('Task `{0}` finished'.format(name))
+    worker_lock = _worker_lock()
+    if not worker_lock.acquire(blocking=False):
+        wf.logger.debug('Worker already running')
+        return 0
+
+    while True:
+        with LockFile(_queue_file()):
+            queue = _load_queue()
+
+            if not queue['tasks']:  # Finished
+                queue['running'] = None
+                _save_queue(queue)
+                # Release while the queue is locked, so a task queued
+                # after this starts a new worker
+                worker_lock.release()
+                return 0
+
+            task = queue['tasks'].pop(0)
+            queue['running'] = task['name']
+            _save_queue(queue)
+
+        # Run the command
+        name, args = task['name'], task['args']
+        wf.logger.debug('Task `%s` running', name)
+        wf.logger.debug('cmd : %r', args)
+
+        # Don't let the command inherit the worker lock
+        kwargs = dict(task['kwargs'])
+        kwargs.setdefault('close_fds', True)
+
+        try:
+            retcode = subprocess.call(args, **kwargs)
+        except OSError as err:
+            wf.logger.error('Command failed : %s : %r', err, args)
+        else:
+            if retcode:
+                wf.logger.error('Command failed with [%s] : %r',
+                                retcode, args)
+
+        wf.logger.debug('Task `%s` finished', name)
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -24,10 +24,11 @@ Self-updating from GitHub
 
 from __future__ import print_function, unicode_literals
 
+import hashlib
 import os
-import tempfile
 import re
 import subprocess
+import time
 
 import workflow
 import web
@@ -37,6 +38,12 @@ import web
 
 RELEASES_BASE = 'https://api.github.com/repos/{0}/releases'
 
+# Number of bytes of a download to read into memory at a time
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Minimum number of seconds between writes of download progress
+PROGRESS_INTERVAL = 0.5
+
 
 _wf = None
 
@@ -167,12 +174,57 @@ class Version(object):
         return "Version('{0}')".format(str(self))
 
 
-def download_workflow(url):
-    """Download workflow at ``url`` to a local temporary file
+def _verify_download(path, size=None, digest=None):
+    """Check size and digest of downloaded file
+
+    :param path: path to downloaded file
+    :param size: expected size in bytes or ``None``
+    :param digest: expected digest in the form ``algorithm:hexdigest``
+        (e.g. ``sha256:2cf2...``) or ``None``
+    :returns: ``True`` if file matches, else ``False``
+
+    """
+
+    if size is not None and os.path.getsize(path) != size:
+        return False
+
+    if digest:
+        algorithm, _, expected = digest.partition(':')
+        h = hashlib.new(algorithm)
+        with open(path, 'rb') as file_obj:
+            for chunk in iter(lambda: file_obj.read(DOWNLOAD_CHUNK_SIZE), b''):
+                h.update(chunk)
+        if h.hexdigest() != expected.lower():
+            return False
+
+    return True
+
+
+def _save_download_status(status):
+    """Save download progress for :attr:`Workflow.update_download`"""
+
+    status['updated'] = time.time()
+    wf().cache_data('__workflow_update_download', status)
+
+
+def download_workflow(url, size=None, digest=None):
+    """Download workflow at ``url`` to the workflow's cache directory
+
+    .. versionchanged:: 1.14
+        Downloads are streamed to disk and resumed (with HTTP ``Range``
+        requests) if interrupted. Progress is saved for
+        :attr:`~workflow.workflow.Workflow.update_download`. A file
+        already downloaded and verified is reused.
 
     :param url: URL to .alfredworkflow file in GitHub repo
+    :param size: expected size of file in bytes (from GitHub's release
+        asset metadata)
+    :param digest: expected digest of file, e.g. ``sha256:2cf2...``
     :returns: path to downloaded file
 
+    Raises :class:`ValueError` if the downloaded file doesn't have the
+    expected size or digest.
+
     """
 
     filename = url.split("/")[-1]
@@ -181,16 +233,82 @@ def download_workflow(url):
             not filename.endswith('.alfredworkflow')):
         raise ValueError('Attachment `{0}` not a workflow'.format(filename))
 
-    local_path = os.path.join(tempfile.gettempdir(), filename)
-
-    wf().logger.debug(
-        'Downloading updated workflow from `{0}` to `{1}` ...'.format(
-            url, local_path))
-
-    response = web.get(url)
-
-    with open(local_path, 'wb') as output:
-        output.write(response.content)
+    local_path = wf().cachefile(filename)
+    # Incomplete download
+    partial_path = local_path + '.part'
+
+    status = {'url': url, 'filename': filename, 'received': 0,
+              'size': size, 'state': 'downloading'}
+
+    if os.path.exists(local_path):
+        if _verify_download(local_path, size, digest):
+            wf().logger.debug('Using downloaded workflow `%s`', local_path)
+            status.update(received=os.path.getsize(local_path), state='done')
+            _save_download_status(status)
+            return local_path
+        os.unlink(local_path)
+
+    received = 0
+    headers = {}
+    if os.path.exists(partial_path):
+        received = os.path.getsize(partial_path)
+        headers['Range'] = 'bytes={0}-'.format(received)
+        # Offsets must refer to the file, not a compressed response
+        headers['Accept-Encoding'] = 'identity'
+
+    wf().logger.debug('Downloading updated workflow from `%s` to `%s` '
+                      '(from byte %d) ...', url, local_path, received)
+
+    _save_download_status(status)
+
+    try:
+        response = web.get(url, headers=headers)
+
+        if response.status_code == 416:  # Range not satisfiable. Start again
+            wf().logger.debug('Discarding partial download `%s`',
+                              partial_path)
+            os.unlink(partial_path)
+            received = 0
+            response = web.get(url)
+
+        response.raise_for_status()
+
+        if response.status_code == 206:  # Resuming
+            mode = 'ab'
+        else:  # Server ignored `Range`
+            mode = 'wb'
+            received = 0
+
+        if status['size'] is None and response.headers.get('content-length'):
+            status['size'] = received + int(
+                response.headers['content-length'])
+
+        status['received'] = received
+        _save_download_status(status)
+
+        last_saved = time.time()
+        with open(partial_path, mode) as file_obj:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                file_obj.write(chunk)
+                status['received'] += len(chunk)
+                if time.time() - last_saved >= PROGRESS_INTERVAL:
+                    _save_download_status(status)
+                    last_saved = time.time()
+
+    except Exception:
+        status['state'] = 'failed'
+        _save_download_status(status)
+        raise
+
+    if not _verify_download(partial_path, size, digest):
+        os.unlink(partial_path)
+        status['state'] = 'failed'
+        _save_download_status(status)
+        raise ValueError('Downloaded file `{0}` is corrupt'.format(filename))
+
+    os.rename(partial_path, local_path)
+    status['state'] = 'done'
+    _save_download_status(status)
 
     return local_path
 
@@ -214,7 +332,9 @@ def get_valid_releases(github_slug):
 
     :param github_slug: ``username/repo`` for workflow's GitHub repo
     :returns: list of dicts. Each :class:`dict` has the form
-        ``{'version': '1.1', 'download_url': 'http://github.com/...'}``
+        ``{'version': '1.1', 'download_url': 'http://github.com/...',
+        'size': 163840, 'digest': 'sha256:2cf2...'}``. ``size`` and
+        ``digest`` are ``None`` if GitHub doesn't provide them.
 
 
     A valid release is one that contains one ``.alfredworkflow`` file.
@@ -222,29 +342,53 @@ def get_valid_releases(github_slug):
     If the GitHub version (i.e. tag) is of the form ``v1.1``, the leading
     ``v`` will be stripped.
 
+    .. versionchanged:: 1.14
+        The API response is cached along with its ``ETag`` and
+        ``Last-Modified`` headers, and the releases are only downloaded
+        again if GitHub says they have changed. Unchanged responses
+        (``304 Not Modified``) don't count against the API rate limit.
+
     """
 
     api_url = build_api_url(github_slug)
     releases = []
 
-    wf().logger.debug('Retrieving releases list from `{0}` ...'.format(
-                       api_url))
-
-    def retrieve_releases():
-        wf().logger.info(
-            'Retrieving releases for `{0}` ...'.format(github_slug))
-        return web.get(api_url).json()
-
     slug = github_slug.replace('/', '-')
-    for release in wf().cached_data('gh-releases-{0}'.format(slug),
-                                     retrieve_releases):
+    cache_name = 'gh-releases-{0}'.format(slug)
+    # Dict of `releases` (API response) and the validators `etag` and
+    # `last_modified`. Older versions cached only the releases
+    cached = wf().cached_data(cache_name, max_age=0)
+    if not isinstance(cached, dict):
+        cached = {}
+
+    headers = {}
+    if cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+    if cached.get('last_modified'):
+        headers['If-Modified-Since'] = cached['last_modified']
+
+    wf().logger.info('Retrieving releases for `%s` ...', github_slug)
+    response = web.get(api_url, headers=headers)
+
+    if response.status_code == 304 and 'releases' in cached:
+        wf().logger.debug('Releases for `%s` not modified', github_slug)
+    else:
+        response.raise_for_status()
+        cached = {'releases': response.json(),
+                  'etag': response.headers.get('etag'),
+                  'last_modified': response.headers.get('last-modified')}
+        wf().cache_data(cache_name, cached)
+
+    for release in cached['releases']:
         version = release['tag_name']
         download_urls = []
+        assets = []
         for asset in release.get('assets', []):
             url = asset.get('browser_download_url')
             if not url or not url.endswith('.alfredworkflow'):
                 continue
             download_urls.append(url)
+            assets.append(asset)
 
         # Validate release
         if release['prerelease']:
@@ -260,8 +404,11 @@ def get_valid_releases(github_slug):
                 'Invalid release {0} : multiple workflow files'.format(version))
             continue
 
-        wf().logger.debug('Release `{0}` : {1}'.format(version, url))
-        releases.append({'version': version, 'download_url': download_urls[0]})
+        wf().logger.debug('Release `%s` : %s', version, url)
+        releases.append({'version': version,
+                         'download_url': download_urls[0],
+                         'size': assets[0].get('size'),
+                         'digest': assets[0].get('digest')})
 
     return releases
 
@@ -276,17 +423,25 @@ def check_update(github_slug, current_version):
     :returns: ``True`` if an update is available, else ``False``
 
     If an update is available, its version number and download URL will
-    be cached.
+    be cached. The time of the check is cached as ``checked``. If the
+    check fails, the time to retry is cached as ``next_check``.
 
     """
 
-    releases = get_valid_releases(github_slug)
+    try:
+        releases = get_valid_releases(github_slug)
 
-    wf().logger.info('{0} releases for {1}'.format(len(releases),
-                                                    github_slug))
+        wf().logger.info('%d releases for %s', len(releases), github_slug)
 
-    if not len(releases):
-        raise ValueError('No valid releases for {0}'.format(github_slug))
+        if not len(releases):
+            raise ValueError('No valid releases for {0}'.format(github_slug))
+    except Exception:
+        # Keep the result of the last check, but don't queue another
+        # one on every run until the network is back
+        status = wf().cached_data('__workflow_update_status', max_age=0) or {}
+        status['next_check'] = time.time() + workflow.UPDATE_RETRY_INTERVAL
+        wf().cache_data('__workflow_update_status', status)
+        raise
 
     # GitHub returns releases newest-first
     latest_release = releases[0]
@@ -294,19 +449,23 @@ def check_update(github_slug, current_version):
     # (latest_version, download_url) = get_latest_release(releases)
     vr = Version(latest_release['version'])
     vl = Version(current_version)
-    wf().logger.debug('Latest : {0!r} Installed : {1!r}'.format(vr, vl))
+    wf().logger.debug('Latest : %r Installed : %r', vr, vl)
     if vr > vl:
 
         wf().cache_data('__workflow_update_status', {
             'version': latest_release['version'],
             'download_url': latest_release['download_url'],
-            'available': True
+            'size': latest_release['size'],
+            'digest': latest_release['digest'],
+            'available': True,
+            'checked': time.time(),
         })
 
         return True
 
     wf().cache_data('__workflow_update_status', {
-        'available': False
+        'available': False,
+        'checked': time.time(),
     })
     return False
 
@@ -332,7 +491,9 @@ def install_update(github_slug, current_version):
         wf().logger.info('No update available')
         return False
 
-    local_file = download_workflow(update_data['download_url'])
+    local_file = download_workflow(update_data['download_url'],
+                                   update_data.get('size'),
+                                   update_data.get('digest'))
 
     wf().logger.info('Installing updated workflow ...')
     subprocess.call(['open', local_file])
@@ -500,10 +500,11 @@ def request(method, url, params=None, data=None, headers=None, cookies=None,
     if 'user-agent' not in headers:
         headers['user-agent'] = USER_AGENT
 
-    # Accept gzip-encoded content
+    # Accept gzip-encoded content, unless only `identity` (i.e. the
+    # content as it is) was asked for, e.g. to resume a download
     encodings = [s.strip() for s in
                  headers.get('accept-encoding', '').split(',')]
-    if 'gzip' not in encodings:
+    if 'gzip' not in encodings and encodings != ['identity']:
         encodings.append('gzip')
 
     headers['accept-encoding'] = ', '.join(encodings)
@@ -17,22 +17,28 @@ up your Python script to best utilise the :class:`Workflow` object.
 
 from __future__ import print_function, unicode_literals
 
+import atexit
 import binascii
 from contextlib import contextmanager
+from copy import deepcopy
 import cPickle
 import errno
+import fcntl
+import heapq
 import json
 import logging
 import logging.handlers
 import os
 import pickle
 import plistlib
+import Queue
 import re
 import shutil
 import signal
 import string
 import subprocess
 import sys
+import threading
 import time
 import unicodedata
 
@@ -46,6 +52,10 @@ except ImportError:  # pragma: no cover
 #: correctly have the value ``None``)
 UNSET = object()
 
+#: Seconds after which a download of an update that hasn't saved its
+#: progress is considered to have failed (e.g. the process was killed)
+UPDATE_DOWNLOAD_TIMEOUT = 120
+
 ####################################################################
 # Standard system icons
 ####################################################################
@@ -434,6 +444,12 @@ MATCH_ALL = 127
 
 # Number of days to wait between checking for updates to the workflow
 DEFAULT_UPDATE_FREQUENCY = 1
+# Number of seconds to wait before queuing an update check again after
+# a check failed (e.g. because there's no network)
+UPDATE_RETRY_INTERVAL = 3600
+# Number of seconds a queued update check waits for another background
+# task to start a worker before it starts one itself
+UPDATE_QUEUE_WAIT = 3600
 
 
 ####################################################################
@@ -489,6 +505,132 @@ def isascii(text):
     return True
 
 
+def fold_to_ascii(text):
+    """Convert non-ASCII characters to closest ASCII equivalent.
+
+    See :meth:`Workflow.fold_to_ascii`.
+
+    """
+
+    if isascii(text):
+        return text
+    text = ''.join([ASCII_REPLACEMENTS.get(c, c) for c in text])
+    return unicode(unicodedata.normalize('NFKD',
+                   text).encode('ascii', 'ignore'))
+
+
+def _search_keys(value, complete=False):
+    """Return search keys used by :meth:`Workflow.filter` for ``value``.
+
+    The capitals, atoms and initials are only needed if the cheaper
+    tests fail, so they are ``None`` until :func:`_complete_search_keys`
+    is called, unless ``complete`` is ``True``.
+
+    :param value: search key of an item
+    :type value: ``unicode``
+    :param complete: calculate all keys now
+    :type complete: ``Boolean``
+    :returns: ``[value, lowercase, characters, capitals, atoms, initials]``
+    :rtype: ``list``
+
+    """
+
+    lower = value.lower()
+    keys = [value, lower, frozenset(lower), None, None, None]
+    if complete:
+        _complete_search_keys(keys)
+    return keys
+
+
+def _complete_search_keys(keys):
+    """Fill in capitals, atoms and initials of search ``keys``."""
+
+    value = keys[0]
+    atoms = [s.lower() for s in split_on_delimiters(value)]
+    keys[3] = ''.join([c for c in value if c in INITIALS]).lower()
+    keys[4] = atoms
+    keys[5] = ''.join([s[0] for s in atoms if s])
+
+
+def _subsequence_window(text, query):
+    """Find best window in ``text`` containing ``query`` as subsequence.
+
+    A forward scan finds where the next in-order match of ``query``
+    ends and a backward scan the latest start of a match with that end.
+    The window with the smallest ``(1 + start) * (length + 1)``, i.e.
+    the best :const:`MATCH_ALLCHARS` score, is returned. For a given
+    end, that is either the earliest or the latest start, so only
+    those are compared. Scanning stops as soon as no later window
+    can score better.
+
+    :param text: text to search
+    :type text: ``unicode``
+    :param query: characters to find in order
+    :type query: ``unicode``
+    :returns: ``(start, end)`` of window or ``None`` if ``text`` does not
+        contain all characters of ``query`` in order
+    :rtype: ``tuple``
+
+    """
+
+    best = None
+    best_cost = None
+    offset = 0
+    while best_cost is None or (1 + offset) * (len(query) + 1) < best_cost:
+        first = end = text.find(query[0], offset) + 1
+        if not end:
+            return best
+        for c in query[1:]:
+            end = text.find(c, end) + 1
+            if not end:
+                return best
+        first -= 1
+
+        start = end
+        for c in reversed(query):
+            start = text.rfind(c, 0, start)
+
+        # For a given end, the score is best at the earliest or
+        # the latest start
+        for window_start in (first, start):
+            cost = (1 + window_start) * (end - window_start + 1)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = (window_start, end), cost
+
+        offset = start + 1
+
+    return best
+
+
+def _item_keys(value, complete=False):
+    """Return ``(keys, folded_keys)`` for search key ``value``.
+
+    See :func:`_search_keys`.
+
+    """
+
+    keys = _search_keys(value, complete)
+    folded = fold_to_ascii(value)
+    if folded != value:
+        return keys, _search_keys(folded, complete)
+    return keys, keys
+
+
+def _index_items(items, key, complete=False):
+    """Yield ``(item, (keys, folded_keys))`` for each item in ``items``.
+
+    Items with an empty search key are skipped. See :class:`FilterIndex`
+    and :func:`_search_keys`.
+
+    """
+
+    for item in items:
+        value = key(item).strip()
+        if value == '':
+            continue
+        yield item, _item_keys(value, complete)
+
+
 ####################################################################
 # Implementation classes
 ####################################################################
@@ -796,18 +938,38 @@ class Item(object):
 
 
 class LockFile(object):
-    """Context manager to create lock files"""
+    """Context manager to lock files with :func:`fcntl.flock`.
 
-    def __init__(self, protected_path, timeout=0, delay=0.05):
+    .. versionchanged:: 1.14
+        Locks are :func:`fcntl.flock` locks on ``protected_path.lock``
+        instead of the existence of that file. Waiting for a lock no
+        longer polls, and locks held by a process are released if it
+        dies. Added ``shared`` locks.
+
+    Any number of processes may hold a shared lock at the same time,
+    but an exclusive lock is only granted when no other lock is held.
+    Use shared locks to read and exclusive locks to write.
+
+    If ``timeout`` is set, acquisition is retried every ``delay``
+    seconds until the lock is acquired or ``timeout`` is exceeded.
+    Otherwise, :meth:`acquire` waits for the lock without polling.
+
+    The lock file is left in place on release, as deleting it would
+    allow two processes to lock different files with the same name.
+
+    """
+
+    def __init__(self, protected_path, timeout=0, delay=0.05, shared=False):
         self.lockfile = protected_path + '.lock'
         self.timeout = timeout
         self.delay = delay
-        self._locked = False
+        self.shared = shared
+        self._file = None
 
     @property
     def locked(self):
         """`True` if file is locked by this instance."""
-        return self._locked
+        return self._file is not None
 
     def acquire(self, blocking=True):
         """Acquire the lock if possible.
@@ -815,33 +977,47 @@ class LockFile(object):
         If the lock is in use and ``blocking`` is ``False``, return
         ``False``.
 
-        Otherwise, check every `self.delay` seconds until it acquires
-        lock or exceeds `self.timeout` and raises an exception.
+        Otherwise, wait until the lock is released or, if
+        `self.timeout` is set, raise an exception when it is exceeded.
 
         """
+        if self._file is not None:
+            return True
+
+        mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        if not blocking or self.timeout:
+            mode |= fcntl.LOCK_NB
+
+        file_obj = open(self.lockfile, 'a')
         start = time.time()
         while True:
             try:
-                fd = os.open(self.lockfile, os.O_CREAT | os.O_EXCL | os.O_RDWR)
-                with os.fdopen(fd, 'w') as fd:
-                    fd.write('{0}'.format(os.getpid()))
+                fcntl.flock(file_obj, mode)
                 break
-            except OSError as err:
-                if err.errno != errno.EEXIST:  # pragma: no cover
+            except IOError as err:
+                if err.errno == errno.EINTR:  # pragma: no cover
+                    continue
+                if err.errno not in (errno.EAGAIN, errno.EACCES):
+                    file_obj.close()
                     raise
-                if self.timeout and (time.time() - start) >= self.timeout:
-                    raise AcquisitionError('Lock acquisition timed out.')
                 if not blocking:
+                    file_obj.close()
                     return False
+                if (time.time() - start) >= self.timeout:
+                    file_obj.close()
+                    raise AcquisitionError('Lock acquisition timed out.')
                 time.sleep(self.delay)
 
-        self._locked = True
+        self._file = file_obj
         return True
 
     def release(self):
-        """Release the lock by deleting `self.lockfile`."""
-        self._locked = False
-        os.unlink(self.lockfile)
+        """Release the lock."""
+        if self._file is None:
+            return
+        file_obj, self._file = self._file, None
+        fcntl.flock(file_obj, fcntl.LOCK_UN)
+        file_obj.close()
 
     def __enter__(self):
         """Acquire lock."""
@@ -853,8 +1029,8 @@ class LockFile(object):
         self.release()
 
     def __del__(self):
-        """Clear up `self.lockfile`."""
-        if self._locked:  # pragma: no cover
+        """Release lock."""
+        if self._file is not None:  # pragma: no cover
             self.release()
 
 
@@ -942,6 +1118,114 @@ class uninterruptible(object):
                               klass.__name__)
 
 
+class QueueHandler(logging.Handler):
+    """Logging handler that writes log records in a background thread.
+
+    .. versionadded:: 1.14
+
+    Records are put on a queue and passed to ``handlers`` by a daemon
+    thread, so slow handlers (e.g. file I/O) don't hold up the thread
+    that logs. The thread is started when the first record is logged.
+
+    Messages are formatted before they are queued, as their arguments
+    may have changed by the time the thread gets to them.
+
+    :meth:`close` (called by :func:`logging.shutdown` when the program
+    exits) waits for queued records to be written.
+
+    :param handlers: handlers to pass log records to
+    :type handlers: ``list``
+
+    """
+
+    def __init__(self, handlers):
+        logging.Handler.__init__(self)
+        self.handlers = handlers
+        self.queue = Queue.Queue()
+        self._thread = None
+
+    def emit(self, record):
+        """Format ``record``'s message and queue it."""
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                if not record.exc_text:
+                    record.exc_text = logging._defaultFormatter.formatException(
+                        record.exc_info)
+                record.exc_info = None
+        except Exception:  # pragma: no cover
+            self.handleError(record)
+            return
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write)
+            self._thread.daemon = True
+            self._thread.start()
+
+        self.queue.put(record)
+
+    def _write(self):
+        """Pass queued records to handlers until ``None`` is queued."""
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def close(self):
+        """Write queued records and close handlers."""
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+        for handler in self.handlers:
+            handler.close()
+
+        logging.Handler.close(self)
+
+
+class FilterIndex(object):
+    """Search keys for :meth:`Workflow.filter` precomputed for ``items``.
+
+    .. versionadded:: 1.14
+
+    :meth:`Workflow.filter` has to lowercase, ASCII-fold and split the
+    search key of every item for every query. If you filter the same
+    list repeatedly, create a :class:`FilterIndex` once and pass it to
+    :meth:`Workflow.filter` in place of the list.
+
+    Indices of static lists can be pickled, e.g. with
+    :meth:`Workflow.cache_data`, as long as the items themselves can be.
+
+    :param items: items to index
+    :type items: iterable
+    :param key: function to get search key from an item. See
+        :meth:`Workflow.filter`.
+    :type key: ``callable``
+
+    """
+
+    def __init__(self, items, key=lambda x: x):
+        #: Indexed items. Items with empty search keys are dropped.
+        self.items = []
+        #: ``(keys, folded_keys)`` for each item in :attr:`items`
+        self.keys = []
+
+        for item, keys in _index_items(items, key, complete=True):
+            self.items.append(item)
+            self.keys.append(keys)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+
 class Settings(dict):
     """A dictionary that saves itself when changed.
 
@@ -949,6 +1233,10 @@ class Settings(dict):
     at ``filepath``. If the file does not exist, the dictionary
     (and settings file) will be initialised with ``defaults``.
 
+    The file is only rewritten if the settings have actually changed
+    since they were last loaded or saved. Use :meth:`batch` to group
+    several changes into a single write.
+
     :param filepath: where to save the settings
     :type filepath: :class:`unicode`
     :param defaults: dict of default settings
@@ -965,12 +1253,16 @@ class Settings(dict):
         super(Settings, self).__init__()
         self._filepath = filepath
         self._nosave = False
+        # Nesting depth of `batch()` blocks
+        self._batch_depth = 0
+        # Settings as they are on disk
+        self._original = {}
         if os.path.exists(self._filepath):
             self._load()
         elif defaults:
-            for key, val in defaults.items():
-                self[key] = val
-            self.save()  # save default settings
+            with self.batch():
+                for key, val in defaults.items():
+                    self[key] = val
 
     def _load(self):
         """Load cached settings from JSON file `self._filepath`"""
@@ -980,6 +1272,37 @@ class Settings(dict):
             for key, value in json.load(file_obj, encoding='utf-8').items():
                 self[key] = value
         self._nosave = False
+        self._original = deepcopy(dict(self))
+
+    @property
+    def changed(self):
+        """``True`` if settings differ from those on disk."""
+        return dict(self) != self._original
+
+    @contextmanager
+    def batch(self):
+        """Context manager to defer saving until the block exits.
+
+        .. versionadded:: 1.14
+
+        Changes made within the block are written in one go (if there
+        are any) when the outermost :meth:`batch` block exits::
+
+            with wf.settings.batch():
+                wf.settings['key1'] = 'value1'
+                wf.settings['key2'] = 'value2'
+
+        Blocks may be nested.
+
+        """
+
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.save()
 
     def save(self):
         """Save settings to JSON file specified in ``self._filepath``
@@ -987,16 +1310,22 @@ class Settings(dict):
         If you're using this class via :attr:`Workflow.settings`, which
         you probably are, ``self._filepath`` will be ``settings.json``
         in your workflow's data directory (see :attr:`~Workflow.datadir`).
+
+        Nothing is written if the settings are unchanged or if
+        called within a :meth:`batch` block.
         """
-        if self._nosave:
+        if self._nosave or self._batch_depth:
             return
         data = {}
         for key, value in self.items():
             data[key] = value
+        if data == self._original:
+            return
         with LockFile(self._filepath):
             with atomic_writer(self._filepath, 'wb') as file_obj:
                 json.dump(data, file_obj, sort_keys=True, indent=2,
                           encoding='utf-8')
+        self._original = deepcopy(data)
 
     # dict methods
     def __setitem__(self, key, value):
@@ -1050,6 +1379,16 @@ class Workflow(object):
             also be opened directly in a web browser with the ``workflow:help``
             :ref:`magic argument <magic-arguments>`.
         :type help_url: :class:`unicode` or :class:`str`
+        :param cache_manifest: read cache metadata (modification time,
+            size and serializer) from a single manifest file in
+            :attr:`cachedir` instead of calling :func:`os.stat` on each
+            cache file. See :meth:`cached_data_age`.
+        :type cache_manifest: ``Boolean``
+        :param log_level: level of messages to log. If not set, the
+            level is ``logging.DEBUG`` if the ``alfred_debug``
+            environment variable is ``1`` (set by Alfred when its
+            debugger is open) and ``logging.INFO`` otherwise.
+        :type log_level: ``int``
 
     """
 
@@ -1060,7 +1399,7 @@ class Workflow(object):
     def __init__(self, default_settings=None, update_settings=None,
                  input_encoding='utf-8', normalization='NFC',
                  capture_args=True, libraries=None,
-                 help_url=None):
+                 help_url=None, cache_manifest=False, log_level=None):
 
         self._default_settings = default_settings or {}
         self._update_settings = update_settings or {}
@@ -1080,14 +1419,29 @@ class Workflow(object):
         self._info = None
         self._info_loaded = False
         self._logger = None
+        if log_level is None:
+            if os.getenv('alfred_debug') == '1':
+                log_level = logging.DEBUG
+            else:
+                log_level = logging.INFO
+        self.log_level = log_level
         self._items = []
         self._alfred_env = None
         # Version number of the workflow
         self._version = UNSET
         # Version from last workflow run
         self._last_version_run = UNSET
-        # Cache for regex patterns created for filter keys
-        self._search_pattern_cache = {}
+        # Cached update status. Loaded on first use
+        self._update_status = None
+        # Read cache metadata from manifest instead of stat-ing files
+        self.cache_manifest = cache_manifest
+        # Per-process memo of cache metadata. name: (mtime, size) or None
+        self._cache_metadata = {}
+        # Contents of cache manifest. Loaded on first use
+        self._cache_manifest = None
+        # Manifest entries changed by this process, written when it
+        # exits. name: entry or None if cache was deleted
+        self._cache_manifest_changes = None
         # Magic arguments
         #: The prefix for all magic arguments. Default is ``workflow:``
         self.magic_prefix = 'workflow:'
@@ -1461,6 +1815,11 @@ class Workflow(object):
         """Create and return a logger that logs to both console and
         a log file.
 
+        .. versionchanged:: 1.14
+            Log records are written in a background thread by a
+            :class:`QueueHandler`, and only records at or above
+            :attr:`log_level` are logged.
+
         Use :meth:`open_log` to open the log file in Console.
 
         :returns: an initialised :class:`~logging.Logger`
@@ -1489,10 +1848,9 @@ class Workflow(object):
             logfile.setFormatter(fmt)
             console.setFormatter(fmt)
 
-            logger.addHandler(logfile)
-            logger.addHandler(console)
+            logger.addHandler(QueueHandler([logfile, console]))
 
-        logger.setLevel(logging.DEBUG)
+        logger.setLevel(self.log_level)
         self._logger = logger
 
         return self._logger
@@ -1538,9 +1896,9 @@ class Workflow(object):
 
         """
 
-        if not self._settings:
-            self.logger.debug('Reading settings from `{0}` ...'.format(
-                              self.settings_path))
+        if self._settings is None:
+            self.logger.debug('Reading settings from `%s` ...',
+                              self.settings_path)
             self._settings = Settings(self.settings_path,
                                       self._default_settings)
         return self._settings
@@ -1649,7 +2007,7 @@ class Workflow(object):
         metadata_path = self.datafile('.{0}.alfred-workflow'.format(name))
 
         if not os.path.exists(metadata_path):
-            self.logger.debug('No data stored for `{0}`'.format(name))
+            self.logger.debug('No data stored for `%s`', name)
             return None
 
         with open(metadata_path, 'rb') as file_obj:
@@ -1663,14 +2021,14 @@ class Workflow(object):
                 'serializer with `manager.register()` '
                 'to load this data.'.format(serializer_name))
 
-        self.logger.debug('Data `{0}` stored in `{1}` format'.format(
-            name, serializer_name))
+        self.logger.debug('Data `%s` stored in `%s` format',
+                          name, serializer_name)
 
         filename = '{0}.{1}'.format(name, serializer_name)
         data_path = self.datafile(filename)
 
         if not os.path.exists(data_path):
-            self.logger.debug('No data stored for `{0}`'.format(name))
+            self.logger.debug('No data stored for `%s`', name)
             if os.path.exists(metadata_path):
                 os.unlink(metadata_path)
 
@@ -1679,7 +2037,7 @@ class Workflow(object):
         with open(data_path, 'rb') as file_obj:
             data = serializer.load(file_obj)
 
-        self.logger.debug('Stored data loaded from : {0}'.format(data_path))
+        self.logger.debug('Stored data loaded from : %s', data_path)
 
         return data
 
@@ -1709,7 +2067,7 @@ class Workflow(object):
             for path in paths:
                 if os.path.exists(path):
                     os.unlink(path)
-                    self.logger.debug('Deleted data file : {0}'.format(path))
+                    self.logger.debug('Deleted data file : %s', path)
 
         serializer_name = serializer or self.data_serializer
 
@@ -1749,7 +2107,7 @@ class Workflow(object):
 
         _store()
 
-        self.logger.debug('Stored data saved at : {0}'.format(data_path))
+        self.logger.debug('Stored data saved at : %s', data_path)
 
     def cached_data(self, name, data_func=None, max_age=60):
         """Retrieve data from cache or re-generate and re-cache data if
@@ -1769,14 +2127,23 @@ class Workflow(object):
         serializer = manager.serializer(self.cache_serializer)
 
         cache_path = self.cachefile('%s.%s' % (name, self.cache_serializer))
-        age = self.cached_data_age(name)
+        metadata = self.cache_metadata(name)
 
-        if (age < max_age or max_age == 0) and os.path.exists(cache_path):
+        if metadata and (max_age == 0 or
+                         time.time() - metadata[0] < max_age):
 
-            with open(cache_path, 'rb') as file_obj:
-                self.logger.debug('Loading cached data from : %s',
-                                  cache_path)
-                return serializer.load(file_obj)
+            try:
+                with LockFile(cache_path, shared=True):
+                    with open(cache_path, 'rb') as file_obj:
+                        self.logger.debug('Loading cached data from : %s',
+                                          cache_path)
+                        return serializer.load(file_obj)
+            except IOError as err:
+                if err.errno != errno.ENOENT:  # pragma: no cover
+                    raise
+                # Cache file was deleted behind our back
+                self.logger.debug('Cache file missing : %s', cache_path)
+                self._set_cache_metadata(name, None)
 
         if not data_func:
             return None
@@ -1806,10 +2173,15 @@ class Workflow(object):
             if os.path.exists(cache_path):
                 os.unlink(cache_path)
                 self.logger.debug('Deleted cache file : %s', cache_path)
+            self._set_cache_metadata(name, None)
             return
 
-        with atomic_writer(cache_path, 'wb') as file_obj:
-            serializer.dump(data, file_obj)
+        with LockFile(cache_path):
+            with atomic_writer(cache_path, 'wb') as file_obj:
+                serializer.dump(data, file_obj)
+
+        st = os.stat(cache_path)
+        self._set_cache_metadata(name, (st.st_mtime, st.st_size))
 
         self.logger.debug('Cached data saved at : %s', cache_path)
 
@@ -1835,6 +2207,10 @@ class Workflow(object):
         """Return age of data cached at `name` in seconds or 0 if
         cache doesn't exist
 
+        The cache file's metadata are only looked up once per process
+        (see :meth:`cache_metadata`), so it's cheap to call this
+        repeatedly.
+
         :param name: name of datastore
         :type name: ``unicode``
         :returns: age of datastore in seconds
@@ -1842,16 +2218,141 @@ class Workflow(object):
 
         """
 
-        cache_path = self.cachefile('%s.%s' % (name, self.cache_serializer))
+        metadata = self.cache_metadata(name)
 
-        if not os.path.exists(cache_path):
+        if not metadata:
             return 0
 
-        return time.time() - os.stat(cache_path).st_mtime
+        return time.time() - metadata[0]
+
+    def cache_metadata(self, name):
+        """Return ``(mtime, size)`` of data cached at ``name``.
+
+        .. versionadded:: 1.14
+
+        Results are memoized for the lifetime of the :class:`Workflow`
+        instance. If :attr:`cache_manifest` is ``True``, metadata
+        are read from the cache manifest (one read for all caches),
+        and only caches missing from the manifest are :func:`os.stat`-ed.
+
+        :param name: name of datastore
+        :type name: ``unicode``
+        :returns: ``(mtime, size)`` tuple or ``None`` if cache doesn't
+            exist
+
+        """
+
+        if name in self._cache_metadata:
+            return self._cache_metadata[name]
+
+        metadata = None
+
+        if self.cache_manifest:
+            entry = self._load_cache_manifest().get(name)
+            if entry and entry.get('serializer') == self.cache_serializer:
+                metadata = (entry['mtime'], entry['size'])
+
+        if metadata is None:
+            cache_path = self.cachefile('%s.%s' % (name,
+                                                   self.cache_serializer))
+            try:
+                st = os.stat(cache_path)
+            except OSError:
+                pass
+            else:
+                metadata = (st.st_mtime, st.st_size)
+
+        self._cache_metadata[name] = metadata
+        return metadata
+
+    @property
+    def _cache_manifest_path(self):
+        return self.cachefile('__workflow_cache_manifest.json')
+
+    def _load_cache_manifest(self):
+        """Return contents of cache manifest as a `dict`."""
+
+        if self._cache_manifest is None:
+            self._cache_manifest = {}
+            try:
+                with open(self._cache_manifest_path, 'rb') as file_obj:
+                    self._cache_manifest = json.load(file_obj)
+            except (IOError, ValueError):  # Missing or corrupt
+                pass
+
+        return self._cache_manifest
+
+    def _set_cache_metadata(self, name, metadata):
+        """Update memo and cache manifest with ``metadata``.
+
+        Changes to the manifest are collected and written once, when
+        the process exits (see :meth:`_save_cache_manifest`), so
+        scripts that cache several things per run only write the
+        manifest once. The manifest is kept up to date regardless of
+        :attr:`cache_manifest`, as caches are often updated by
+        background scripts whose :class:`Workflow` doesn't read it.
+
+        """
+
+        self._cache_metadata[name] = metadata
+
+        if self._cache_manifest_changes is None:
+            self._cache_manifest_changes = {}
+            atexit.register(self._save_cache_manifest,
+                            self._cache_manifest_path)
+
+        if metadata is None:
+            self._cache_manifest_changes[name] = None
+        else:
+            self._cache_manifest_changes[name] = {
+                'mtime': metadata[0],
+                'size': metadata[1],
+                'serializer': self.cache_serializer}
+
+    def _save_cache_manifest(self, path=None):
+        """Write changes collected by :meth:`_set_cache_metadata`.
+
+        If ``path`` is given and its directory no longer exists, the
+        changes are discarded: the manifest would only describe caches
+        that have been deleted, and :attr:`cachedir` shouldn't be
+        recreated just to hold it.
+
+        """
+
+        changes = self._cache_manifest_changes
+        self._cache_manifest_changes = None
+        if not changes:
+            return
+
+        if path is None:
+            path = self._cache_manifest_path
+        elif not os.path.isdir(os.path.dirname(path)):
+            return
+
+        @uninterruptible
+        def _update():
+            with LockFile(path):
+                self._cache_manifest = None  # re-read under lock
+                manifest = self._load_cache_manifest()
+                updated = dict(manifest)
+                for name, entry in changes.items():
+                    if entry is None:
+                        updated.pop(name, None)
+                    else:
+                        updated[name] = entry
+
+                if updated == manifest:
+                    return
+
+                with atomic_writer(path, 'wb') as file_obj:
+                    json.dump(updated, file_obj)
+                self._cache_manifest = updated
+
+        _update()
 
     def filter(self, query, items, key=lambda x: x, ascending=False,
                include_score=False, min_score=0, max_results=0,
-               match_on=MATCH_ALL, fold_diacritics=True):
+               match_on=MATCH_ALL, fold_diacritics=True, narrow_cache=None):
         """Fuzzy search filter. Returns list of ``items`` that match ``query``.
 
         ``query`` is case-insensitive. Any item that does not contain the
@@ -1864,8 +2365,9 @@ class Workflow(object):
 
         :param query: query to test items against
         :type query: ``unicode``
-        :param items: iterable of items to test
-        :type items: ``list`` or ``tuple``
+        :param items: iterable of items to test or a :class:`FilterIndex`
+            (in which case ``key`` is ignored). May be a generator.
+        :type items: ``list``, ``tuple``, generator or :class:`FilterIndex`
         :param key: function to get comparison key from ``items``.
             Must return a ``unicode`` string. The default simply returns
             the item.
@@ -1880,6 +2382,8 @@ class Workflow(object):
             than this.
         :type min_score: ``int``
         :param max_results: If non-zero, prune results list to this length.
+            Only the best ``max_results`` matches are kept in memory
+            while filtering.
         :type max_results: ``int``
         :param match_on: Filter option flags. Bitwise-combined list of
             ``MATCH_*`` constants (see below).
@@ -1887,6 +2391,9 @@ class Workflow(object):
         :param fold_diacritics: Convert search keys to ASCII-only
             characters if ``query`` only contains ASCII characters.
         :type fold_diacritics: ``Boolean``
+        :param narrow_cache: Name of cache to save ``query`` and the
+            matching items to. See **Incremental filtering** below.
+        :type narrow_cache: ``unicode``
         :returns: list of ``items`` matching ``query`` or list of
             ``(item, score, rule)`` `tuples` if ``include_score`` is ``True``.
             ``rule`` is the ``MATCH_*`` rule that matched the item.
@@ -1919,8 +2426,16 @@ class Workflow(object):
         9. :const:`MATCH_ALL` : Combination of all the above.
 
 
-        :const:`MATCH_ALLCHARS` is considerably slower than the other
-        tests and provides much less accurate results.
+        :const:`MATCH_ALLCHARS` is slower than the other tests and
+        provides much less accurate results.
+
+        .. versionchanged:: 1.14
+
+        :const:`MATCH_ALLCHARS` scores are based on the best window
+        containing the query characters, and the score now accounts
+        for where that window starts. Earlier versions always treated
+        the window as starting at the beginning of the search key, so
+        matches that start later in a key now score lower.
 
         **Examples:**
 
@@ -1947,6 +2462,21 @@ class Workflow(object):
         If ``query`` contains non-ASCII characters, search keys will not be
         altered.
 
+        **Incremental filtering**
+
+        .. versionadded:: 1.14
+
+        If ``narrow_cache`` is set and ``items`` is a ``list``, ``tuple``
+        or :class:`FilterIndex`, the query and the positions of all
+        matching items (regardless of ``min_score`` and ``max_results``)
+        are cached under that name. If the next query extends the
+        previous one (e.g. the user typed another character), only the
+        previous matches are tested.
+
+        ``items`` must be the same, in the same order, on every call
+        with the same ``narrow_cache``. If the number of items or the
+        filter options change, all items are tested again.
+
         """
 
         if not query:
@@ -1962,44 +2492,99 @@ class Workflow(object):
         fold_diacritics = self.settings.get('__workflow_diacritic_folding',
                                             fold_diacritics)
 
-        results = []
+        if isinstance(items, FilterIndex):
+            count = len(items)
 
-        for item in items:
-            skip = False
-            score = 0
-            words = [s.strip() for s in query.split(' ')]
-            value = key(item).strip()
-            if value == '':
-                continue
-            for word in words:
-                if word == '':
-                    continue
-                s, rule = self._filter_item(value, word, match_on,
-                                            fold_diacritics)
+            def candidates(ids):
+                """Yield ``(position, item, keys)`` of items to test."""
+                if ids is None:
+                    ids = xrange(count)
+                for i in ids:
+                    yield i, items.items[i], items.keys[i]
 
-                if not s:  # Skip items that don't match part of the query
-                    skip = True
-                score += s
+        else:
+            # Positions are only meaningful in ordered sequences
+            if isinstance(items, (list, tuple)):
+                count = len(items)
+            else:
+                count = None
 
-            if skip:
+            def candidates(ids):
+                """Yield ``(position, item, keys)`` of items to test."""
+                if ids is None:
+                    pairs = enumerate(items)
+                else:
+                    pairs = ((i, items[i]) for i in ids)
+                for i, item in pairs:
+                    value = key(item).strip()
+                    if value == '':
+                        continue
+                    yield i, item, _item_keys(value)
+
+        if count is None:
+            narrow_cache = None
+
+        ids = None
+        if narrow_cache:
+            ids = self._narrowed_candidates(narrow_cache, query, count,
+                                            match_on, fold_diacritics)
+
+        # `(word, characters, fold)` for each word in query
+        words = []
+        for word in query.split(' '):
+            word = word.strip().lower()
+            if word == '':
                 continue
+            words.append((word, frozenset(word),
+                          fold_diacritics and isascii(word)))
+
+        # Positions of items that match every word in the query. Only
+        # kept for `narrow_cache`, as there may be as many as items
+        matches = [] if narrow_cache else None
+
+        def scored():
+            """Yield ``(sort_key, (item, score, rule))`` for matches."""
+            for i, item, (keys, folded_keys) in candidates(ids):
+                score = 0
+                for word, chars, fold in words:
+                    s, rule = self._score_keys(
+                        folded_keys if fold else keys, word, chars, match_on)
+
+                    if not s:  # Skip items that don't match part of query
+                        break
+                    score += s
 
-            if score:
-                # use "reversed" `score` (i.e. highest becomes lowest) and
-                # `value` as sort key. This means items with the same score
-                # will be sorted in alphabetical not reverse alphabetical order
-                results.append(((100.0 / score, value.lower(), score),
-                                (item, score, rule)))
-
-        # sort on keys, then discard the keys
-        results.sort(reverse=ascending)
-        results = [t[1] for t in results]
+                else:
+                    if matches is not None:
+                        matches.append(i)
+
+                    if not score or (min_score and score <= min_score):
+                        continue
+
+                    # use "reversed" `score` (i.e. highest becomes lowest)
+                    # and `value` as sort key. This means items with the
+                    # same score will be sorted in alphabetical not reverse
+                    # alphabetical order
+                    yield ((100.0 / score, keys[1], score),
+                           (item, score, rule))
+
+        if max_results:  # Only keep best `max_results` results in memory
+            if ascending:
+                results = heapq.nlargest(max_results, scored())
+            else:
+                results = heapq.nsmallest(max_results, scored())
+        else:
+            # sort on keys
+            results = sorted(scored(), reverse=ascending)
 
-        if min_score:
-            results = [r for r in results if r[1] > min_score]
+        if narrow_cache:
+            self.cache_data('__workflow_filter_{0}'.format(narrow_cache),
+                            {'query': query, 'count': count,
+                             'match_on': match_on, 'fold': fold_diacritics,
+                             'ids': matches})
 
-        if max_results and len(results) > max_results:
-            results = results[:max_results]
+        # discard the keys
+        results = [t[1] for t in results]
 
         # return list of ``(item, score, rule)``
         if include_score:
@@ -2007,6 +2592,40 @@ class Workflow(object):
         # just return list of items
         return [t[0] for t in results]
 
+    def _narrowed_candidates(self, name, query, count, match_on,
+                             fold_diacritics):
+        """Return positions of items to test or ``None`` to test all.
+
+        Loads the previous query and its matches from the cache ``name``
+        saved by :meth:`filter`. Every rule except :const:`MATCH_ATOM`
+        only matches items that also match the start of ``query``, so if
+        ``query`` extends the previous query, only the previous matches
+        can match.
+
+        """
+
+        if (match_on & MATCH_ATOM and
+                not match_on & (MATCH_SUBSTRING | MATCH_ALLCHARS)):
+            return None
+
+        data = self.cached_data('__workflow_filter_{0}'.format(name),
+                                max_age=0)
+        if not data:
+            return None
+
+        previous = data['query']
+        if (not query.startswith(previous) or
+                data['count'] != count or
+                data['match_on'] != match_on or
+                data['fold'] != fold_diacritics or
+                # Folding depends on whether query is ASCII
+                (fold_diacritics and isascii(previous) != isascii(query))):
+            return None
+
+        self.logger.debug('Narrowing %d items to %d matches for `%s`',
+                          count, len(data['ids']), previous)
+        return data['ids']
+
     def _filter_item(self, value, query, match_on, fold_diacritics):
         """Filter ``value`` against ``query`` using rules ``match_on``
 
@@ -2022,36 +2641,42 @@ class Workflow(object):
         if fold_diacritics:
             value = self.fold_to_ascii(value)
 
+        return self._score_keys(_search_keys(value), query, set(query),
+                                match_on)
+
+    def _score_keys(self, keys, query, chars, match_on):
+        """Score search ``keys`` against lowercase ``query``
+
+        :param keys: search keys as returned by :func:`_search_keys`
+        :param chars: set of characters in ``query``
+        :returns: ``(score, rule)``
+
+        """
+
+        value, lower, value_chars = keys[:3]
+
         # pre-filter any items that do not contain all characters
         # of ``query`` to save on running several more expensive tests
-        if not set(query) <= set(value.lower()):
+        if not chars <= value_chars:
 
             return (0, None)
 
         # item starts with query
-        if match_on & MATCH_STARTSWITH and value.lower().startswith(query):
+        if match_on & MATCH_STARTSWITH and lower.startswith(query):
             score = 100.0 - (len(value) / len(query))
 
             return (score, MATCH_STARTSWITH)
 
+        if keys[3] is None:
+            _complete_search_keys(keys)
+        capitals, atoms, initials = keys[3:]
+
         # query matches capitalised letters in item,
         # e.g. of = OmniFocus
-        if match_on & MATCH_CAPITALS:
-            initials = ''.join([c for c in value if c in INITIALS])
-            if initials.lower().startswith(query):
-                score = 100.0 - (len(initials) / len(query))
-
-                return (score, MATCH_CAPITALS)
-
-        # split the item into "atoms", i.e. words separated by
-        # spaces or other non-word characters
-        if (match_on & MATCH_ATOM or
-                match_on & MATCH_INITIALS_CONTAIN or
-                match_on & MATCH_INITIALS_STARTSWITH):
-            atoms = [s.lower() for s in split_on_delimiters(value)]
-            # print('atoms : %s  -->  %s' % (value, atoms))
-            # initials of the atoms
-            initials = ''.join([s[0] for s in atoms if s])
+        if match_on & MATCH_CAPITALS and capitals.startswith(query):
+            score = 100.0 - (len(capitals) / len(query))
+
+            return (score, MATCH_CAPITALS)
 
         if match_on & MATCH_ATOM:
             # is `query` one of the atoms in item?
@@ -2081,7 +2706,7 @@ class Workflow(object):
             return (score, MATCH_INITIALS_CONTAIN)
 
         # `query` is a substring of item
-        if match_on & MATCH_SUBSTRING and query in value.lower():
+        if match_on & MATCH_SUBSTRING and query in lower:
             score = 90.0 - (len(value) / len(query))
 
             return (score, MATCH_SUBSTRING)
@@ -2089,32 +2714,16 @@ class Workflow(object):
         # finally, assign a score based on how close together the
         # characters in `query` are in item.
         if match_on & MATCH_ALLCHARS:
-            search = self._search_for_query(query)
-            match = search(value)
-            if match:
-                score = 100.0 / ((1 + match.start()) *
-                                 (match.end() - match.start() + 1))
+            window = _subsequence_window(lower, query)
+            if window:
+                start, end = window
+                score = 100.0 / ((1 + start) * (end - start + 1))
 
                 return (score, MATCH_ALLCHARS)
 
         # Nothing matched
         return (0, None)
 
-    def _search_for_query(self, query):
-        if query in self._search_pattern_cache:
-            return self._search_pattern_cache[query]
-
-        # Build pattern: include all characters
-        pattern = []
-        for c in query:
-            # pattern.append('[^{0}]*{0}'.format(re.escape(c)))
-            pattern.append('.*?{0}'.format(re.escape(c)))
-        pattern = ''.join(pattern)
-        search = re.compile(pattern, re.IGNORECASE).search
-
-        self._search_pattern_cache[query] = search
-        return search
-
     def run(self, func):
         """Call ``func`` to run your workflow
 
@@ -2137,22 +2746,25 @@ class Workflow(object):
         # to catch any errors and display an error message in Alfred
         try:
             if self.version:
-                self.logger.debug('Workflow version : {0}'.format(self.version))
+                self.logger.debug('Workflow version : %s', self.version)
 
             # Run update check if configured for self-updates.
             # This call has to go in the `run` try-except block, as it will
             # initialise `self.settings`, which will raise an exception
             # if `settings.json` isn't valid.
 
-            if self._update_settings:
-                self.check_update()
+            # Collect any changes to settings made during the run
+            # into a single write (or none at all if nothing changed)
+            with self.settings.batch():
+                if self._update_settings:
+                    self.check_update()
 
-            # Run workflow's entry function/method
-            func(self)
+                # Run workflow's entry function/method
+                func(self)
 
-            # Set last version run to current version after a successful
-            # run
-            self.set_last_version()
+                # Set last version run to current version after a
+                # successful run
+                self.set_last_version()
 
         except Exception as err:
             self.logger.exception(err)
@@ -2172,8 +2784,8 @@ class Workflow(object):
                 self.send_feedback()
             return 1
         finally:
-            self.logger.debug('Workflow finished in {0:0.3f} seconds.'.format(
-                              time.time() - start))
+            self.logger.debug('Workflow finished in %0.3f seconds.',
+                              time.time() - start)
         return 0
 
     # Alfred feedback methods ------------------------------------------
@@ -2297,8 +2909,7 @@ class Workflow(object):
 
             self._last_version_run = version
 
-        self.logger.debug('Last run version : {0}'.format(
-                          self._last_version_run))
+        self.logger.debug('Last run version : %s', self._last_version_run)
 
         return self._last_version_run
 
@@ -2328,7 +2939,7 @@ class Workflow(object):
 
         self.settings['__workflow_last_version'] = str(version)
 
-        self.logger.debug('Set last run version : {0}'.format(version))
+        self.logger.debug('Set last run version : %s', version)
 
         return True
 
@@ -2345,19 +2956,67 @@ class Workflow(object):
 
         """
 
-        update_data = self.cached_data('__workflow_update_status', max_age=0)
-        self.logger.debug('update_data : {0}'.format(update_data))
+        update_data = self._load_update_status()
 
-        if not update_data or not update_data.get('available'):
+        if not update_data.get('available'):
             return False
 
         return update_data['available']
 
+    @property
+    def update_download(self):
+        """Progress of the download of an update
+
+        .. versionadded:: 1.14
+
+        :returns: ``None`` if no update has been downloaded, or a ``dict``
+            with the keys ``filename``, ``received`` (bytes downloaded),
+            ``size`` (total bytes or ``None`` if unknown), ``updated``
+            (time progress was last saved) and ``state``
+            (``downloading``, ``done`` or ``failed``). A download whose
+            progress hasn't been saved for
+            :const:`UPDATE_DOWNLOAD_TIMEOUT` seconds is ``failed``.
+
+        """
+
+        status = self.cached_data('__workflow_update_download', max_age=0)
+        if (status and status['state'] == 'downloading' and
+                time.time() - status.get('updated', 0) >
+                UPDATE_DOWNLOAD_TIMEOUT):
+            status['state'] = 'failed'
+        return status
+
+    def _load_update_status(self):
+        """Return cached update status, reading it only once per run.
+
+        :returns: update status ``dict`` written by
+            :func:`~workflow.update.check_update`. Empty if there is none.
+
+        """
+
+        if self._update_status is None:
+            self._update_status = self.cached_data(
+                '__workflow_update_status', max_age=0) or {}
+            self.logger.debug('update_data : %r', self._update_status)
+
+        return self._update_status
+
     def check_update(self, force=False):
         """Call update script if it's time to check for a new release
 
         .. versionadded:: 1.9
 
+        .. versionchanged:: 1.14
+            The check is due ``frequency`` days after the last
+            completed check, which is read from the update status cache
+            (the same single read :attr:`update_available` uses). A due
+            check is added to the background task queue without starting
+            a worker, so it runs with the workflow's next background
+            task. If there is none within :const:`UPDATE_QUEUE_WAIT`
+            seconds, or ``force`` is ``True``, a worker is started. A
+            failed check records when to retry
+            (:const:`UPDATE_RETRY_INTERVAL` seconds later).
+
         The update script will be run in the background, so it won't
         interfere in the execution of your workflow.
 
@@ -2371,34 +3030,44 @@ class Workflow(object):
 
         frequency = self._update_settings.get('frequency',
                                               DEFAULT_UPDATE_FREQUENCY)
+        interval = frequency * 86400
 
         if not force and not self.settings.get('__workflow_autoupdate', True):
             self.logger.debug('Auto update turned off by user')
             return
 
-        # Check for new version if it's time
-        if (force or not self.cached_data_fresh(
-                '__workflow_update_status', frequency * 86400)):
+        status = self._load_update_status()
+        now = time.time()
+        checked = status.get('checked', 0)
+        # Set by a failed check, so it isn't retried straight away
+        retry = status.get('next_check', 0)
 
-            github_slug = self._update_settings['github_slug']
-            # version = self._update_settings['version']
-            version = str(self.version)
+        if not force and now < max(checked + interval, retry):
+            self.logger.debug('Update check not due')
+            return
 
-            from background import run_in_background
+        github_slug = self._update_settings['github_slug']
+        # version = self._update_settings['version']
+        version = str(self.version)
+
+        from background import run_in_background, queue_in_background
 
-            # update.py is adjacent to this file
-            update_script = os.path.join(os.path.dirname(__file__),
-                                         b'update.py')
+        # update.py is adjacent to this file
+        update_script = os.path.join(os.path.dirname(__file__),
+                                     b'update.py')
 
-            cmd = ['/usr/bin/python', update_script, 'check', github_slug,
-                   version]
+        cmd = ['/usr/bin/python', update_script, 'check', github_slug,
+               version]
 
-            self.logger.info('Checking for update ...')
+        self.logger.info('Checking for update ...')
 
+        if force:
             run_in_background('__workflow_update_check', cmd)
-
         else:
-            self.logger.debug('Update check not due')
+            # Does nothing if the check is already queued, unless it
+            # has waited too long for a worker
+            queue_in_background('__workflow_update_check', cmd,
+                                max_wait=UPDATE_QUEUE_WAIT)
 
     def start_update(self):
         """Check for update and download and install new workflow file
@@ -2655,6 +3324,13 @@ class Workflow(object):
         :type filter_func: ``callable``
         """
         self._delete_directory_contents(self.cachedir, filter_func)
+        # Manifest may now refer to deleted files
+        if os.path.exists(self._cache_manifest_path):
+            os.unlink(self._cache_manifest_path)
+        self._cache_metadata = {}
+        self._cache_manifest = None
+        if self._cache_manifest_changes:
+            self._cache_manifest_changes.clear()
 
     def clear_data(self, filter_func=lambda f: True):
         """Delete all files in workflow's :attr:`datadir`.
@@ -2768,11 +3444,7 @@ class Workflow(object):
         :rtype: ``unicode``
 
         """
-        if isascii(text):
-            return text
-        text = ''.join([ASCII_REPLACEMENTS.get(c, c) for c in text])
-        return unicode(unicodedata.normalize('NFKD',
-                       text).encode('ascii', 'ignore'))
+        return fold_to_ascii(text)
 
     def dumbify_punctuation(self, text):
         """Convert non-ASCII punctuation to closest ASCII equivalent.
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for workflow/background.py."""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+from util import WorkflowTestCase
+from workflow import background
+
+
+class BackgroundTestCase(WorkflowTestCase):
+    """Persistent task queue and its worker."""
+
+    def setUp(self):
+        super(BackgroundTestCase, self).setUp()
+        self.log = os.path.join(self.tempdir, 'tasks.log')
+        self.workers = []
+        self._start_worker = background._start_worker
+        background._start_worker = lambda: self.workers.append(True)
+
+    def tearDown(self):
+        background._start_worker = self._start_worker
+        super(BackgroundTestCase, self).tearDown()
+
+    def command(self, text):
+        """Return command that appends `text` to the task log."""
+        return [sys.executable, '-c',
+                'open({0!r}, "a").write({1!r} + "\\n")'.format(self.log,
+                                                               text)]
+
+    def queued(self):
+        """Return `(name, args)` of queued tasks."""
+        return [(task['name'], task['args'])
+                for task in background._load_queue()['tasks']]
+
+    def run_worker(self):
+        """Run worker in this process and return lines it logged."""
+        self.assertEqual(background.main(self.wf), 0)
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as file_obj:
+            return file_obj.read().splitlines()
+
+    def test_enqueue(self):
+        """Tasks are queued and start one worker"""
+        background.run_in_background('a', self.command('a'))
+        self.assertEqual(self.queued(), [('a', self.command('a'))])
+        self.assertEqual(self.workers, [True])
+        self.assertFalse(background.is_running('a'))  # No worker yet
+
+        background.queue_in_background('b', self.command('b'))
+        self.assertEqual([name for name, _ in self.queued()], ['a', 'b'])
+        self.assertEqual(self.workers, [True])
+
+    def test_dedupe(self):
+        """Tasks with the same name are queued once"""
+        background.run_in_background('a', self.command('a'))
+        background.run_in_background('b', self.command('b'))
+        background.run_in_background('a', self.command('a2'))
+        background.queue_in_background('b', self.command('b'))
+        self.assertEqual(self.queued(), [('a', self.command('a2')),
+                                         ('b', self.command('b'))])
+        self.assertEqual(self.run_worker(), ['a2', 'b'])
+
+    def test_worker_running(self):
+        """No worker is started while one runs"""
+        lock = background._worker_lock()
+        lock.acquire()
+        try:
+            background.run_in_background('a', self.command('a'))
+            self.assertEqual(self.workers, [])
+            self.assertTrue(background.is_running('a'))
+
+            # Running tasks aren't queued again
+            queue = background._load_queue()
+            queue['running'] = queue['tasks'].pop(0)['name']
+            background._save_queue(queue)
+            background.run_in_background('a', self.command('a'))
+            self.assertEqual(self.queued(), [])
+            self.assertTrue(background.is_running('a'))
+            # Another worker exits straight away
+            self.assertEqual(self.run_worker(), [])
+        finally:
+            lock.release()
+        self.assertFalse(background.is_running('a'))
+
+    def test_drain_order(self):
+        """Tasks run oldest first"""
+        for name in ('c', 'a', 'b'):
+            background.queue_in_background(name, self.command(name))
+        self.assertEqual(self.workers, [])
+        self.assertEqual(self.run_worker(), ['c', 'a', 'b'])
+
+    def test_worker_exits(self):
+        """Worker exits when the queue is empty and releases its lock"""
+        background.run_in_background('a', self.command('a'))
+        background.run_in_background('fails', [sys.executable, '-c',
+                                               'raise SystemExit(1)'])
+        background.run_in_background('missing', ['/nonexistent/command'])
+        self.assertEqual(self.run_worker(), ['a'])
+        self.assertEqual(background._load_queue(),
+                         {'running': None, 'tasks': []})
+        self.assertFalse(background._worker_running())
+        self.assertFalse(background.is_running('a'))
+        # An empty queue is fine too
+        self.assertEqual(self.run_worker(), ['a'])
+
+    def test_corrupt_queue(self):
+        """Corrupt queue files are an empty queue"""
+        with open(background._queue_file(), 'wb') as file_obj:
+            file_obj.write(b'not a pickle')
+        background.run_in_background('a', self.command('a'))
+        self.assertEqual(self.queued(), [('a', self.command('a'))])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
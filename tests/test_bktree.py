@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for bktree.py.
+
+Run from the repository root with `python -m unittest discover tests`.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import cPickle
+import os
+import sys
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from bktree import BKTree, levenshtein  # noqa: E402
+
+WORDS = ['meter', 'metre', 'liter', 'litre', 'gram', 'grain', 'foot',
+         'ft', 'inch', 'mile', 'minute', 'hour', 'day', 'kilometer',
+         'kiloliter', 'millimeter', 'mebibyte', 'kibibyte', 'm', 'g',
+         'h', 'degc', 'degf', 'kelvin', 'hertz', 'joule', 'watt', 'pascal']
+
+QUERIES = ['metr', 'mter', 'gram', 'fot', 'kilometr', 'milimeter', 'x',
+           'h', '', 'mebibite', 'jewel', 'zzzzzzzzzz']
+
+
+class LevenshteinTestCase(unittest.TestCase):
+    """Edit distances."""
+
+    def test_distances(self):
+        """Known edit distances"""
+        for a, b, distance in (('', '', 0), ('', 'abc', 3), ('abc', '', 3),
+                               ('meter', 'meter', 0), ('meter', 'metre', 2),
+                               ('metr', 'meter', 1), ('fot', 'foot', 1),
+                               ('kitten', 'sitting', 3), ('gram', 'grain', 2),
+                               ('ab', 'ba', 2)):
+            self.assertEqual(levenshtein(a, b), distance, (a, b))
+            self.assertEqual(levenshtein(b, a), distance, (b, a))
+
+
+class BKTreeTestCase(unittest.TestCase):
+    """Searches of a BK-tree."""
+
+    def brute_force(self, word, max_distance):
+        """Return matches for `word` by comparing it to every word."""
+        results = [(levenshtein(word, w), w) for w in set(WORDS)]
+        return sorted(r for r in results if r[0] <= max_distance)
+
+    def test_search(self):
+        """Search finds the same words as comparing every word"""
+        tree = BKTree(WORDS)
+        for query in QUERIES:
+            for max_distance in range(4):
+                self.assertEqual(tree.search(query, max_distance),
+                                 self.brute_force(query, max_distance),
+                                 (query, max_distance))
+
+    def test_closest_first(self):
+        """Results are closest first"""
+        tree = BKTree(WORDS)
+        self.assertEqual(tree.search('metr', 2), [(1, 'meter'), (1, 'metre')])
+        self.assertEqual(tree.search('fot', 2)[:2], [(1, 'foot'), (1, 'ft')])
+        distances = [d for d, _ in tree.search('metr', 3)]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_duplicates(self):
+        """Words are only added once"""
+        tree = BKTree(WORDS)
+        self.assertEqual(len(tree), len(WORDS))
+        tree.add('meter')
+        self.assertEqual(len(tree), len(WORDS))
+        self.assertEqual(tree.search('meter', 0), [(0, 'meter')])
+
+    def test_empty(self):
+        """Empty trees have no matches"""
+        tree = BKTree()
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(tree.search('meter', 5), [])
+        tree.add('meter')
+        self.assertEqual(tree.search('metr', 1), [(1, 'meter')])
+
+    def test_pickle(self):
+        """Pickled trees find the same words"""
+        tree = BKTree(WORDS)
+        copy = cPickle.loads(cPickle.dumps(tree, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(len(copy), len(tree))
+        for query in QUERIES:
+            self.assertEqual(copy.search(query, 2), tree.search(query, 2))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for cache metadata and the cache manifest of `Workflow`."""
+
+from __future__ import print_function, unicode_literals
+
+import json
+import os
+import shutil
+import unittest
+
+from util import WorkflowTestCase
+
+from workflow import Workflow
+
+
+class CacheManifestTestCase(WorkflowTestCase):
+    """Cache freshness from memoized metadata and the cache manifest."""
+
+    def setUp(self):
+        super(CacheManifestTestCase, self).setUp()
+        self.stats = []
+        self._stat = os.stat
+        cachedir = self.wf.cachedir
+
+        def stat(path):
+            if os.path.dirname(path) == cachedir:
+                self.stats.append(os.path.basename(path))
+            return self._stat(path)
+
+        os.stat = stat
+
+    def tearDown(self):
+        os.stat = self._stat
+        super(CacheManifestTestCase, self).tearDown()
+
+    def make_workflow(self, cache_manifest=False):
+        return Workflow(cache_manifest=cache_manifest)
+
+    def manifest(self):
+        """Return contents of the cache manifest file."""
+        with open(self.wf.cachefile('__workflow_cache_manifest.json'),
+                  'rb') as file_obj:
+            return json.load(file_obj)
+
+    def test_metadata_memoized(self):
+        """Cache files are only stat-ed once"""
+        self.wf.cache_data('units', ['meter'])
+        wf = self.make_workflow()
+        del self.stats[:]
+        for _ in range(3):
+            self.assertEqual(wf.cached_data('units', max_age=60), ['meter'])
+            self.assertLess(wf.cached_data_age('units'), 60)
+        self.assertEqual(self.stats, ['units.cpickle'])
+        self.assertEqual(wf.cache_metadata('units'),
+                         self.wf.cache_metadata('units'))
+
+    def test_missing(self):
+        """Missing caches have no metadata"""
+        self.assertIsNone(self.wf.cache_metadata('units'))
+        self.assertEqual(self.wf.cached_data_age('units'), 0)
+        self.assertIsNone(self.wf.cached_data('units'))
+
+    def test_deleted_behind_our_back(self):
+        """Caches deleted by other processes are regenerated"""
+        self.wf.cache_data('units', ['meter'])
+        os.unlink(self.wf.cachefile('units.cpickle'))
+        self.assertEqual(self.wf.cached_data('units', lambda: ['foot']),
+                         ['foot'])
+        self.assertEqual(self.make_workflow().cached_data('units'), ['foot'])
+
+    def test_manifest_written_once(self):
+        """Changes to the manifest are written together"""
+        self.wf.cache_data('units', ['meter'])
+        self.wf.cache_data('currencies', ['EUR'])
+        self.wf.cache_data('units', ['foot'])
+        path = self.wf.cachefile('__workflow_cache_manifest.json')
+        self.assertFalse(os.path.exists(path))
+        self.wf._save_cache_manifest()
+        manifest = self.manifest()
+        self.assertEqual(sorted(manifest), ['currencies', 'units'])
+        st = self._stat(self.wf.cachefile('units.cpickle'))
+        self.assertEqual(manifest['units'], {'mtime': st.st_mtime,
+                                             'size': st.st_size,
+                                             'serializer': 'cpickle'})
+        # Deleted caches are removed
+        self.wf.cache_data('currencies', None)
+        self.wf._save_cache_manifest()
+        self.assertEqual(sorted(self.manifest()), ['units'])
+
+    def test_read_from_manifest(self):
+        """Metadata are read from the manifest without stat-ing caches"""
+        self.wf.cache_data('units', ['meter'])
+        self.wf.cache_data('currencies', ['EUR'])
+        self.wf._save_cache_manifest()
+        wf = self.make_workflow(cache_manifest=True)
+        del self.stats[:]
+        self.assertEqual(wf.cached_data('units', max_age=60), ['meter'])
+        self.assertEqual(wf.cached_data('currencies', max_age=60), ['EUR'])
+        self.assertLess(wf.cached_data_age('units'), 60)
+        self.assertEqual(self.stats, [])
+        # Caches missing from the manifest are stat-ed
+        self.assertIsNone(wf.cache_metadata('rates'))
+        self.assertEqual(self.stats, ['rates.cpickle'])
+
+    def test_manifest_serializer(self):
+        """Entries for other serializers are ignored"""
+        self.wf.cache_data('units', ['meter'])
+        self.wf._save_cache_manifest()
+        wf = self.make_workflow(cache_manifest=True)
+        wf.cache_serializer = 'json'
+        self.assertIsNone(wf.cache_metadata('units'))
+        self.assertIsNone(wf.cached_data('units'))
+
+    def test_corrupt_manifest(self):
+        """Corrupt manifests are ignored"""
+        self.wf.cache_data('units', ['meter'])
+        with open(self.wf.cachefile('__workflow_cache_manifest.json'),
+                  'wb') as file_obj:
+            file_obj.write(b'{"units": ')
+        wf = self.make_workflow(cache_manifest=True)
+        self.assertEqual(wf.cached_data('units'), ['meter'])
+        self.wf._save_cache_manifest()
+        self.assertEqual(sorted(self.manifest()), ['units'])
+
+    def test_clear_cache(self):
+        """Clearing the cache deletes the manifest and pending changes"""
+        self.wf.cache_data('units', ['meter'])
+        self.wf._save_cache_manifest()
+        self.wf.cache_data('currencies', ['EUR'])
+        self.wf.clear_cache()
+        self.wf._save_cache_manifest()
+        self.assertFalse(os.path.exists(
+            self.wf.cachefile('__workflow_cache_manifest.json')))
+        self.assertIsNone(self.wf.cache_metadata('units'))
+
+    def test_deleted_cache_directory(self):
+        """Pending changes don't recreate a deleted cache directory"""
+        self.wf.cache_data('units', ['meter'])
+        path = self.wf.cachefile('__workflow_cache_manifest.json')
+        shutil.rmtree(self.wf.cachedir)
+        self.wf._save_cache_manifest(path)
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
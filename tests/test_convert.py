@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for convert.py.
+
+Run from the repository root with `python -m unittest discover tests`.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import convert  # noqa: E402
+from workflow import Workflow  # noqa: E402
+
+EXCHANGE_RATES = {'USD': 1.1, 'GBP': 0.85}
+FAVOURITES = ['EUR', 'USD', 'GBP']
+
+
+class ConvertTestCase(unittest.TestCase):
+    """Convert queries with a workflow in temporary directories."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        cls.cwd = os.getcwd()
+        os.environ.update({
+            'alfred_version': '2.8',
+            'alfred_workflow_bundleid': 'net.deanishe.alfred-convert.test',
+            'alfred_workflow_data': os.path.join(cls.tempdir, 'data'),
+            'alfred_workflow_cache': os.path.join(cls.tempdir, 'cache'),
+        })
+        # Definition files are relative to the workflow directory
+        os.chdir(SRC_DIR)
+        convert.wf = Workflow()
+        convert.log = convert.wf.logger
+        convert.load_registry(EXCHANGE_RATES)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.tempdir)
+
+    def titles(self, query):
+        """Return titles of Script Filter items for `query`."""
+        items = convert.conversion_items(query, 2, EXCHANGE_RATES,
+                                         FAVOURITES, {})
+        return [item['title'] for item in items]
+
+    def test_incomplete_destination_is_another_unit(self):
+        """Partial destination units that are other units"""
+        # `c` is the speed of light, `m` meter, `u` atomic mass unit
+        # and `g` gram
+        self.assertIn('182.88 centimeter', self.titles('72in c'))
+        self.assertIn('1000.00 milliliter', self.titles('1 l m'))
+        self.assertIn('5.50 USD', self.titles('5 eur u'))
+        self.assertIn('3.86 GBP', self.titles('5 usd g'))
+        self.assertIn('68.58 centimeter', self.titles('2 ft + 3 in c'))
+
+    def test_aliases_suggested_once(self):
+        """Units defined as another unit are suggested once"""
+        titles = self.titles('128 mph')
+        self.assertIn('206.00 kilometer / hour', titles)
+        self.assertNotIn('206.00 kph', titles)
+        # Aliases still find the unit
+        self.assertEqual(self.titles('128 mph kp'),
+                         ['206.00 kilometer / hour'])
+
+    def test_units_with_same_factor(self):
+        """Different units with the same factor are all suggested"""
+        # Bq is defined as Hz, so it's an alias
+        titles = self.titles('1 kHz')
+        self.assertIn('1000.00 hertz', titles)
+        self.assertNotIn('1000.00 Bq', titles)
+        self.assertEqual(self.titles('2 kHz bq'), ['2000.00 hertz'])
+        # rem and rads have the same factor, but are different units
+        titles = self.titles('1 Sv')
+        self.assertIn('100.00 rem', titles)
+        self.assertIn('100.00 rads', titles)
+
+    def test_common_units_suggested(self):
+        """Common units whose names look prefixed are suggested"""
+        titles = self.titles('1 hour')
+        self.assertIn('60.00 minute', titles)
+        self.assertIn('0.04 day', titles)
+        self.assertIn('100000.00 meter', self.titles('100 km'))
+        self.assertIn('0.40 hectare', self.titles('1 acre'))
+
+    def test_expressions(self):
+        """Source quantities with arithmetic"""
+        self.assertEqual(self.titles('2 ft + 3 in cm'), ['68.58 centimeter'])
+        self.assertEqual(self.titles('60 mi / 1.5 h km/h'),
+                         ['64.37 kilometer / hour'])
+        self.assertEqual(self.titles('60 mi / 1.5 hr km/hr'),
+                         ['64.37 kilometer / hour'])
+        self.assertEqual(self.titles('(2 + 3) ft in'), ['60.00 inch'])
+        self.assertEqual(self.titles('3 ft 2 in in'), ['38.00 inch'])
+
+    def test_hour_symbol(self):
+        """`h` is an hour"""
+        self.assertEqual(self.titles('2 h min'), ['120.00 minute'])
+        self.assertEqual(self.titles('1 planck_constant J*s'),
+                         ['6.63e-34 joule * second'])
+
+    def test_temperature_rounding_noise(self):
+        """Rounding errors of temperature conversions are zero"""
+        self.assertEqual(self.titles('32 degF degC'), ['0.00 degC'])
+        self.assertIn('0.00 degC', self.titles('32 degF'))
+        self.assertEqual(self.titles('459.67 degR degF'), ['0.00 degF'])
+
+    def test_small_results(self):
+        """Small results get significant figures"""
+        self.assertEqual(self.titles('1 mm km'), ['0.0000010 kilometer'])
+        self.assertEqual(self.titles('1 mm light_year'),
+                         ['1.06e-19 light_year'])
+
+    def test_favourite_currencies(self):
+        """Amounts of currencies are converted to favourite currencies"""
+        self.assertEqual(self.titles('5 usd'), ['4.55 EUR', '3.86 GBP'])
+        self.assertEqual(self.titles('5 usd g'), ['3.86 GBP'])
+
+    def test_currency_powers(self):
+        """Powers of currencies aren't amounts of money"""
+        for query in ('5 usd**2', '5 usd^2'):
+            self.assertNotIn('4.55 EUR', self.titles(query))
+        self.assertEqual(self.titles('5 usd**2 eur'),
+                         ["Can't convert from USD ** 2 [currency] ** 2 to "
+                          "EUR [currency]"])
+        self.assertEqual(self.titles('5 eur usd**2'),
+                         ["Can't convert from EUR [currency] to "
+                          "USD ** 2 [currency] ** 2"])
+
+    def test_did_you_mean(self):
+        """Suggestions for unknown units"""
+        self.assertEqual(convert.did_you_mean('metr'), ['meter', 'metre'])
+        self.assertIn('kilometer', convert.did_you_mean('kilometr'))
+        titles = self.titles('100 metr')
+        self.assertIn('Did you mean meter?', titles)
+        self.assertNotIn('Did you mean meur?', titles)
+
+    def test_did_you_mean_prefixes(self):
+        """Suggestions for unknown units with prefixes"""
+        # Misspelt unit after a prefix
+        self.assertEqual(convert.did_you_mean('kilometr'), ['kilometer'])
+        # Prefix symbols go with unit symbols
+        self.assertEqual(convert.did_you_mean('kmetr')[0], 'km')
+        # Misspelt prefixes of common units
+        self.assertEqual(convert.did_you_mean('milimeter')[0], 'millimeter')
+        self.assertIn('mebibyte', convert.did_you_mean('mebibite'))
+
+    def test_did_you_mean_currencies(self):
+        """Currency codes get no suggestions and no prefixes"""
+        self.assertEqual(convert.did_you_mean('gbp'), [])
+        self.assertEqual(convert.did_you_mean('xyzzyq'), [])
+        self.assertNotIn('mEUR', convert.did_you_mean('meur'))
+        self.assertNotIn('kUSD', convert.did_you_mean('kusd'))
+
+    def test_unit_names_tree_cached(self):
+        """The tree of unit names is only rebuilt when units change"""
+        tree = convert.unit_names_tree()
+        data = convert.wf.cached_data(convert.UNIT_NAMES_TREE_NAME,
+                                      max_age=0)
+        self.assertEqual(len(data[1]), len(tree))
+        fingerprint = data[0]
+        convert.unit_names_tree()
+        self.assertEqual(convert.wf.cached_data(
+            convert.UNIT_NAMES_TREE_NAME, max_age=0)[0], fingerprint)
+
+    def test_incremental_queries(self):
+        """Queries typed a key at a time reuse the previous source units"""
+        for query in ('2 ft 3 in cm', '60 mi / 1.5 h km/h', '1 mph km/h',
+                      '5 usd eur', '3 ft 2 in in', '1 kg m/s^2 N',
+                      '1 ft in X cm', '100 metr'):
+            parse_state = {}
+            for i in range(1, len(query) + 1):
+                # As normalised by `main()`
+                partial = ' '.join(query[:i].split())
+                items = convert.conversion_items(partial, 2, EXCHANGE_RATES,
+                                                 FAVOURITES, parse_state)
+                self.assertEqual([item['title'] for item in items],
+                                 self.titles(partial), partial)
+
+    def test_parse_state(self):
+        """Source units are saved and reused"""
+        parse_state = {}
+        convert.convert('1 mph km/h', parse_state=parse_state)
+        self.assertEqual(parse_state['atoms'], ['mph'])
+        self.assertEqual(parse_state['units'], {'mph': 1})
+        self.assertEqual(convert.resume_split(['mph', 'km/h'], parse_state), 1)
+        self.assertEqual(convert.resume_split(['mph'], parse_state), 0)
+        self.assertEqual(convert.resume_split(['mp', 'km'], parse_state), 0)
+        # Saved units are used instead of parsing the atoms again
+        parse_state['units'] = {'kilometer': 1, 'hour': -1}
+        results = convert.convert('1 mph m/h', parse_state=parse_state)
+        self.assertEqual([r for r, _ in results], ['1000.00 meter / hour'])
+
+    def test_incompatible_destination(self):
+        """Complete but incompatible destination units"""
+        self.assertEqual(self.titles('5 m kg'),
+                         ["Can't convert from meter [length] to "
+                          "kilogram [mass]"])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
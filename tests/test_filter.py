@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for `Workflow.filter()`."""
+
+from __future__ import print_function, unicode_literals
+
+import re
+import unittest
+
+from util import WorkflowTestCase
+
+from workflow import FilterIndex
+from workflow.workflow import (MATCH_ALL, MATCH_ALLCHARS, MATCH_ATOM,
+                               MATCH_CAPITALS, MATCH_INITIALS,
+                               MATCH_INITIALS_CONTAIN,
+                               MATCH_INITIALS_STARTSWITH, MATCH_STARTSWITH,
+                               MATCH_SUBSTRING, _subsequence_window)
+
+ITEMS = [
+    'OmniFocus',
+    'How I Met Your Mother',
+    'The Dukes of Hazzard',
+    'kilometer / hour',
+    'kilometer',
+    'Kilo Pascal',
+    'Café Müller',
+    'électron volt',
+    'Über',
+    'ub',
+    '',
+    '   ',
+    'astronomical_unit',
+    'a.b.c (d)',
+]
+
+QUERIES = ['of', 'himym', 'doh', 'kph', 'kilo', 'k m', 'km h', 'cafe', 'café',
+           'mu', 'ue', 'uber', 'über', 'ev', 'au', 'a.c', '(d', 'tdoh', 'x',
+           'O', 'meter']
+
+RULES = [MATCH_STARTSWITH, MATCH_CAPITALS, MATCH_ATOM,
+         MATCH_INITIALS_STARTSWITH, MATCH_INITIALS_CONTAIN, MATCH_INITIALS,
+         MATCH_SUBSTRING, MATCH_ALLCHARS, MATCH_ALL,
+         MATCH_ALL ^ MATCH_ALLCHARS, MATCH_STARTSWITH | MATCH_SUBSTRING]
+
+
+class FilterIndexTestCase(WorkflowTestCase):
+    """Filtering a `FilterIndex` is the same as filtering its items."""
+
+    def test_same_results(self):
+        """Same items, scores and rules for every query and rule"""
+        items = [{'name': name} for name in ITEMS]
+        key = lambda item: item['name']
+        index = FilterIndex(items, key)
+        self.assertEqual(len(index), len(ITEMS) - 2)
+
+        for query in QUERIES:
+            for match_on in RULES:
+                for fold in (True, False):
+                    kwargs = dict(match_on=match_on, fold_diacritics=fold,
+                                  include_score=True)
+                    expected = self.wf.filter(query, items, key, **kwargs)
+                    self.assertEqual(
+                        self.wf.filter(query, index, **kwargs), expected,
+                        (query, match_on, fold))
+                    # and with other arguments
+                    kwargs.update(min_score=50, ascending=True)
+                    self.assertEqual(
+                        self.wf.filter(query, index, **kwargs),
+                        self.wf.filter(query, items, key, **kwargs))
+
+    def test_results_found(self):
+        """The test queries match items"""
+        self.assertEqual(self.wf.filter('himym', FilterIndex(ITEMS)),
+                         ['How I Met Your Mother'])
+        self.assertEqual(self.wf.filter('cafe', FilterIndex(ITEMS)),
+                         ['Café Müller'])
+        self.assertEqual(
+            self.wf.filter('of', FilterIndex(ITEMS), match_on=MATCH_CAPITALS),
+            ['OmniFocus'])
+
+    def test_pickle(self):
+        """Pickled indices give the same results"""
+        index = FilterIndex(ITEMS)
+        self.wf.cache_data('index', index)
+        cached = self.wf.cached_data('index', max_age=0)
+        for query in QUERIES:
+            self.assertEqual(self.wf.filter(query, cached, include_score=True),
+                             self.wf.filter(query, ITEMS, include_score=True))
+
+
+def best_window(text, query):
+    """Return best `MATCH_ALLCHARS` window by trying every window.
+
+    Windows start with the first character of `query`.
+    """
+    best = None
+    for start in range(len(text)):
+        if text[start] != query[0]:
+            continue
+        for end in range(start + 1, len(text) + 1):
+            chars = iter(text[start:end])
+            if not all(c in chars for c in query):
+                continue
+            cost = (1 + start) * (end - start + 1)
+            if best is None or cost < best[0]:
+                best = (cost, start, end)
+            break  # Longer windows with this start cost more
+    return best
+
+
+def baseline_score(text, query):
+    """Return `MATCH_ALLCHARS` score of the regex search it replaced."""
+    pattern = ''.join('.*?{0}'.format(re.escape(c)) for c in query)
+    match = re.search(pattern, text, re.IGNORECASE)
+    if not match:
+        return 0
+    return 100.0 / ((1 + match.start()) * (match.end() - match.start() + 1))
+
+
+class SubsequenceTestCase(WorkflowTestCase):
+    """`MATCH_ALLCHARS` finds the best window containing the query."""
+
+    def score(self, text, query):
+        """Return `MATCH_ALLCHARS` score of `text` for `query`."""
+        return self.wf._filter_item(text, query, MATCH_ALLCHARS, False)[0]
+
+    def test_windows(self):
+        """Contiguous, gapped, missing and repeated characters"""
+        # Contiguous
+        self.assertEqual(_subsequence_window('kilometer', 'kilo'), (0, 4))
+        self.assertEqual(_subsequence_window('kilometer', 'met'), (4, 7))
+        # Gapped
+        self.assertEqual(_subsequence_window('kilometer', 'kmr'), (0, 9))
+        self.assertEqual(_subsequence_window('megajoule', 'mjl'), (0, 8))
+        # Missing or out of order
+        self.assertIsNone(_subsequence_window('kilometer', 'kmx'))
+        self.assertIsNone(_subsequence_window('kilometer', 'rk'))
+        self.assertIsNone(_subsequence_window('meter', 'meterr'))
+        # Repeated characters
+        self.assertEqual(_subsequence_window('aaa', 'aa'), (0, 2))
+        self.assertEqual(_subsequence_window('aabab', 'abb'), (0, 5))
+        self.assertEqual(_subsequence_window('xaxxxxab', 'ab'), (1, 8))
+        self.assertEqual(_subsequence_window('xxxxxxaxxxxxxxxab', 'ab'),
+                         (15, 17))
+
+    def test_best_window(self):
+        """Windows have the best score of all windows"""
+        texts = ['kilometer', 'aabab', 'abcabcabc', 'xaxxxxab', 'mississippi',
+                 'xxxxxxaxxxxxxxxab', 'electron_volt', 'bbbbbbbbba']
+        queries = ['a', 'ab', 'ba', 'abc', 'cba', 'iss', 'ssi', 'ipp', 'ev',
+                   'lt', 'eo', 'kmr', 'bbb']
+        for text in texts:
+            for query in queries:
+                expected = best_window(text, query)
+                window = _subsequence_window(text, query)
+                if expected is None:
+                    self.assertIsNone(window, (text, query))
+                    continue
+                start, end = window
+                self.assertEqual(text[start], query[0])
+                self.assertEqual(text[end - 1], query[-1])
+                self.assertEqual((1 + start) * (end - start + 1), expected[0],
+                                 (text, query))
+
+    def test_baseline_scores(self):
+        """Same matches as the regex search, never scored higher"""
+        texts = ['kilometer', 'Kilometer per Hour', 'mississippi',
+                 'electron_volt', 'a.b*c', 'xaxxxxab', 'bbbbbbbbba']
+        queries = ['km', 'kmh', 'iss', 'ssi', 'ev', 'lt', 'a.c', 'b*', 'ab',
+                   'ba', 'xyz']
+        for text in texts:
+            for query in queries:
+                expected = baseline_score(text, query)
+                score = self.score(text, query)
+                self.assertEqual(bool(score), bool(expected), (text, query))
+                # The regex always reported windows starting at 0, so
+                # only matches that don't start at 0 score lower
+                self.assertLessEqual(score, expected)
+                window = _subsequence_window(text.lower(), query)
+                if window and window[0] == 0:
+                    self.assertEqual(score, expected, (text, query))
+                elif window:
+                    self.assertLess(score, expected, (text, query))
+
+    def test_ranking(self):
+        """Matches closer to the start and closer together rank higher"""
+        items = ['xxxxxxxxxxkm', 'kxxxxxxxxxm', 'kilometre', 'km', 'xkm']
+        results = self.wf.filter('km', items, match_on=MATCH_ALLCHARS)
+        self.assertEqual(results, ['km', 'kilometre', 'xkm', 'kxxxxxxxxxm',
+                                   'xxxxxxxxxxkm'])
+        # Items matching at the start rank as they did with the regex
+        items = ['kilometre', 'km', 'kxxxxxxxxxm', 'k_m']
+        expected = sorted(items, key=lambda s: -baseline_score(s, 'km'))
+        self.assertEqual(self.wf.filter('km', items, match_on=MATCH_ALLCHARS),
+                         expected)
+
+
+class MaxResultsTestCase(WorkflowTestCase):
+    """`max_results` keeps the best results of the full sort."""
+
+    def test_same_order_as_sort(self):
+        """Top results are the start of the fully sorted results"""
+        # Many items with the same score, some with the same key
+        items = ITEMS + ['meter', 'Meter', 'meter', 'metre', 'mEter', 'km',
+                         'kilometer', 'Kilometer', 'mm', 'mm']
+        for query in QUERIES:
+            for ascending in (False, True):
+                kwargs = dict(ascending=ascending, include_score=True)
+                expected = self.wf.filter(query, items, **kwargs)
+                for n in range(1, len(items) + 2):
+                    self.assertEqual(
+                        self.wf.filter(query, items, max_results=n, **kwargs),
+                        expected[:n], (query, ascending, n))
+
+    def test_ties(self):
+        """Items with the same score and key are ordered as by the sort"""
+        items = [{'name': 'meter', 'id': i} for i in (3, 0, 4, 1, 2)]
+        key = lambda item: item['name']
+        expected = self.wf.filter('met', items, key)
+        self.assertEqual(len(expected), 5)
+        for n in range(1, 6):
+            self.assertEqual(
+                self.wf.filter('met', items, key, max_results=n),
+                expected[:n])
+
+    def test_no_limit(self):
+        """`max_results` of 0 or `None` returns all results"""
+        expected = self.wf.filter('k', ITEMS)
+        self.assertEqual(len(expected), 4)
+        self.assertEqual(self.wf.filter('k', ITEMS, max_results=0), expected)
+        self.assertEqual(self.wf.filter('k', ITEMS, max_results=None),
+                         expected)
+
+
+class NarrowCacheTestCase(WorkflowTestCase):
+    """`narrow_cache` only tests previous matches of a shorter query."""
+
+    def setUp(self):
+        super(NarrowCacheTestCase, self).setUp()
+        self.narrowed = []
+        narrowed_candidates = self.wf._narrowed_candidates
+
+        def spy(*args):
+            ids = narrowed_candidates(*args)
+            self.narrowed.append(ids)
+            return ids
+
+        self.wf._narrowed_candidates = spy
+
+    def filter(self, query, items, **kwargs):
+        """Filter with `narrow_cache` and check against a fresh filter."""
+        results = self.wf.filter(query, items, narrow_cache='test',
+                                 include_score=True, **kwargs)
+        self.assertEqual(results, self.wf.filter(query, items,
+                                                 include_score=True, **kwargs),
+                         query)
+        return results
+
+    def test_narrowing(self):
+        """Extended queries give the same results as a fresh filter"""
+        items = ITEMS * 3
+        for queries in (['k', 'ki', 'kil', 'kilo'], ['a', 'au'],
+                        ['m', 'me', 'met', 'met ', 'met h'],
+                        ['c', 'ca', 'caf', 'cafe'], ['é', 'él'],
+                        ['u', 'ub', 'ube']):
+            for match_on in (MATCH_ALL, MATCH_ALLCHARS, MATCH_SUBSTRING,
+                             MATCH_STARTSWITH | MATCH_CAPITALS):
+                del self.narrowed[:]
+                for query in queries:
+                    self.filter(query, items, match_on=match_on)
+                # Every query after the first was narrowed
+                self.assertEqual(self.narrowed[0], None)
+                for ids in self.narrowed[1:]:
+                    self.assertIsNotNone(ids, (queries, match_on))
+                self.wf.cache_data('__workflow_filter_test', None)
+
+    def test_narrowed_ids(self):
+        """Only previous matches are tested"""
+        self.filter('ab', ['abc', 'abd', 'xyz', 'ab'])
+        self.filter('abc', ['abc', 'abd', 'xyz', 'ab'])
+        self.assertEqual(self.narrowed, [None, [0, 1, 3]])
+
+    def test_min_score_and_max_results(self):
+        """All matches are cached, whatever is returned"""
+        items = ['meter', 'metre', 'kilometer', 'millimeter', 'mega']
+        self.filter('me', items, max_results=1)
+        self.filter('met', items, min_score=95)
+        self.filter('mete', items)
+        self.assertEqual(self.narrowed, [None, [0, 1, 2, 3, 4], [0, 1, 2, 3]])
+
+    def test_bypassed(self):
+        """All items are tested if the query or items change"""
+        items = ['abc', 'abd', 'xbc', 'ab', 'cab']
+        self.filter('ab', items)
+        # Shorter and different queries
+        self.filter('a', items)
+        self.filter('b', items)
+        self.assertEqual(self.narrowed, [None, None, None])
+        # Fewer and more items
+        self.filter('bc', items)
+        self.assertEqual(self.narrowed.pop(), [0, 1, 2, 3, 4])
+        self.filter('bcd', items[:-1])
+        self.filter('bcd', items + ['bcd'])
+        # Other options
+        self.filter('bcde', items + ['bcd'], match_on=MATCH_SUBSTRING)
+        self.filter('bcdef', items + ['bcd'], match_on=MATCH_SUBSTRING,
+                    fold_diacritics=False)
+        self.assertEqual(self.narrowed, [None] * 7)
+        # Non-ASCII queries aren't folded
+        self.filter('caf', ['Café', 'Cafe'])
+        self.filter('café', ['Café', 'Cafe'])
+        self.assertEqual(self.narrowed[-1], None)
+        # MATCH_ATOM can match extended queries that didn't match before
+        self.filter('kilo', ['kilo meter'], match_on=MATCH_ATOM)
+        self.filter('kilo meter', ['kilo meter'], match_on=MATCH_ATOM)
+        self.assertEqual(self.narrowed[-1], None)
+
+    def test_unordered_items(self):
+        """Items without positions aren't cached"""
+        self.assertEqual(
+            self.wf.filter('ab', iter(['abc', 'xyz']), narrow_cache='test'),
+            ['abc'])
+        self.assertIsNone(self.wf.cached_data('__workflow_filter_test',
+                                              max_age=0))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for `workflow.LockFile`."""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from util import SRC_DIR
+
+from workflow.workflow import AcquisitionError, LockFile
+
+# Lock a file in another process. The lock is held until stdin is
+# closed, or never released if the process exits first.
+HOLDER = """
+import os, sys
+sys.path.insert(0, {src!r})
+from workflow.workflow import LockFile
+lock = LockFile({path!r}, shared={shared!r})
+lock.acquire()
+sys.stdout.write('locked\\n')
+sys.stdout.flush()
+if {exit!r}:
+    os._exit(0)
+sys.stdin.read()
+"""
+
+
+class LockFileTestCase(unittest.TestCase):
+    """flock-based locks."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'data.json')
+        self.processes = []
+
+    def tearDown(self):
+        for proc in self.processes:
+            if proc.poll() is None:
+                proc.stdin.close()
+                proc.wait()
+        shutil.rmtree(self.tempdir)
+
+    def hold(self, shared=False, exit=False):
+        """Lock `self.path` in another process."""
+        code = HOLDER.format(src=SRC_DIR, path=self.path, shared=shared,
+                             exit=exit)
+        proc = subprocess.Popen([sys.executable, '-c', code],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.processes.append(proc)
+        self.assertEqual(proc.stdout.readline(), b'locked\n')
+        return proc
+
+    def test_acquire_release(self):
+        """Locks are acquired and released"""
+        lock = LockFile(self.path)
+        self.assertFalse(lock.locked)
+        self.assertTrue(lock.acquire())
+        self.assertTrue(lock.locked)
+        self.assertTrue(os.path.exists(lock.lockfile))
+        # Another lock on the same file can't be acquired
+        self.assertFalse(LockFile(self.path).acquire(blocking=False))
+        lock.release()
+        self.assertFalse(lock.locked)
+        # The lock file stays, but isn't locked
+        self.assertTrue(os.path.exists(lock.lockfile))
+        other = LockFile(self.path)
+        self.assertTrue(other.acquire(blocking=False))
+        other.release()
+
+        with LockFile(self.path) as lock:
+            self.assertTrue(lock.locked)
+        self.assertFalse(lock.locked)
+
+    def test_timeout(self):
+        """Acquisition times out while another process holds the lock"""
+        proc = self.hold()
+        lock = LockFile(self.path, timeout=0.2, delay=0.05)
+        start = time.time()
+        self.assertRaises(AcquisitionError, lock.acquire)
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertFalse(lock.locked)
+        self.assertFalse(lock.acquire(blocking=False))
+
+        # Released by the other process
+        proc.stdin.close()
+        proc.wait()
+        self.assertTrue(lock.acquire())
+        lock.release()
+
+    def test_shared(self):
+        """Shared locks exclude exclusive locks, not each other"""
+        self.hold(shared=True)
+        lock = LockFile(self.path, shared=True, timeout=0.1)
+        self.assertTrue(lock.acquire())
+        self.assertRaises(AcquisitionError,
+                          LockFile(self.path, timeout=0.1).acquire)
+        lock.release()
+
+    def test_dead_holder(self):
+        """Locks of processes that exited are released"""
+        proc = self.hold(exit=True)
+        proc.wait()
+        self.assertTrue(os.path.exists(self.path + '.lock'))
+        lock = LockFile(self.path, timeout=0.1)
+        self.assertTrue(lock.acquire())
+        lock.release()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
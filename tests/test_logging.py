@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for `Workflow.logger` and `QueueHandler`."""
+
+from __future__ import print_function, unicode_literals
+
+import logging
+import os
+import unittest
+
+from util import WorkflowTestCase
+from workflow import Workflow
+from workflow.workflow import QueueHandler
+
+
+class LoggerTestCase(WorkflowTestCase):
+    """Log records are written to the log file by a thread."""
+
+    def setUp(self):
+        # Other tests have set up the (global) logger already
+        self.logger = logging.getLogger('workflow')
+        self._handlers = self.logger.handlers[:]
+        self._level = self.logger.level
+        del self.logger.handlers[:]
+        self._debug = os.environ.pop('alfred_debug', None)
+        super(LoggerTestCase, self).setUp()
+
+    def tearDown(self):
+        for handler in self.logger.handlers:
+            handler.close()
+        self.logger.handlers[:] = self._handlers
+        self.logger.setLevel(self._level)
+        if self._debug is not None:
+            os.environ['alfred_debug'] = self._debug
+        super(LoggerTestCase, self).tearDown()
+
+    def flush(self):
+        """Wait for queued records and return contents of log file."""
+        handler, = self.logger.handlers
+        handler.close()
+        with open(self.wf.logfile) as file_obj:
+            return file_obj.read()
+
+    def test_records_written(self):
+        """Records reach the log file when the queue is flushed"""
+        log = self.wf.logger
+        handler, = log.handlers
+        self.assertIsInstance(handler, QueueHandler)
+
+        units = ['meter']
+        log.info('Units : %r', units)
+        # Arguments are formatted when the record is logged
+        units.append('second')
+        try:
+            raise ValueError('Bad unit')
+        except ValueError:
+            log.exception('Failed')
+
+        contents = self.flush()
+        self.assertIn("INFO     Units : [u'meter']\n", contents)
+        self.assertIn('ERROR    Failed\n', contents)
+        self.assertIn('ValueError: Bad unit', contents)
+        self.assertTrue(handler.queue.empty())
+
+    def test_set_up_once(self):
+        """Handlers are only added once"""
+        log = self.wf.logger
+        self.assertIs(self.wf.logger, log)
+        other = Workflow()
+        self.assertIs(other.logger, log)
+        self.assertEqual(len(log.handlers), 1)
+        other.logger.info('Second workflow')
+        self.assertEqual(self.flush().count('Second workflow'), 1)
+
+    def test_level(self):
+        """Debug messages are only logged in Alfred's debugger"""
+        self.wf.logger.debug('Not logged')
+        self.wf.logger.info('Logged')
+        self.assertEqual(self.wf.logger.level, logging.INFO)
+
+        os.environ['alfred_debug'] = '1'
+        wf = Workflow()
+        self.assertEqual(wf.log_level, logging.DEBUG)
+        wf.logger.debug('Debug logged')
+        self.assertEqual(Workflow(log_level=logging.ERROR).log_level,
+                         logging.ERROR)
+        del os.environ['alfred_debug']
+
+        contents = self.flush()
+        self.assertNotIn('Not logged', contents)
+        self.assertIn('Logged', contents)
+        self.assertIn('Debug logged', contents)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,646 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for the workflow's changes to the vendored pint."""
+
+from __future__ import print_function, unicode_literals, division
+
+import copy
+import cPickle
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from util import SRC_DIR
+
+from vendor import pint
+from vendor.pint import (UnitRegistry, DimensionalityError,
+                         OffsetUnitCalculusError, UndefinedUnitError)
+from vendor.pint import formatting
+from vendor.pint.context import _freeze
+from vendor.pint.unit import UnitsContainer, _unit_id
+from vendor.pint.util import ParserHelper
+
+# Units of many different dimensions, and some with the same ones
+SAMPLE_UNITS = [
+    'meter', 'inch', 'mile', 'light_year', 'second', 'hour', 'year',
+    'kilogram', 'pound', 'newton', 'dyne', 'joule', 'calorie',
+    'electron_volt', 'watt', 'horsepower', 'pascal', 'psi', 'bar',
+    'kelvin', 'degC', 'degF', 'hertz', 'becquerel', 'liter', 'gallon',
+    'acre', 'are', 'coulomb', 'ampere', 'volt', 'ohm', 'farad',
+    'tesla', 'gauss', 'weber', 'mole', 'candela',
+    'radian', 'degree', 'steradian', 'mph', 'knot',
+    'meter / second ** 2', 'joule * second', 'kilogram ** 0.5',
+]
+
+# The workflow's definitions, which redefine some of pint's units
+UNIT_DEFINITIONS = os.path.join(SRC_DIR, 'unit_definitions.txt')
+
+
+def eager_registry(*files):
+    """Return registry with pint's units and those in `files`."""
+    ureg = UnitRegistry()
+    for path in files:
+        ureg.load_definitions(path)
+    return ureg
+
+
+def lazy_registry(*files):
+    """Return registry that defines units from an index when used."""
+    ureg = UnitRegistry(None)
+    index = ureg.index_definitions('default_en.txt', True)
+    for path in files:
+        ureg.index_definitions(path, index=index)
+    ureg.load_index(index)
+    return ureg
+
+
+class UnitsContainerTestCase(unittest.TestCase):
+    """Array-backed UnitsContainer behaves like a dict of exponents."""
+
+    def setUp(self):
+        self.speed = UnitsContainer({'meter': 1, 'second': -1})
+        self.time = UnitsContainer({'second': 1})
+
+    def test_arrays(self):
+        """Units are sorted ids and float exponents"""
+        ids = self.speed._ids
+        self.assertEqual(list(ids), sorted(ids))
+        self.assertEqual(ids[self.speed._exps.index(-1.0)], _unit_id('second'))
+        self.assertEqual(self.speed._exps, tuple(float(e)
+                                                 for e in self.speed._exps))
+
+    def test_mapping(self):
+        """Mapping interface"""
+        self.assertEqual(dict(self.speed), {'meter': 1.0, 'second': -1.0})
+        self.assertEqual(len(self.speed), 2)
+        self.assertIn('meter', self.speed)
+        self.assertNotIn('gram', self.speed)
+        self.assertEqual(self.speed['gram'], 0.0)
+        self.assertIsNone(self.speed.get('gram'))
+        self.assertEqual(sorted(self.speed), ['meter', 'second'])
+
+    def test_validation(self):
+        """Keys must be strings and values numbers"""
+        self.assertRaises(TypeError, UnitsContainer, {1: 1})
+        self.assertRaises(TypeError, UnitsContainer, {'meter': 'x'})
+        self.assertRaises(TypeError, self.speed.__setitem__, 'meter', 'x')
+
+    def test_arithmetic(self):
+        """Multiplication, division and powers"""
+        self.assertEqual(self.speed * self.time, UnitsContainer(meter=1))
+        self.assertEqual(self.speed / self.time,
+                         UnitsContainer(meter=1, second=-2))
+        self.assertEqual(self.speed ** 2, UnitsContainer(meter=2, second=-2))
+        self.assertEqual(1 / self.time, UnitsContainer(second=-1))
+        self.assertEqual(UnitsContainer() * self.time, self.time)
+        # Operands are unchanged
+        self.assertEqual(self.speed, UnitsContainer(meter=1, second=-1))
+
+        units = copy.copy(self.speed)
+        units *= self.time
+        self.assertEqual(units, UnitsContainer(meter=1))
+        units /= self.time
+        self.assertEqual(units, self.speed)
+        units **= 2
+        self.assertEqual(units, self.speed ** 2)
+
+    def test_mutation(self):
+        """Changes keep the arrays sorted and reset the caches"""
+        units = copy.copy(self.speed)
+        frozen, hashed = units.freeze(), hash(units)
+        units['ampere'] = 1
+        units['meter'] = 2
+        self.assertEqual(dict(units), {'meter': 2, 'second': -1, 'ampere': 1})
+        self.assertEqual(list(units._ids), sorted(units._ids))
+        self.assertNotEqual(units.freeze(), frozen)
+        self.assertNotEqual(hash(units), hashed)
+        self.assertEqual(units.pop('ampere'), 1)
+        del units['meter']
+        units.add('second', 1)
+        self.assertEqual(dict(units), {})
+        self.assertRaises(KeyError, units.pop, 'meter')
+        self.assertEqual(self.speed, UnitsContainer(meter=1, second=-1))
+
+    def test_equality(self):
+        """Containers compare equal to dicts, strings and ParserHelpers"""
+        self.assertEqual(self.speed, {'meter': 1, 'second': -1})
+        self.assertEqual(self.speed, 'meter / second')
+        self.assertNotEqual(self.speed, self.time)
+        self.assertNotEqual(self.speed, 1)
+        helper = ParserHelper.from_string('meter / second')
+        self.assertEqual(helper, self.speed)
+        self.assertEqual(hash(self.speed),
+                         hash(UnitsContainer(second=-1, meter=1)))
+
+    def test_copy_and_pickle(self):
+        """Copies and pickles"""
+        self.assertEqual(copy.deepcopy(self.speed), self.speed)
+        data = cPickle.dumps(self.speed, protocol=-1)
+        self.assertEqual(cPickle.loads(data), self.speed)
+        # Pickles contain names, not the ids of this process
+        self.assertIn(b'meter', data)
+        self.assertEqual(self.speed.freeze(),
+                         frozenset([('meter', 1.0), ('second', -1.0)]))
+
+
+class DimensionVectorTestCase(unittest.TestCase):
+    """Dimension vectors give the same results as dimensionality dicts."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ureg = UnitRegistry()
+
+    def dims(self, units):
+        """Return frozen dimensionality dict of `units`."""
+        return _freeze(self.ureg.get_dimensionality(units))
+
+    def test_vectors(self):
+        """Vectors contain the exponents of the dimensionality"""
+        ids = self.ureg._dimension_ids
+        for units in SAMPLE_UNITS:
+            vector = self.ureg.get_dimension_vector(units)
+            self.assertTrue(not vector or vector[-1], units)
+            expected = dict(self.ureg.get_dimensionality(units))
+            self.assertEqual(dict((dim, vector[i])
+                                  for dim, i in ids.items()
+                                  if i < len(vector) and vector[i]),
+                             expected, units)
+
+        self.assertEqual(self.ureg.get_dimension_vector('radian'), ())
+        self.assertEqual(self.ureg.get_dimension_vector(''), ())
+
+    def test_same_units(self):
+        """Units have the same vector iff they have the same dimensions"""
+        ureg = self.ureg
+        names = [name for name in ureg._units if '[' not in name]
+        for a, b in itertools.combinations(SAMPLE_UNITS, 2):
+            self.assertEqual(
+                ureg.get_dimension_vector(a) == ureg.get_dimension_vector(b),
+                self.dims(a) == self.dims(b), (a, b))
+
+        # The index of compatible units groups all units the same way
+        groups = {}
+        for name in names:
+            if name.startswith('delta_'):
+                continue
+            groups.setdefault(self.dims(UnitsContainer({name: 1})),
+                              set()).add(ureg._units[name].name)
+        seen = set()
+        for vector, units in ureg._dimensional_equivalents.items():
+            dims = self.dims(UnitsContainer({next(iter(units)): 1}))
+            self.assertNotIn(dims, seen)
+            seen.add(dims)
+            self.assertTrue(units <= groups[dims], vector)
+
+    def test_compatibility(self):
+        """Conversions and arithmetic need the same dimensions"""
+        ureg = self.ureg
+        for a, b in itertools.product(SAMPLE_UNITS, repeat=2):
+            compatible = self.dims(a) == self.dims(b)
+            qa, qb = ureg.Quantity(1, a), ureg.Quantity(2, b)
+            try:
+                qa.to(b)
+            except DimensionalityError:
+                self.assertFalse(compatible, (a, b))
+            else:
+                self.assertTrue(compatible, (a, b))
+
+            # Units with an offset can't be added
+            if not {a, b} & {'degC', 'degF'}:
+                try:
+                    qa + qb
+                    qa < qb
+                except DimensionalityError:
+                    self.assertFalse(compatible, (a, b))
+                else:
+                    self.assertTrue(compatible, (a, b))
+
+    def test_later_dimensions(self):
+        """Vectors don't change when dimensions are added"""
+        ureg = UnitRegistry()
+        before = dict((u, ureg.get_dimension_vector(u)) for u in SAMPLE_UNITS)
+        ureg.define('euro = [currency] = EUR')
+        ureg.define('dollar = 0.9 euro = USD')
+        for units, vector in before.items():
+            self.assertEqual(ureg.get_dimension_vector(units), vector)
+        self.assertNotEqual(ureg.get_dimension_vector('USD'),
+                            ureg.get_dimension_vector('meter'))
+        self.assertEqual(ureg.get_dimension_vector('USD / meter'),
+                         ureg.get_dimension_vector('EUR / meter'))
+        self.assertEqual(ureg.Quantity(1, 'USD').to('EUR').magnitude, 0.9)
+
+
+class QuantityTestCase(unittest.TestCase):
+    """Quantities with `__slots__`."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ureg = UnitRegistry()
+        cls.Q = cls.ureg.Quantity
+
+    def assertQuantity(self, qty, magnitude, units):
+        """Check `qty` is a quantity of this registry."""
+        self.assertIsInstance(qty, self.Q)
+        self.assertAlmostEqual(qty.magnitude, magnitude)
+        self.assertEqual(qty.units, self.ureg.parse_units(units))
+
+    def test_slots(self):
+        """Quantities have no `__dict__`"""
+        qty = self.Q(3, 'meter')
+        self.assertFalse(hasattr(qty, '__dict__'))
+        with self.assertRaises(AttributeError):
+            qty.foo = 1
+
+    def test_arithmetic(self):
+        """Arithmetic with numbers and quantities"""
+        Q = self.Q
+        self.assertQuantity(Q(3, 'meter') + Q(2, 'meter'), 5, 'meter')
+        self.assertQuantity(Q(3, 'meter') - Q(2.5, 'meter'), 0.5, 'meter')
+        self.assertQuantity(Q(1, 'meter') + Q(50, 'centimeter'), 1.5, 'meter')
+        self.assertQuantity(Q(3, 'meter') * 2, 6, 'meter')
+        self.assertQuantity(2.0 * Q(3, 'meter'), 6, 'meter')
+        self.assertQuantity(Q(3, 'meter') / 2, 1.5, 'meter')
+        self.assertQuantity(1 / Q(4, 'second'), 0.25, '1 / second')
+        self.assertQuantity(Q(3, 'meter') * Q(2, 'second'), 6,
+                            'meter * second')
+        self.assertQuantity(Q(3, 'meter') / Q(2, 'second'), 1.5,
+                            'meter / second')
+        self.assertQuantity(Q(3, 'meter') ** 2, 9, 'meter ** 2')
+        self.assertQuantity(-Q(3, 'meter'), -3, 'meter')
+        self.assertTrue(Q(1, 'meter') > Q(99, 'centimeter'))
+        self.assertEqual(Q(1, 'meter'), Q(100, 'centimeter'))
+        with self.assertRaises(DimensionalityError):
+            Q(1, 'meter') + Q(1, 'second')
+
+    def test_offset_units(self):
+        """Temperatures"""
+        Q = self.Q
+        self.assertQuantity(Q(25, 'degC') - Q(20, 'degC'), 5, 'delta_degC')
+        self.assertQuantity(Q(20, 'degC') + Q(5, 'delta_degC'), 25, 'degC')
+        self.assertQuantity(Q(20, 'degC').to('kelvin'), 293.15, 'kelvin')
+        with self.assertRaises(OffsetUnitCalculusError):
+            Q(20, 'degC') + Q(5, 'degC')
+        with self.assertRaises(OffsetUnitCalculusError):
+            Q(20, 'degC') * Q(2, 'degC')
+        self.assertQuantity(Q(2, 'delta_degC') * 2, 4, 'delta_degC')
+
+    def test_in_place(self):
+        """In-place operations change units and dimensionality"""
+        qty = self.Q(3, 'meter')
+        original = qty
+        qty *= self.Q(2, 'meter')
+        self.assertQuantity(qty, 6, 'meter ** 2')
+        self.assertEqual(qty.dimensionality, {'[length]': 2})
+        qty /= self.Q(3, 'second')
+        self.assertEqual(qty.dimensionality, {'[length]': 2, '[time]': -1})
+        qty += self.Q(1, 'meter ** 2 / second')
+        self.assertQuantity(qty, 3, 'meter ** 2 / second')
+        # Scalar quantities are immutable
+        self.assertQuantity(original, 3, 'meter')
+
+    def test_copy(self):
+        """Copies are quantities of the same registry"""
+        qty = self.Q(3, 'meter')
+        for dup in (copy.copy(qty), copy.deepcopy(qty)):
+            self.assertIsNot(dup, qty)
+            self.assertEqual(dup, qty)
+            self.assertIsNot(dup._units, qty._units)
+            dup *= self.Q(1, 'second')
+            self.assertQuantity(qty, 3, 'meter')
+
+    def test_pickle(self):
+        """Pickled quantities are rebuilt with the application registry"""
+        registry = pint._APP_REGISTRY
+        pint.set_application_registry(self.ureg)
+        try:
+            for qty in (self.Q(3, 'meter'), self.Q(2.5, 'degC'),
+                        self.Q(1, 'meter / second ** 2')):
+                for module, protocol in ((pickle, 0), (pickle, 2),
+                                         (cPickle, -1)):
+                    copied = module.loads(module.dumps(qty, protocol))
+                    self.assertIsInstance(copied, self.Q)
+                    self.assertEqual(copied.magnitude, qty.magnitude)
+                    self.assertEqual(copied.units, qty.units)
+                    self.assertEqual(copied, qty)
+        finally:
+            # The default is a LazyRegistry, which can't be set again
+            pint._APP_REGISTRY = registry
+
+
+class DeltaUnitsTestCase(unittest.TestCase):
+    """`delta_` units are defined when first used."""
+
+    def setUp(self):
+        self.ureg = lazy_registry()
+        self.Q = self.ureg.Quantity
+
+    def test_not_defined_yet(self):
+        """No delta units are defined up front"""
+        self.assertEqual([name for name in dict.keys(self.ureg._units)
+                          if name.startswith(('delta_', 'Δ'))], [])
+
+    def test_conversions(self):
+        """Delta units have the scale of their unit, without the offset"""
+        Q = self.Q
+        self.assertAlmostEqual(Q(1, 'delta_degC').to('kelvin').magnitude, 1)
+        self.assertAlmostEqual(Q(1, 'delta_degC').to('delta_degF').magnitude,
+                               1.8)
+        self.assertAlmostEqual(Q(9, 'delta_degF').to('delta_degC').magnitude,
+                               5)
+        self.assertAlmostEqual(Q(1, 'delta_degF').to('degR').magnitude, 1)
+
+    def test_first_use(self):
+        """Delta units work whatever uses them first"""
+        # Subtracting temperatures
+        diff = self.Q(25, 'degC') - self.Q(20, 'degC')
+        self.assertEqual(diff.units, self.ureg.parse_units('delta_degC'))
+        self.assertAlmostEqual(diff.to('delta_degF').magnitude, 9)
+
+        # Parsing, case-insensitive parsing and definitions
+        ureg = lazy_registry()
+        self.assertEqual(dict(ureg.parse_units('delta_fahrenheit')),
+                         {'delta_degF': 1})
+        ureg = lazy_registry()
+        self.assertIn(('', 'delta_degC', None),
+                      list(ureg.parse_unit_name('DELTA_DEGC', False)))
+        ureg = lazy_registry()
+        definition = ureg._units['Δcelsius']
+        self.assertEqual(definition.name, 'delta_degC')
+        self.assertEqual(definition.symbol, 'Δcelsius')
+        self.assertEqual(definition.converter.scale, 1)
+        self.assertEqual(dict(definition.reference), {'kelvin': 1})
+        self.assertIs(ureg._units['delta_degC'], definition)
+
+    def test_same_as_eager(self):
+        """Same as in a registry with all units defined"""
+        eager = eager_registry()
+        for name in ('delta_degC', 'delta_degF', 'delta_celsius',
+                     'delta_fahrenheit', 'kelvin / delta_degF',
+                     'delta_degC * meter'):
+            self.assertEqual(self.ureg.get_dimension_vector(name),
+                             eager.get_dimension_vector(name), name)
+            factor, units = self.ureg.get_base_units(name)
+            expected = eager.get_base_units(name)
+            self.assertAlmostEqual(factor, expected[0])
+            self.assertEqual(units, expected[1], name)
+
+    def test_not_delta_units(self):
+        """Only units with an offset have delta units"""
+        for name in ('delta_meter', 'delta_kelvin', 'delta_degR', 'delta_',
+                     'delta_nonsense'):
+            self.assertRaises(UndefinedUnitError, self.ureg.parse_units, name)
+        self.assertRaises(KeyError, self.ureg._units.__getitem__, 'Δmeter')
+
+class LazyContextTestCase(unittest.TestCase):
+    """Contexts are built from their definitions when first used."""
+
+    # `(source, destination, contexts, context arguments)`
+    CONVERSIONS = [
+        ('500 nanometer', 'terahertz', ('sp', ), {}),
+        ('500 nanometer', 'electron_volt', ('spectroscopy', ), {}),
+        ('2 electron_volt', 'nanometer', ('sp', ), {}),
+        ('500 nanometer', 'terahertz', ('sp', ), {'n': 1.5}),
+        ('300 kelvin', 'electron_volt', ('boltzmann', ), {}),
+        ('1 electron_volt', 'kelvin', ('boltzmann', ), {}),
+        ('2 mole', 'gram', ('chem', ), {'mw': '18 gram / mole'}),
+        ('36 gram / liter', 'mole / liter', ('chemistry', ),
+         {'mw': '18 gram / mole'}),
+        ('1 electron_volt', 'kelvin', ('sp', 'boltzmann'), {}),
+    ]
+
+    def eager_registry(self):
+        """Return registry with all contexts built."""
+        ureg = eager_registry()
+        for name in list(ureg._context_definitions):
+            if name in ureg._context_definitions:
+                ureg._get_context(name)
+        self.assertEqual(ureg._context_definitions, {})
+        return ureg
+
+    def convert(self, ureg, src, dest, contexts, kwargs):
+        """Return magnitude of `src` converted to `dest` in `contexts`."""
+        kwargs = dict((k, ureg(v) if isinstance(v, unicode) else v)
+                      for k, v in kwargs.items())
+        with ureg.context(*contexts, **kwargs):
+            return ureg(src).to(dest).magnitude
+
+    def test_not_built(self):
+        """Contexts aren't built until they are used"""
+        for ureg in (lazy_registry(), eager_registry()):
+            self.assertEqual(ureg._contexts, {})
+            self.assertIn('sp', ureg._context_definitions)
+            self.assertIn('boltzmann', ureg._context_definitions)
+            with ureg.context('sp'):
+                pass
+            self.assertIn('spectroscopy', ureg._contexts)
+            self.assertNotIn('sp', ureg._context_definitions)
+            self.assertIn('boltzmann', ureg._context_definitions)
+
+    def test_same_conversions(self):
+        """Lazily built contexts convert like ones built up front"""
+        eager = self.eager_registry()
+        for ureg in (lazy_registry(), eager_registry()):
+            for conversion in self.CONVERSIONS:
+                self.assertAlmostEqual(
+                    self.convert(ureg, *conversion) /
+                    self.convert(eager, *conversion), 1, 12, conversion)
+
+    def test_known_values(self):
+        """Conversions give the expected values"""
+        ureg = lazy_registry()
+        values = [self.convert(ureg, *conversion)
+                  for conversion in self.CONVERSIONS[:3]]
+        for value, expected in zip(values, (599.584916, 2.479684, 619.920978)):
+            self.assertAlmostEqual(value, expected, 5)
+
+    def test_only_in_context(self):
+        """Conversions need the context"""
+        ureg = lazy_registry()
+        for src, dest, contexts, kwargs in self.CONVERSIONS:
+            self.assertRaises(DimensionalityError, ureg(src).to, dest)
+            self.convert(ureg, src, dest, contexts, kwargs)
+            self.assertRaises(DimensionalityError, ureg(src).to, dest)
+        # Contexts passed to `to()`
+        self.assertAlmostEqual(
+            ureg('500 nanometer').to('terahertz', 'sp').magnitude,
+            599.584916, 5)
+
+    def test_unknown_context(self):
+        """Undefined contexts raise KeyError"""
+        ureg = lazy_registry()
+        with self.assertRaises(KeyError):
+            with ureg.context('nonsense'):
+                pass
+
+
+class LazyRegistryTestCase(unittest.TestCase):
+    """Units loaded with `load_index()` are the same as eagerly loaded ones.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.user_definitions = os.path.join(self.tempdir, 'user.txt')
+        with open(self.user_definitions, 'wb') as file_obj:
+            file_obj.write(b'# Custom units\n'
+                           b'mile = 1600 * meter = mi\n'
+                           b'smoot = 67 * inch\n'
+                           b'metric_foot = 30 * cm = mft\n')
+        self.files = (UNIT_DEFINITIONS, self.user_definitions)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def assertSameUnit(self, lazy, eager, name):
+        """Check `name` is the same unit in `lazy` and `eager`."""
+        expected = dict.__getitem__(eager._units, name)
+        definition = lazy._units[name]
+        for attr in ('name', 'symbol', 'aliases', 'is_base',
+                     'is_multiplicative'):
+            self.assertEqual(getattr(definition, attr),
+                             getattr(expected, attr), (name, attr))
+        self.assertEqual(definition.converter.scale, expected.converter.scale,
+                         name)
+        self.assertEqual(getattr(definition.converter, 'offset', 0),
+                         getattr(expected.converter, 'offset', 0), name)
+        self.assertEqual(dict(definition.reference or {}),
+                         dict(expected.reference or {}), name)
+
+        units = UnitsContainer({name: 1})
+        factor, base_units = lazy.get_base_units(units)
+        expected = eager.get_base_units(units)
+        self.assertAlmostEqual(factor / expected[0], 1, 12, name)
+        self.assertEqual(base_units, expected[1], name)
+        self.assertEqual(lazy.get_dimension_vector(units),
+                         eager.get_dimension_vector(units), name)
+
+    def test_every_unit(self):
+        """Every name resolves to the same unit"""
+        eager = eager_registry(*self.files)
+        lazy = lazy_registry(*self.files)
+        names = set(dict.keys(eager._units))
+        for name in sorted(names):
+            # Also defines prefixed units, e.g. kilogram
+            self.assertEqual(lazy.get_name(name), eager.get_name(name), name)
+            self.assertSameUnit(lazy, eager, name)
+        self.assertEqual(lazy._pending_definitions, {})
+
+        # Names are found the same way
+        for name in ('km', 'kilohour', 'miles', 'MI', 'Kilometers', 'H',
+                     'planck_constant', 'delta_degC', 'ha', 'nonsense'):
+            self.assertEqual(
+                sorted(lazy.parse_unit_name(name, False)),
+                sorted(eager.parse_unit_name(name, False)), name)
+
+    def test_overrides(self):
+        """Redefined units use the last definition"""
+        for ureg in (lazy_registry(*self.files),
+                     eager_registry(*self.files)):
+            Q = ureg.Quantity
+            # unit_definitions.txt makes `h` an hour
+            self.assertEqual(dict(ureg.parse_units('h')), {'hour': 1})
+            self.assertEqual(Q(2, 'h').to('minute').magnitude, 120)
+            self.assertAlmostEqual(Q(1, 'planck_constant').to('J*s').magnitude,
+                                   6.62606957e-34)
+            self.assertEqual(Q(1, 'hectare').to('m**2').magnitude, 10000)
+            # User definitions override pint's and the workflow's
+            self.assertEqual(Q(1, 'mi').to('meter').magnitude, 1600)
+            self.assertAlmostEqual(Q(1, 'smoot').to('cm').magnitude, 170.18)
+            self.assertEqual(Q(10, 'mft').to('meter').magnitude, 3)
+            # Units defined in terms of redefined units use the new ones
+            self.assertEqual(Q(1, 'mile / hour').to('meter / minute')
+                             .magnitude, 1600 / 60)
+
+    def test_override_order(self):
+        """Overrides apply whichever unit is used first"""
+        for first in ('planck_constant', 'hour', 'h', 'hbar', 'hr'):
+            ureg = lazy_registry(*self.files)
+            ureg.parse_units(first)
+            self.assertEqual(dict(ureg.parse_units('h')), {'hour': 1}, first)
+            self.assertEqual(dict(ureg.parse_units('planck_constant')),
+                             {'planck_constant': 1}, first)
+            self.assertAlmostEqual(
+                ureg.Quantity(1, 'hbar').to('J*s').magnitude,
+                6.62606957e-34 / (2 * 3.141592653589793), 40)
+
+
+class FormatCacheTestCase(unittest.TestCase):
+    """Memoized formatting of units."""
+
+    SPECS = ('', 'P', 'L', 'H', 'C')
+
+    @classmethod
+    def setUpClass(cls):
+        cls.ureg = UnitRegistry()
+        cls.units = [cls.ureg.parse_units(name) for name in SAMPLE_UNITS]
+
+    def setUp(self):
+        formatting._FORMAT_CACHE.clear()
+
+    def uncached(self, units, spec):
+        """Return `units` formatted without the cache."""
+        formatting._FORMAT_CACHE.clear()
+        return formatting.format_unit(units, spec)
+
+    def test_same_strings(self):
+        """Cached strings are the same as freshly formatted ones"""
+        for units in self.units:
+            for spec in self.SPECS:
+                expected = self.uncached(units, spec)
+                self.assertEqual(formatting.format_unit(units, spec),
+                                 expected)
+                # Equal containers and dicts share entries
+                self.assertEqual(formatting.format_unit(copy.copy(units),
+                                                        spec), expected)
+                self.assertEqual(formatting.format_unit(dict(units), spec),
+                                 expected)
+        self.assertEqual(formatting.format_unit(UnitsContainer(), ''),
+                         'dimensionless')
+
+    def test_cached(self):
+        """Each unit and spec is formatted once"""
+        calls = []
+        _formatter = formatting.formatter
+
+        def formatter(items, **kwargs):
+            calls.append(items)
+            return _formatter(items, **kwargs)
+
+        formatting.formatter = formatter
+        try:
+            for _ in range(3):
+                for units in self.units:
+                    '{0:P}'.format(units)
+                    format(units, '')
+        finally:
+            formatting.formatter = _formatter
+        self.assertEqual(len(calls), 2 * len(set(self.units)))
+
+    def test_mutated(self):
+        """Changed containers aren't formatted as they were"""
+        units = UnitsContainer(meter=1, second=-1)
+        self.assertEqual(formatting.format_unit(units, ''), 'meter / second')
+        units['second'] = -2
+        self.assertEqual(formatting.format_unit(units, ''),
+                         'meter / second ** 2')
+
+    def test_size(self):
+        """The cache is bounded"""
+        for i in range(formatting._FORMAT_CACHE_SIZE + 10):
+            formatting.format_unit(UnitsContainer(meter=i + 1), '')
+        self.assertLessEqual(len(formatting._FORMAT_CACHE),
+                             formatting._FORMAT_CACHE_SIZE)
+        self.assertEqual(formatting.format_unit(UnitsContainer(meter=3), ''),
+                         'meter ** 3')
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
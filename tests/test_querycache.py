@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for querycache.py."""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import unittest
+
+from util import WorkflowTestCase
+
+from querycache import QueryCache
+
+ITEMS = [{'title': '100.00 centimeter', 'valid': False}]
+
+
+class QueryCacheTestCase(WorkflowTestCase):
+    """Persistent LRU cache of Script Filter items."""
+
+    def setUp(self):
+        super(QueryCacheTestCase, self).setUp()
+        self.cache = self.make_cache()
+
+    def make_cache(self, size=3):
+        """Return a new `QueryCache`, as another process would."""
+        return QueryCache(self.wf, 'query_results', size)
+
+    def age(self, key, seconds):
+        """Make entry for `key` look `seconds` older."""
+        path = self.cache._path(key)
+        mtime = os.stat(path).st_mtime - seconds
+        os.utime(path, (mtime, mtime))
+        return mtime
+
+    def test_miss(self):
+        """Unknown keys"""
+        self.assertIsNone(self.cache.get(('1 m', 2)))
+        self.cache.set(('1 m', 2), ITEMS)
+        self.assertIsNone(self.cache.get(('1 m', 3)))
+
+    def test_hit(self):
+        """Items are returned by other instances"""
+        self.cache.set(('1 m', 2), ITEMS)
+        self.assertEqual(self.make_cache().get(('1 m', 2)), ITEMS)
+
+    def test_hit_does_not_rewrite(self):
+        """Hits only update the entry's access time"""
+        key = ('1 m', 2)
+        self.cache.set(key, ITEMS)
+        path = self.cache._path(key)
+        mtime = self.age(key, 60)
+        with open(path, 'rb') as file_obj:
+            data = file_obj.read()
+        inode = os.stat(path).st_ino
+
+        self.assertEqual(self.make_cache().get(key), ITEMS)
+        st = os.stat(path)
+        self.assertGreater(st.st_mtime, mtime)
+        self.assertEqual(st.st_ino, inode)
+        with open(path, 'rb') as file_obj:
+            self.assertEqual(file_obj.read(), data)
+
+    def test_eviction(self):
+        """Least recently used entries are evicted on set"""
+        for i in range(3):
+            self.cache.set(i, [i])
+            self.age(i, 100 - i)
+        # Using 0 makes 1 the least recently used entry
+        self.assertEqual(self.cache.get(0), [0])
+        self.cache.set(3, [3])
+        self.assertIsNone(self.cache.get(1))
+        for i in (0, 2, 3):
+            self.assertEqual(self.cache.get(i), [i])
+        self.assertEqual(len(os.listdir(self.cache.dirpath)), 3)
+
+    def test_new_entry_kept(self):
+        """New entries survive eviction with coarse timestamps"""
+        self.cache = self.make_cache(size=1)
+        self.cache.set(0, [0])
+        path = self.cache._path(0)
+        mtime = os.stat(path).st_mtime
+        self.cache.set(1, [1])
+        os.utime(self.cache._path(1), (mtime, mtime))
+        self.cache.set(1, [1])
+        self.assertEqual(self.cache.get(1), [1])
+        self.assertIsNone(self.cache.get(0))
+
+    def test_corrupt_entry(self):
+        """Corrupt entries are misses and are removed"""
+        for data in (b'', b'not a pickle', b'\x80\x02K\x01.'):
+            self.cache.set(('1 m', 2), ITEMS)
+            path = self.cache._path(('1 m', 2))
+            with open(path, 'wb') as file_obj:
+                file_obj.write(data)
+            self.assertIsNone(self.make_cache().get(('1 m', 2)))
+            self.assertFalse(os.path.exists(path))
+        # and can be replaced
+        self.cache.set(('1 m', 2), ITEMS)
+        self.assertEqual(self.make_cache().get(('1 m', 2)), ITEMS)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for resultformat.py."""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
+
+from resultformat import ResultFormatter  # noqa: E402
+
+
+class ResultFormatterTestCase(unittest.TestCase):
+    """Format numbers of results."""
+
+    def setUp(self):
+        self.formatter = ResultFormatter(2)
+
+    def test_fixed(self):
+        """Numbers with decimal places"""
+        self.assertEqual(self.formatter.number(1.5), '1.50')
+        self.assertEqual(self.formatter.number(-206.0), '-206.00')
+        self.assertEqual(self.formatter.number(0), '0.00')
+
+    def test_small(self):
+        """Small numbers get significant figures"""
+        self.assertEqual(self.formatter.number(0.000001), '0.0000010')
+        self.assertEqual(self.formatter.number(0.00123), '0.0012')
+
+    def test_scientific(self):
+        """Huge and tiny numbers"""
+        self.assertEqual(self.formatter.number(1.06e-19), '1.06e-19')
+        self.assertEqual(self.formatter.number(1e15), '1.00e+15')
+
+    def test_rounding_noise(self):
+        """Numbers that are tiny relative to their reference are zero"""
+        self.assertEqual(self.formatter.number(-2.2e-7, 273.15), '0.00')
+        self.assertEqual(self.formatter.number(-2.2e-7), '-0.00000022')
+        # Not tiny compared to the reference
+        self.assertEqual(self.formatter.number(0.000001, 1), '0.0000010')
+        self.assertEqual(self.formatter.format_many(
+            [-2.2e-7, 0.000001], ['degC', 'kilometer'], [273.15, 0]),
+            ['0.00 degC', '0.0000010 kilometer'])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for workflow.workflow.Settings."""
+
+from __future__ import print_function, unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from util import WorkflowTestCase
+
+from workflow import workflow
+from workflow.workflow import Settings
+
+DEFAULTS = {'key1': 'value1', 'key2': ['a', 'b']}
+
+
+class SettingsTestCase(unittest.TestCase):
+    """Settings only written when changed."""
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tempdir, 'settings.json')
+        self.writes = []
+        self._atomic_writer = workflow.atomic_writer
+
+        def atomic_writer(path, mode):
+            self.writes.append(path)
+            return self._atomic_writer(path, mode)
+
+        workflow.atomic_writer = atomic_writer
+
+    def tearDown(self):
+        workflow.atomic_writer = self._atomic_writer
+        shutil.rmtree(self.tempdir)
+
+    def on_disk(self):
+        """Return settings in the settings file."""
+        with open(self.filepath, 'rb') as file_obj:
+            return json.load(file_obj)
+
+    def test_defaults(self):
+        """Defaults are written once"""
+        s = Settings(self.filepath, DEFAULTS)
+        self.assertEqual(len(self.writes), 1)
+        self.assertEqual(self.on_disk(), DEFAULTS)
+        self.assertFalse(s.changed)
+        # Existing file isn't rewritten
+        Settings(self.filepath, DEFAULTS)
+        self.assertEqual(len(self.writes), 1)
+
+    def test_unchanged(self):
+        """Setting the same values doesn't write the file"""
+        s = Settings(self.filepath, DEFAULTS)
+        s['key1'] = 'value1'
+        s.update(DEFAULTS)
+        s.setdefault('key2', [])
+        s.save()
+        self.assertEqual(len(self.writes), 1)
+        s['key1'] = 'value3'
+        self.assertEqual(len(self.writes), 2)
+        self.assertEqual(self.on_disk()['key1'], 'value3')
+
+    def test_mutated_value(self):
+        """Changes to mutable values are noticed"""
+        s = Settings(self.filepath, DEFAULTS)
+        s['key2'].append('c')
+        self.assertTrue(s.changed)
+        s.save()
+        self.assertEqual(len(self.writes), 2)
+        self.assertEqual(self.on_disk()['key2'], ['a', 'b', 'c'])
+        self.assertFalse(s.changed)
+
+    def test_batch(self):
+        """Changes in a batch are written once when it exits"""
+        s = Settings(self.filepath, DEFAULTS)
+        with s.batch():
+            s['key1'] = 'value3'
+            s['key3'] = 'value4'
+            del s['key2']
+            with s.batch():
+                s['key4'] = 'value5'
+            self.assertEqual(len(self.writes), 1)
+            self.assertEqual(self.on_disk(), DEFAULTS)
+        self.assertEqual(len(self.writes), 2)
+        self.assertEqual(self.on_disk(), {'key1': 'value3', 'key3': 'value4',
+                                          'key4': 'value5'})
+        self.assertEqual(Settings(self.filepath), s)
+
+    def test_batch_unchanged(self):
+        """Batches without changes don't write the file"""
+        s = Settings(self.filepath, DEFAULTS)
+        with s.batch():
+            s['key1'] = 'value3'
+            s['key1'] = 'value1'
+        self.assertEqual(len(self.writes), 1)
+
+    def test_batch_error(self):
+        """Changes are saved if a batch raises an exception"""
+        s = Settings(self.filepath, DEFAULTS)
+        with self.assertRaises(ValueError):
+            with s.batch():
+                s['key1'] = 'value3'
+                raise ValueError('error')
+        self.assertEqual(self.on_disk()['key1'], 'value3')
+
+
+class WorkflowRunTestCase(WorkflowTestCase):
+    """Settings changes during `Workflow.run()`."""
+
+    def setUp(self):
+        super(WorkflowRunTestCase, self).setUp()
+        self.saves = []
+        self._save = Settings.save
+
+        def save(settings):
+            self.saves.append(settings.changed and not settings._batch_depth)
+            return self._save(settings)
+
+        Settings.save = save
+
+    def tearDown(self):
+        Settings.save = self._save
+        super(WorkflowRunTestCase, self).tearDown()
+
+    def test_single_write(self):
+        """Settings changed by the workflow are written once"""
+        def main(wf):
+            wf.settings['key1'] = 'value1'
+            wf.settings['key2'] = 'value2'
+
+        self.assertEqual(self.wf.run(main), 0)
+        self.assertEqual(self.saves.count(True), 1)
+        settings = Settings(self.wf.settings_path)
+        self.assertEqual(settings['key1'], 'value1')
+        self.assertEqual(settings['key2'], 'value2')
+        # Version is saved in the same write
+        self.assertEqual(settings['__workflow_last_version'],
+                         str(self.wf.version))
+
+    def test_no_write(self):
+        """Runs that don't change settings don't write them"""
+        self.wf.settings['key1'] = 'value1'
+        self.wf.set_last_version()
+        del self.saves[:]
+        self.assertEqual(self.wf.run(lambda wf: wf.settings.get('key1')), 0)
+        self.assertNotIn(True, self.saves)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
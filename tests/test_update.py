@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Tests for workflow/update.py and `Workflow.check_update()`."""
+
+from __future__ import print_function, unicode_literals
+
+import time
+import unittest
+import urllib2
+
+from util import WorkflowTestCase
+from workflow import Workflow, background, update, web
+from workflow.workflow import UPDATE_QUEUE_WAIT
+
+TASK_NAME = '__workflow_update_check'
+
+DOWNLOAD_URL = 'https://github.com/deanishe/test/releases/{0}.alfredworkflow'
+
+RELEASES = [{
+    'tag_name': 'v2.0',
+    'prerelease': False,
+    'assets': [{'browser_download_url': DOWNLOAD_URL.format('2.0'),
+                'size': 1000, 'digest': 'sha256:abcd'}],
+}, {
+    'tag_name': 'v1.0',
+    'prerelease': False,
+    'assets': [{'browser_download_url': DOWNLOAD_URL.format('1.0')}],
+}]
+
+VALID_RELEASES = [
+    {'version': 'v2.0', 'download_url': DOWNLOAD_URL.format('2.0'),
+     'size': 1000, 'digest': 'sha256:abcd'},
+    {'version': 'v1.0', 'download_url': DOWNLOAD_URL.format('1.0'),
+     'size': None, 'digest': None},
+]
+
+
+class FakeResponse(object):
+    """`web.Response` for a GitHub API response."""
+
+    def __init__(self, status_code, releases=None, headers=None):
+        self.status_code = status_code
+        self.releases = releases
+        self.headers = web.CaseInsensitiveDictionary(headers or {})
+        self.error = None
+        if status_code >= 300:
+            self.error = urllib2.HTTPError('', status_code, 'Error', {}, None)
+
+    def json(self):
+        if self.releases is None:
+            raise AssertionError('Response has no content')
+        return self.releases
+
+    def raise_for_status(self):
+        if self.error is not None:
+            raise self.error
+
+
+class CheckUpdateTestCase(WorkflowTestCase):
+    """Update checks are queued, not run, from the Script Filter."""
+
+    def make_workflow(self):
+        return Workflow(update_settings={'github_slug': 'deanishe/test',
+                                         'version': '1.0'})
+
+    def setUp(self):
+        super(CheckUpdateTestCase, self).setUp()
+        self.workers = []
+        self._start_worker = background._start_worker
+        background._start_worker = lambda: self.workers.append(True)
+
+    def tearDown(self):
+        background._start_worker = self._start_worker
+        super(CheckUpdateTestCase, self).tearDown()
+
+    def queued(self):
+        """Return names of queued tasks."""
+        return [task['name'] for task in background._load_queue()['tasks']]
+
+    def test_not_due(self):
+        """No check within the update frequency"""
+        self.wf.cache_data('__workflow_update_status',
+                           {'available': False, 'checked': time.time()})
+        self.wf.check_update()
+        self.assertEqual(self.queued(), [])
+
+    def test_queued(self):
+        """Due checks are queued without starting a worker"""
+        self.wf.check_update()
+        self.wf.check_update()
+        self.assertEqual(self.queued(), [TASK_NAME])
+        self.assertEqual(self.workers, [])
+        # Status isn't written by the Script Filter
+        self.assertIsNone(
+            self.wf.cached_data('__workflow_update_status', max_age=0))
+
+    def test_waited_too_long(self):
+        """Queued checks start a worker if none has started"""
+        self.wf.check_update()
+        queue = background._load_queue()
+        queue['tasks'][0]['queued'] -= UPDATE_QUEUE_WAIT + 1
+        background._save_queue(queue)
+        self.wf.check_update()
+        self.assertEqual(self.workers, [True])
+
+    def test_force(self):
+        """Forced checks start a worker"""
+        self.wf.cache_data('__workflow_update_status',
+                           {'available': False, 'checked': time.time()})
+        self.wf.check_update(force=True)
+        self.assertEqual(self.queued(), [TASK_NAME])
+        self.assertEqual(self.workers, [True])
+
+    def test_failed_check(self):
+        """Failed checks aren't queued again straight away"""
+        def offline(slug):
+            raise IOError('No network')
+
+        get_valid_releases = update.get_valid_releases
+        update.get_valid_releases = offline
+        try:
+            with self.assertRaises(IOError):
+                update.check_update('deanishe/test', '1.0')
+        finally:
+            update.get_valid_releases = get_valid_releases
+
+        status = self.wf.cached_data('__workflow_update_status', max_age=0)
+        self.assertGreater(status['next_check'], time.time())
+        self.wf.check_update()
+        self.assertEqual(self.queued(), [])
+
+
+class GetReleasesTestCase(WorkflowTestCase):
+    """GitHub releases are only downloaded again if they've changed."""
+
+    def setUp(self):
+        super(GetReleasesTestCase, self).setUp()
+        self.requests = []
+        self.responses = []
+        self._get = web.get
+        web.get = self.get
+
+    def tearDown(self):
+        web.get = self._get
+        super(GetReleasesTestCase, self).tearDown()
+
+    def get(self, url, headers=None, **kwargs):
+        """Record request and return next response."""
+        self.requests.append((url, headers or {}))
+        return self.responses.pop(0)
+
+    def test_etag(self):
+        """Validators are cached and sent with the next request"""
+        modified = 'Mon, 01 Jun 2015 10:00:00 GMT'
+        self.responses.append(FakeResponse(200, RELEASES, {
+            'ETag': '"abc"', 'Last-Modified': modified}))
+        self.assertEqual(update.get_valid_releases('deanishe/test'),
+                         VALID_RELEASES)
+        self.assertEqual(self.requests, [
+            ('https://api.github.com/repos/deanishe/test/releases', {})])
+
+        self.responses.append(FakeResponse(304))
+        self.assertEqual(update.get_valid_releases('deanishe/test'),
+                         VALID_RELEASES)
+        self.assertEqual(self.requests[1][1], {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': modified})
+
+    def test_not_modified(self):
+        """304 responses reuse the cached releases"""
+        self.responses.append(FakeResponse(200, RELEASES, {'ETag': '"abc"'}))
+        update.get_valid_releases('deanishe/test')
+        cached = self.wf.cached_data('gh-releases-deanishe-test', max_age=0)
+
+        self.responses.append(FakeResponse(304))
+        self.assertEqual(update.get_valid_releases('deanishe/test'),
+                         VALID_RELEASES)
+        self.assertEqual(self.requests[1][1], {'If-None-Match': '"abc"'})
+        self.assertEqual(
+            self.wf.cached_data('gh-releases-deanishe-test', max_age=0),
+            cached)
+
+    def test_modified(self):
+        """Changed releases replace the cached ones"""
+        self.responses.append(FakeResponse(200, RELEASES, {'ETag': '"abc"'}))
+        update.get_valid_releases('deanishe/test')
+        self.responses.append(FakeResponse(200, RELEASES[1:], {'ETag': '"d"'}))
+        self.assertEqual(update.get_valid_releases('deanishe/test'),
+                         VALID_RELEASES[1:])
+        self.responses.append(FakeResponse(304))
+        self.assertEqual(update.get_valid_releases('deanishe/test'),
+                         VALID_RELEASES[1:])
+        self.assertEqual(self.requests[2][1], {'If-None-Match': '"d"'})
+
+    def test_no_validators(self):
+        """Old caches and responses without validators aren't conditional"""
+        # Older versions cached the list of releases
+        self.wf.cache_data('gh-releases-deanishe-test', RELEASES)
+        self.responses.append(FakeResponse(200, RELEASES))
+        self.assertEqual(update.get_valid_releases('deanishe/test'),
+                         VALID_RELEASES)
+        self.responses.append(FakeResponse(200, RELEASES))
+        update.get_valid_releases('deanishe/test')
+        self.assertEqual([headers for _, headers in self.requests], [{}, {}])
+
+    def test_errors(self):
+        """Errors are raised, including 304s without cached releases"""
+        self.responses.append(FakeResponse(304))
+        self.assertRaises(urllib2.HTTPError, update.get_valid_releases,
+                          'deanishe/test')
+        self.responses.append(FakeResponse(200, RELEASES, {'ETag': '"abc"'}))
+        update.get_valid_releases('deanishe/test')
+        self.responses.append(FakeResponse(500))
+        self.assertRaises(urllib2.HTTPError, update.get_valid_releases,
+                          'deanishe/test')
+        # The cache is kept
+        self.responses.append(FakeResponse(304))
+        self.assertEqual(update.get_valid_releases('deanishe/test'),
+                         VALID_RELEASES)
+
+
+if __name__ == '__main__':  # pragma: no cover
+    unittest.main()
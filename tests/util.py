@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# Copyright  (c) 2015 deanishe@deanishe.net
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Helpers for tests that need a workflow environment."""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from workflow import Workflow  # noqa: E402
+from workflow import background, update  # noqa: E402
+
+# Environment variables Alfred sets for workflows
+ENV_VARS = ('alfred_version', 'alfred_workflow_bundleid',
+            'alfred_workflow_data', 'alfred_workflow_cache')
+
+
+def workflow_env(tempdir):
+    """Return Alfred's environment variables for data in `tempdir`."""
+    return {
+        'alfred_version': '2.8',
+        'alfred_workflow_bundleid': 'net.deanishe.alfred-convert.test',
+        'alfred_workflow_data': os.path.join(tempdir, 'data'),
+        'alfred_workflow_cache': os.path.join(tempdir, 'cache'),
+    }
+
+
+class WorkflowTestCase(unittest.TestCase):
+    """Test case with a `Workflow` whose data is in a temporary directory.
+
+    The workflow is also the one `workflow.background` and
+    `workflow.update` use.
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self._env = dict((k, os.environ.get(k)) for k in ENV_VARS)
+        os.environ.update(workflow_env(self.tempdir))
+        self.wf = self.make_workflow()
+        background._wf = update._wf = self.wf
+
+    def tearDown(self):
+        background._wf = update._wf = None
+        for key, value in self._env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(self.tempdir)
+
+    def make_workflow(self):
+        """Return `Workflow` for the test. Override to pass arguments."""
+        return Workflow()